@@ -0,0 +1,169 @@
+# app/admission.py
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Sequence
+
+import redis
+from kombu.exceptions import ChannelError
+
+from .worker import celery_app
+from .scheduler import LARGE_QUEUE, REVIEW_QUEUE_DEADLINE, SMALL_QUEUE
+from .store.admission import AdmissionCounters
+
+# Refuse reviews the workers cannot start in time, instead of queueing them
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# Reviews one client may request per window, and all clients together
+ADMISSION_CLIENT_LIMIT = int(os.getenv("ADMISSION_CLIENT_LIMIT", "30"))
+ADMISSION_GLOBAL_LIMIT = int(os.getenv("ADMISSION_GLOBAL_LIMIT", "600"))
+ADMISSION_WINDOW_SECONDS = int(os.getenv("ADMISSION_WINDOW_SECONDS", "60"))
+# Reviews waiting in the broker beyond which new ones are refused
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "1000"))
+# Header naming the client (e.g. X-Forwarded-For behind a proxy); the peer address otherwise
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "")
+# Minutes of finished reviews the throughput (and so the wait estimate) is measured over
+THROUGHPUT_MINUTES = 10
+# The broker is asked for the queue depth at most this often per process
+DEPTH_CACHE_SECONDS = 2.0
+
+REVIEW_QUEUES = (SMALL_QUEUE, LARGE_QUEUE)
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """A review was refused; the API answers with `status_code` and a Retry-After header."""
+
+    def __init__(self, status_code: int, message: str, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, retry_after)
+
+
+@dataclass
+class Admission:
+    """What the queue looked like when a review was accepted."""
+    queue_depth: int
+    # None until some reviews have finished recently
+    estimated_wait_seconds: Optional[float] = None
+
+
+def largest_admissible() -> int:
+    """The most reviews one request can ask for; larger ones would be refused in every window."""
+    return min(ADMISSION_CLIENT_LIMIT, ADMISSION_GLOBAL_LIMIT)
+
+
+def queue_depth(queues: Sequence[str] = REVIEW_QUEUES) -> int:
+    """Tasks waiting in the broker's review queues (every priority level)."""
+    total = 0
+    with celery_app.connection_for_read() as connection:
+        channel = connection.default_channel
+        for name in queues:
+            try:
+                total += channel.queue_declare(queue=name, passive=True).message_count
+            except ChannelError:
+                # A queue nothing was ever sent to does not exist yet
+                pass
+    return total
+
+
+class AdmissionController:
+    """
+    Decides whether a review request is accepted: per-client and global
+    rate limits first, then the broker's queue depth, then whether the
+    estimated wait (queue depth over recent throughput) fits the deadline
+    queued reviews carry. Fails open when Redis or the broker is down.
+    """
+
+    def __init__(self, counters: Optional[AdmissionCounters] = None,
+                 depth: Callable[[], int] = queue_depth, deadline: int = REVIEW_QUEUE_DEADLINE):
+        self.counters = counters or AdmissionCounters()
+        self.depth = depth
+        self.deadline = deadline
+        self._depth_cache = (0.0, 0)
+        self._lock = threading.Lock()
+
+    def _queue_depth(self) -> int:
+        with self._lock:
+            measured_at, depth = self._depth_cache
+            if time.monotonic() - measured_at < DEPTH_CACHE_SECONDS:
+                return depth
+        depth = self.depth()
+        with self._lock:
+            self._depth_cache = (time.monotonic(), depth)
+        return depth
+
+    def admit(self, client: str, cost: int = 1) -> Admission:
+        """
+        Accepts `cost` reviews for `client` or raises Overloaded. A refused
+        request is not counted against any limit.
+        """
+        counted = []
+        try:
+            client_key = self.counters.window_key(f"client:{client}", ADMISSION_WINDOW_SECONDS)
+            count, reset = self.counters.hit(client_key, cost, ADMISSION_WINDOW_SECONDS, ADMISSION_CLIENT_LIMIT)
+            if count > ADMISSION_CLIENT_LIMIT:
+                raise Overloaded(429, f"Rate limit exceeded: at most {ADMISSION_CLIENT_LIMIT} reviews per "
+                                      f"{ADMISSION_WINDOW_SECONDS}s per client.", reset)
+            counted.append(client_key)
+            global_key = self.counters.window_key("global", ADMISSION_WINDOW_SECONDS)
+            count, reset = self.counters.hit(global_key, cost, ADMISSION_WINDOW_SECONDS, ADMISSION_GLOBAL_LIMIT)
+            if count > ADMISSION_GLOBAL_LIMIT:
+                raise Overloaded(429, "The service is receiving too many review requests.", reset)
+            counted.append(global_key)
+            throughput = self.counters.throughput(THROUGHPUT_MINUTES)
+        except redis.RedisError as e:
+            logger.warning("Admission counters unavailable, accepting", extra={"error": str(e)})
+            return Admission(queue_depth=0)
+        except Overloaded:
+            self._refund(counted, cost)
+            raise
+
+        try:
+            depth = self._queue_depth()
+        except Exception as e:
+            logger.warning("Queue depth unavailable, accepting", extra={"error": str(e)})
+            return Admission(queue_depth=0)
+        try:
+            return self._check_capacity(depth, cost, throughput)
+        except Overloaded:
+            self._refund(counted, cost)
+            raise
+
+    def _refund(self, keys: Sequence[str], cost: int) -> None:
+        for key in keys:
+            try:
+                self.counters.refund(key, cost)
+            except redis.RedisError as e:
+                logger.warning("Could not refund a refused request", extra={"error": str(e)})
+
+    def _check_capacity(self, depth: int, cost: int, throughput: float) -> Admission:
+        """Raises Overloaded if `cost` more reviews would not start in time."""
+        waiting = depth + cost
+        wait = waiting / throughput if throughput > 0 else None
+        if waiting > ADMISSION_MAX_QUEUE_DEPTH:
+            # Until enough of the queue has drained, at the current pace
+            excess = waiting - ADMISSION_MAX_QUEUE_DEPTH
+            retry_after = int(excess / throughput) if throughput > 0 else ADMISSION_WINDOW_SECONDS
+            raise Overloaded(503, f"Too many reviews are queued ({depth}); try again later.",
+                             min(retry_after, self.deadline))
+        if wait is not None and self.deadline and wait > self.deadline:
+            raise Overloaded(503, f"Reviews are currently waiting about {int(wait)}s, longer than the "
+                                  f"{self.deadline}s they are kept; try again later.",
+                             min(int(wait - self.deadline), self.deadline))
+        return Admission(queue_depth=depth, estimated_wait_seconds=round(wait, 1) if wait is not None else None)
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Returns the process-wide controller, so its queue depth cache is shared."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
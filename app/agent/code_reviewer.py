@@ -1,13 +1,54 @@
 # app/agent/code_reviewer.py
-from crewai import Agent, Task, Crew
-from app.models import AnalysisResults
-from typing import List
+from app.models import (AnalysisResults, AnalysisSummary, FileAnalysis, Issue, LLMCallStats, ReviewStats,
+                        SkippedFile)
+from app.diff.parser import FileDiff, diff_lines, iter_file_diffs
+from app.diff.chunker import DiffChunk, chunk_file_diff, DEFAULT_CHUNK_TOKENS
+from app.diff.remap import carry_forward_file
+from app.diff.index import FileIndex
+from app.diff.triage import FileTriage, diff_size
+from app.context.code_index import CodeIndex
+from app.store.review_cache import ReviewCache
+from app.store.near_duplicates import NEAR_DUPLICATE_ENABLED, NearDuplicateIndex, review_source
+from app.store.checkpoints import ReviewCheckpoints, checkpoint_field
+from app.rules.engine import RuleEngine, is_mechanical_only
+from app.store.usage_log import UsageLog
+from app.agent.prompt_builder import PromptBuilder, ReviewPrompt, chat_messages
+from app.agent.json_extractor import Extraction, extract_json
+from app.agent.model_router import DEFAULT_MODEL, ModelRoute, ModelRouter, assess_risk
+from app.agent.llm_engine import get_engine
+from app.worker import ReviewDeadlineExceeded
+from app.telemetry import LLM_TOKENS, attached, current_context, observe_stage, stage
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import IO, Callable, Iterable, List, Optional, Union
+import logging
 import os
-import json
-import re  # Import regular expressions
+import threading
+import time
 from pydantic import ValidationError
 
+# How many diff chunks of one PR are reviewed at the same time
+MAX_PARALLEL_CHUNKS = int(os.getenv("REVIEW_MAX_PARALLEL_CHUNKS", "4"))
+
+# Called with each chunk's FileAnalysis as soon as it is available
+ResultCallback = Callable[[FileAnalysis], None]
+# Called with each file of the diff, and its index, as it is read
+FileCallback = Callable[[FileDiff, FileIndex], None]
+
+# Bump whenever the review prompt changes so cached reviews are not reused
+PROMPT_VERSION = "6"
+REVIEW_CACHE_ENABLED = os.getenv("REVIEW_CACHE_ENABLED", "true").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
 class CodeReviewerCrew:
+    """
+    Reviews PR diffs as a senior code reviewer persona (see SYSTEM_PROMPT).
+
+    Model calls go through the process-wide LLMEngine, whose event loop
+    multiplexes the calls of every review running in the process under
+    limits shared by all workers. Worker processes keep a single instance
+    (see get_reviewer).
+    """
     
     def __init__(self):
         api_token = os.getenv("HUGGINGFACE_API_TOKEN")
@@ -15,147 +56,466 @@ class CodeReviewerCrew:
             raise ValueError("HUGGINGFACE_API_TOKEN not found in environment variables.")
         os.environ["HF_TOKEN"] = api_token
         
-        # --- GOING BACK TO THE FIRST MODEL THAT WORKED ---
-        self.model_name = "huggingface/meta-llama/Meta-Llama-3-8B-Instruct"
-        
-        self.reviewer_agent = Agent(
-            role='Senior Code Quality Reviewer',
-            goal=(
-                "Analyze GitHub pull request diffs to find bugs, style issues, "
-                "performance bottlenecks, and best practice violations."
-            ),
-            backstory=(
-                "You are an AI assistant specialized in code review. "
-                "You have a keen eye for detail and a deep understanding of "
-                "software engineering principles. Your goal is to provide "
-                "constructive, actionable feedback in a structured JSON format. "
-                "You must identify the specific file and line number for every issue."
-            ),
-            verbose=True,
-            allow_delegation=False,
-            llm=self.model_name
+        # Default model; chunks are routed between models by self.router
+        self.model_name = DEFAULT_MODEL
+        self.router = ModelRouter()
+        self.prompts = PromptBuilder()
+        self.engine = get_engine()
+
+        self.chunk_tokens = DEFAULT_CHUNK_TOKENS
+        self.max_parallel_chunks = MAX_PARALLEL_CHUNKS
+        self.cache = ReviewCache(PROMPT_VERSION) if REVIEW_CACHE_ENABLED else None
+        self.near_duplicates = NearDuplicateIndex(PROMPT_VERSION) if NEAR_DUPLICATE_ENABLED else None
+        self.rules = RuleEngine()
+        self.usage_log = UsageLog()
+
+    def review_code(self, repo_url: str, pr_number: int, diff_content: Union[str, IO[bytes]],
+                    on_result: Optional[ResultCallback] = None,
+                    code_index: Optional[CodeIndex] = None,
+                    checkpoint: Optional[ReviewCheckpoints] = None,
+                    triage: Optional[FileTriage] = None, deadline: Optional[float] = None) -> AnalysisResults:
+        """
+        Reviews every file of the diff. Each chunk gets its own model call and
+        the calls run in parallel, so wall-clock time follows the largest chunk
+        rather than the size of the whole PR.
+
+        The diff may be a string or a binary file (a streamed download); it
+        is parsed one file at a time as the review goes, so memory follows
+        the largest file rather than the size of the PR.
+
+        Mechanical problems (whitespace, long lines, debug prints, unused
+        imports) are found by the rule engine first. Chunks that were already
+        reviewed with the same model and prompt are served from the review
+        cache and never reach the model, and so do chunks nearly identical to
+        one reviewed before (a backport or cherry-pick), whose issues are
+        moved onto the matching lines. With a code index of the base tree,
+        each prompt also carries the few definitions its changes refer to.
+        With checkpoints, chunks reviewed by an earlier attempt of the same
+        task are not sent again. With triage, lockfiles, generated, vendored
+        and binary files are only listed in skipped_files. Past `deadline`
+        (a time.monotonic() value), ReviewDeadlineExceeded is raised between
+        chunks, once the finished ones are checkpointed.
+        """
+        analyses, skipped, stats, total_files = self._review_files(
+            repo_url, pr_number, iter_file_diffs(diff_lines(diff_content)), on_result, code_index, checkpoint,
+            triage=triage, deadline=deadline,
         )
-    
-    def _parse_diff(self, diff_content: str) -> str:
-        """Helper function to truncate the diff."""
-        max_length = 15000 
-        if len(diff_content) > max_length:
-            return diff_content[:max_length] + "\n... (diff truncated) ..."
-        return diff_content
-
-    def _extract_json_from_text(self, text: str) -> dict:
+        return self._merge_results(analyses, total_files=total_files, stats=stats, skipped=skipped)
+
+    def review_incremental(self, repo_url: str, pr_number: int, delta_diff: Union[str, IO[bytes]],
+                           previous: AnalysisResults, total_files: int,
+                           on_result: Optional[ResultCallback] = None,
+                           code_index: Optional[CodeIndex] = None,
+                           checkpoint: Optional[ReviewCheckpoints] = None,
+                           triage: Optional[FileTriage] = None, deadline: Optional[float] = None) -> AnalysisResults:
         """
-        Finds and parses the first valid JSON block (from { to }) 
-        in a potentially messy string.
-        
-        If no JSON is found, returns an empty result.
+        Reviews only the diff between the previously reviewed head and the new
+        one, and carries the earlier issues of untouched lines forward.
         """
-        # Use regex to find the first complete JSON object
-        match = re.search(r'\{.*\}', text, re.DOTALL)
-        
-        if not match:
-            # --- THIS IS THE FIX ---
-            # If no JSON is found, assume no issues were found.
-            # This is common if the AI just says "Looks good!"
-            print("No JSON block found in AI response. Assuming no issues.")
-            return {
-                "files": [],
-                "summary": {
-                    "total_files": 0,
-                    "total_issues": 0,
-                    "critical_issues": 0
-                }
-            }
-            # ---------------------
-            
-        json_str = match.group(0)
-        
-        try:
-            # Try to parse the extracted string
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"AI returned malformed JSON that could not be parsed. Error: {e}")
+        untouched = {f.name: f for f in previous.files}
+        carried: List[FileAnalysis] = []
+        touched = set()
 
-    # In app/agent/code_reviewer.py
+        def carry(file_diff: FileDiff, file_index: FileIndex) -> None:
+            touched.update((file_diff.path, file_diff.old_path))
+            earlier = untouched.pop(file_diff.old_path or file_diff.path, None)
+            analysis = carry_forward_file(earlier, file_diff, file_index) if earlier else None
+            if analysis is not None:
+                carried.append(analysis)
+                if on_result:
+                    on_result(analysis)
 
-    def review_code(self, repo_url: str, pr_number: int, diff_content: str) -> AnalysisResults:
-        
-        parsed_diff = self._parse_diff(diff_content)
-        
-        # --- THIS IS THE NEW, STRICTER PROMPT ---
-        # We are giving the AI the exact schema to follow.
-        json_schema = """
-        {
-          "files": [
-            {
-              "name": "path/to/file.py",
-              "issues": [
-                {
-                  "type": "bug" | "style" | "performance" | "best_practice",
-                  "line": 123,
-                  "description": "A description of the issue.",
-                  "suggestion": "A suggestion to fix the issue."
-                }
-              ]
-            }
-          ],
-          "summary": {
-            "total_files": 1,
-            "total_issues": 1,
-            "critical_issues": 0
-          }
-        }
+        analyses, skipped, stats, _ = self._review_files(
+            repo_url, pr_number, iter_file_diffs(diff_lines(delta_diff)), on_result, code_index, checkpoint,
+            on_file=carry, triage=triage, deadline=deadline,
+        )
+        # Files skipped before and not touched since stay skipped
+        skipped = [f for f in previous.skipped_files if f.name not in touched] + skipped
+        # Files the delta does not touch keep their issues as they are
+        for analysis in untouched.values():
+            carried.append(analysis)
+            if on_result:
+                on_result(analysis)
+
+        stats.incremental = True
+        stats.carried_issues = sum(len(f.issues) for f in carried)
+        return self._merge_results(carried + analyses, total_files=total_files, stats=stats, skipped=skipped)
+
+    def _review_files(self, repo_url: str, pr_number: int, file_diffs: Iterable[FileDiff],
+                      on_result: Optional[ResultCallback] = None, code_index: Optional[CodeIndex] = None,
+                      checkpoint: Optional[ReviewCheckpoints] = None,
+                      on_file: Optional[FileCallback] = None, triage: Optional[FileTriage] = None,
+                      deadline: Optional[float] = None):
+        """
+        Reviews the files of a diff as `file_diffs` yields them, serving
+        unchanged chunks from the cache and nearly unchanged ones from the
+        near-duplicate index. on_result is called (from this
+        thread) for every chunk as it finishes, and on_file for every file
+        before its chunks are reviewed. Files that triage rejects are only
+        counted, with the diff tokens they would have cost.
+
+        Rule engine findings are reported right away. Chunks that only contain
+        mechanical changes skip the model; the others are told which issues
+        are already reported so the model does not repeat them. Every line
+        the model reports is checked against the file's diff index. Each
+        reviewed chunk is checkpointed, and chunks found in the checkpoint
+        are restored instead of reviewed again.
+
+        At most max_parallel_chunks chunks of the PR are in flight. Reading
+        the next file waits for a free slot, so only the files whose chunks
+        are under review are held in memory.
+        Returns (analyses, skipped files, stats, number of files).
+        """
+        stats = ReviewStats()
+        analyses: List[FileAnalysis] = []
+        skipped: List[SkippedFile] = []
+        restored = checkpoint.load() if checkpoint else {}
+        # Never reuse reviews of this PR's own chunks, which depend on completion order
+        source = review_source(repo_url, pr_number)
+        if checkpoint:
+            checkpoint.start()
+
+        # The calls run on the engine's loop; handing them this context keeps
+        # their spans under the task's
+        parent = current_context()
+        futures = {}
+
+        def collect(done) -> None:
+            for future in done:
+                chunk, _, route, _, _, _ = futures.pop(future)
+                try:
+                    analysis, call = future.result()
+                except Exception:
+                    # Don't leave the rest of this PR running on the engine
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                self._record_chunk(repo_url, pr_number, chunk, route, analysis, call, stats, on_result,
+                                   checkpoint)
+                analyses.append(analysis)
+
+        def check_deadline() -> None:
+            if deadline is not None and time.monotonic() >= deadline:
+                # Finished chunks are checkpointed; the retry reviews the rest
+                for pending in futures:
+                    pending.cancel()
+                raise ReviewDeadlineExceeded(f"Review of {repo_url}#{pr_number} ran past its time limit")
+
+        def wait_one() -> None:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            collect(wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)[0])
+            check_deadline()
+
+        paths = set()
+        parse_seconds = triage_seconds = static_seconds = 0.0
+        file_diffs = iter(file_diffs)
+        while True:
+            started = time.perf_counter()
+            file_diff = next(file_diffs, None)
+            parse_seconds += time.perf_counter() - started
+            if file_diff is None:
+                break
+
+            paths.add(file_diff.path)
+            started = time.perf_counter()
+            reason = triage.classify(file_diff) if triage else None
+            triage_seconds += time.perf_counter() - started
+
+            started = time.perf_counter()
+            file_index = FileIndex(file_diff)
+            parse_seconds += time.perf_counter() - started
+            if on_file:
+                on_file(file_diff, file_index)
+
+            if reason:
+                added, removed, tokens = diff_size(file_diff)
+                skipped.append(SkippedFile(name=file_diff.path, reason=reason, added_lines=added,
+                                           removed_lines=removed, tokens_saved=tokens))
+                stats.files_skipped += 1
+                stats.tokens_saved += tokens
+                continue
+
+            started = time.perf_counter()
+            chunks = chunk_file_diff(file_diff, self.chunk_tokens)
+            parse_seconds += time.perf_counter() - started
+            stats.chunks += len(chunks)
+
+            started = time.perf_counter()
+            # Rules only look at added lines; placing just tags them as such
+            static, _, _ = self._place_issues(self.rules.check_file(file_diff), file_index, snap=0)
+            static_seconds += time.perf_counter() - started
+            if static:
+                analysis = FileAnalysis(name=file_diff.path, issues=static)
+                analyses.append(analysis)
+                stats.static_issues += len(static)
+                if on_result:
+                    on_result(analysis)
+
+            no_call = 0
+            for chunk in chunks:
+                if is_mechanical_only(chunk):
+                    stats.chunks_skipped += 1
+                    no_call += 1
+                    continue
+                known = self._known_issues(chunk, static)
+                with stage("prompt_build"):
+                    prompt = self.prompts.build(repo_url, pr_number, chunk, known, model=self.model_name,
+                                                code_index=code_index)
+                    risk = assess_risk(chunk)
+                    route = self.router.route(prompt.tokens, risk)
+
+                cached = self.cache.get(chunk, route.model) if self.cache else None
+                if cached is not None:
+                    stats.cache_hits += 1
+                    no_call += 1
+                    analysis = FileAnalysis(name=chunk.file_path, issues=cached)
+                    analyses.append(analysis)
+                    if on_result:
+                        on_result(analysis)
+                    continue
+                stats.cache_misses += 1
+
+                entry = restored.pop(checkpoint_field(chunk), None) if restored else None
+                if entry is not None:
+                    # Paid for by an earlier attempt of this task
+                    analysis, call = entry
+                    self._add_call(stats, call)
+                    stats.chunks_resumed += 1
+                    no_call += 1
+                    analyses.append(analysis)
+                    if on_result:
+                        on_result(analysis)
+                    continue
+
+                near = (self.near_duplicates.lookup(chunk, route.model, source=source)
+                        if self.near_duplicates else None)
+                if near is not None:
+                    issues, _, _ = self._place_issues(near[0], file_index, snap=0)
+                    stats.near_duplicate_hits += 1
+                    no_call += 1
+                    analysis = FileAnalysis(name=chunk.file_path, issues=issues)
+                    analyses.append(analysis)
+                    if on_result:
+                        on_result(analysis)
+                    continue
+
+                check_deadline()
+                if len(futures) >= self.max_parallel_chunks:
+                    wait_one()
+                miss = (chunk, prompt, route, risk, known, file_index)
+                futures[self.engine.run(self._review_chunk(*miss, parent=parent))] = miss
+            if checkpoint:
+                checkpoint.expect(total=len(chunks), done=no_call)
+
+        while futures:
+            wait_one()
+
+        # Parsing and the rules ran file by file, between model calls
+        observe_stage("diff_parse", parse_seconds)
+        if triage:
+            observe_stage("triage", triage_seconds)
+        observe_stage("static_rules", static_seconds)
+        logger.info("Chunks reviewed", extra={
+            "repo": repo_url, "pr": pr_number, "files": len(paths), "chunks": stats.chunks,
+            "llm_calls": len(stats.llm_calls) - stats.chunks_resumed, "cache_hits": stats.cache_hits,
+            "near_duplicate_hits": stats.near_duplicate_hits, "resumed": stats.chunks_resumed,
+            "parallel": self.max_parallel_chunks,
+            "files_skipped": stats.files_skipped, "tokens_saved": stats.tokens_saved,
+        })
+        return analyses, skipped, stats, len(paths)
+
+    def _record_chunk(self, repo_url: str, pr_number: int, chunk: DiffChunk, route: ModelRoute,
+                      analysis: FileAnalysis, call: LLMCallStats, stats: ReviewStats,
+                      on_result: Optional[ResultCallback], checkpoint: Optional[ReviewCheckpoints] = None) -> None:
+        """
+        Caches and checkpoints a reviewed chunk, and adds its call to the
+        review's stats and the usage log.
         """
+        if self.cache:
+            self.cache.set(chunk, route.model, analysis.issues)
+        if self.near_duplicates:
+            self.near_duplicates.add(chunk, route.model, analysis.issues, source=review_source(repo_url, pr_number))
+        if checkpoint:
+            checkpoint.save(chunk, analysis, call)
+        self._add_call(stats, call)
+        LLM_TOKENS.labels(call.route, "prompt").inc(call.prompt_tokens)
+        LLM_TOKENS.labels(call.route, "completion").inc(call.completion_tokens)
+        self.usage_log.record({**call.dict(), "repo": repo_url, "pr": pr_number, "ts": time.time()})
+        if on_result:
+            on_result(analysis)
 
-        review_task = Task(
-            description=f"""
-                Review the code diff below for PR #{pr_number} from {repo_url}.
-                Identify bugs, style issues, performance issues, and best practices.
+    def _add_call(self, stats: ReviewStats, call: LLMCallStats) -> None:
+        stats.llm_calls.append(call)
+        stats.prompt_tokens += call.prompt_tokens
+        stats.completion_tokens += call.completion_tokens
+        stats.context_tokens += call.context_tokens
+        stats.issues_snapped += call.snapped_issues
+        stats.issues_dropped += call.dropped_issues
 
-                Code Diff:
-                ---
-                {parsed_diff}
-                ---
+    def _merge_results(self, analyses: List[FileAnalysis], total_files: int,
+                       stats: Optional[ReviewStats] = None,
+                       skipped: Optional[List[SkippedFile]] = None) -> AnalysisResults:
+        """Merges per-chunk results into one AnalysisResults, one entry per file."""
+        merged = {}
+        for analysis in analyses:
+            if analysis.name in merged:
+                merged[analysis.name].issues.extend(analysis.issues)
+            else:
+                merged[analysis.name] = FileAnalysis(name=analysis.name, issues=list(analysis.issues))
 
-                You MUST return your analysis in this EXACT JSON format.
-                Pay close attention to the field names ("name", "type", "line", "suggestion").
+        files = [f for f in merged.values() if f.issues]
+        for f in files:
+            f.issues.sort(key=lambda issue: issue.line)
 
-                SCHEMA:
-                {json_schema}
+        all_issues = [issue for f in files for issue in f.issues]
+        return AnalysisResults(
+            files=files,
+            summary=AnalysisSummary(
+                total_files=total_files,
+                total_issues=len(all_issues),
+                critical_issues=sum(1 for issue in all_issues if issue.type in ('bug', 'critical')),
+            ),
+            skipped_files=skipped or [],
+            stats=stats
+        )
 
-                If no issues are found, return:
-                {{"files": [], "summary": {{"total_files": 0, "total_issues": 0, "critical_issues": 0}}}}
-            """,
-            agent=self.reviewer_agent,
-            expected_output="A single, valid JSON code block containing the analysis."
+    def _known_issues(self, chunk: DiffChunk, static: List[Issue]) -> List[Issue]:
+        """Rule engine findings of the chunk's file that fall inside its hunks."""
+        ranges = [(h.new_start, h.new_end) for h in chunk.hunks]
+        return [
+            issue for issue in static
+            if any(start <= issue.line <= end for start, end in ranges)
+        ]
+
+    async def _review_chunk(self, chunk: DiffChunk, prompt: ReviewPrompt, route: ModelRoute, risk: str,
+                            known_issues: List[Issue], file_index: Optional[FileIndex], parent=None):
+        """Runs one model call for a single chunk on the engine's loop; returns its issues and call stats."""
+        with attached(parent):
+            return await self._review_chunk_in_context(chunk, prompt, route, risk, known_issues, file_index)
+
+    async def _review_chunk_in_context(self, chunk: DiffChunk, prompt: ReviewPrompt, route: ModelRoute,
+                                       risk: str, known_issues: List[Issue], file_index: Optional[FileIndex]):
+        with stage("llm_call", chunk=chunk.key, route=route.name, model=route.model, risk=risk) as call_span:
+            completion = await self.engine.complete(route.model, chat_messages(prompt.text), tokens=prompt.tokens)
+            call_span.set_attribute("prompt_tokens", completion.prompt_tokens)
+            call_span.set_attribute("completion_tokens", completion.completion_tokens)
+            call_span.set_attribute("coalesced", completion.coalesced)
+
+        call = LLMCallStats(
+            chunk=chunk.key,
+            route=route.name,
+            model=route.model,
+            risk=risk,
+            # A coalesced call cost nothing; its tokens are counted on the call it shared
+            prompt_tokens=completion.prompt_tokens or (0 if completion.coalesced else prompt.tokens),
+            completion_tokens=completion.completion_tokens,
+            latency_ms=completion.latency_ms,
+            context_tokens=prompt.context_tokens,
+            throttle_retries=completion.retries,
+            coalesced=completion.coalesced,
         )
 
-        # Create and Run the Crew
-        crew = Crew(
-            agents=[self.reviewer_agent],
-            tasks=[review_task],
-            verbose=True
+        with stage("json_extraction", chunk=chunk.key) as extract_span:
+            extraction = extract_json(completion.text)
+            extract_span.set_attribute("complete", extraction.complete)
+        parsed_issues, call.snapped_issues, call.dropped_issues = self._place_issues(
+            await self._issues_from_reply(extraction, chunk, route, call), file_index
         )
-        
-        result = crew.kickoff()
 
-        # Get the raw text, no matter what object type
-        raw_output = ""
-        if hasattr(result, 'raw') and isinstance(result.raw, str):
-            raw_output = result.raw
-        elif isinstance(result, str):
-            raw_output = result
-        else:
-            raw_output = str(result)
+        # A chunk only ever contains one file, so every issue belongs to it
+        known = {(i.line, i.type) for i in known_issues}
+        issues: List[Issue] = [
+            issue for issue in parsed_issues
+            if (issue.line, issue.type) not in known
+        ]
+        return FileAnalysis(name=chunk.file_path, issues=issues), call
+
+    async def _issues_from_reply(self, extraction: Extraction, chunk: DiffChunk, route: ModelRoute,
+                                 call: LLMCallStats) -> List[Issue]:
+        """
+        Turns an extracted reply into issues. A truncated or malformed reply
+        keeps every issue that parsed; only the broken tail is sent back to
+        the model (without the diff) instead of re-running the review.
+        """
+        if extraction.complete:
+            return self._valid_issues(extraction.data.get("files", []))
+        if not extraction.found:
+            # Common if the AI just says "Looks good!"
+            logger.info("No JSON block found in AI response, assuming no issues", extra={"chunk": chunk.key})
+            return []
+
+        issues = self._valid_issues(extraction.recovered_files)
+        call.recovered_issues = len(issues)
+        if '{' not in extraction.broken:
+            # Only closing brackets (or nothing) were lost
+            if issues or extraction.recovered_files:
+                return issues
+            raise ValueError("The AI agent returned a malformed or incomplete response. This can happen under high load. Please try again.")
 
+        logger.info("Repairing a broken reply", extra={"chunk": chunk.key, "recovered": len(issues)})
+        call.repaired = True
         try:
-            # Clean and parse the raw text
-            json_data = self._extract_json_from_text(raw_output)
-            
-            # Validate the clean JSON with Pydantic
-            return AnalysisResults.parse_obj(json_data)
-
-        except (ValueError, json.JSONDecodeError, TypeError) as e:
-            # If our manual parsing fails, raise the clean error
-            print(f"Failed to parse extracted JSON: {e}")
-            raise ValueError("The AI agent returned a malformed or incomplete response. This can happen under high load. Please try again.")
\ No newline at end of file
+            with stage("llm_call", chunk=chunk.key, route=route.name, model=route.model, repair=True):
+                reply = await self.engine.complete(
+                    route.model, chat_messages(self.prompts.build_repair(chunk.file_path, extraction.broken))
+                )
+            with stage("json_extraction", chunk=chunk.key, repair=True):
+                repaired = extract_json(reply.text)
+        except Exception as e:
+            logger.warning("Repair call failed", extra={"chunk": chunk.key, "error": str(e)})
+            repaired = Extraction()
+        if repaired.complete:
+            issues += self._valid_issues(repaired.data.get("files", []))
+        elif repaired.recovered_files:
+            issues += self._valid_issues(repaired.recovered_files)
+        elif not issues:
+            raise ValueError("The AI agent returned a malformed or incomplete response. This can happen under high load. Please try again.")
+        return issues
+
+    def _place_issues(self, issues: List[Issue], file_index: Optional[FileIndex], snap: Optional[int] = None):
+        """
+        Checks reported lines against the diff: an issue on a line the diff
+        shows is kept and tagged, one a few lines off is moved onto the
+        nearest added line, and the rest are dropped.
+        Returns (issues, snapped count, dropped count).
+        """
+        if file_index is None:
+            return issues, 0, 0
+        placed: List[Issue] = []
+        snapped = 0
+        for issue in issues:
+            spot = file_index.place(issue.line) if snap is None else file_index.place(issue.line, snap)
+            if spot is None:
+                continue
+            line, added = spot
+            if line != issue.line:
+                snapped += 1
+            placed.append(issue.copy(update={"line": line, "on_added_line": added}))
+        return placed, snapped, len(issues) - len(placed)
+
+    def _valid_issues(self, files: list) -> List[Issue]:
+        """Validates issues one by one, so one bad entry doesn't cost the others."""
+        issues: List[Issue] = []
+        with stage("validation"):
+            for f in files:
+                if not isinstance(f, dict):
+                    continue
+                for raw in f.get("issues") or []:
+                    try:
+                        issues.append(Issue.parse_obj(raw))
+                    except (ValidationError, TypeError) as e:
+                        logger.warning("Dropping invalid issue", extra={"issue": raw, "error": str(e)})
+        return issues
+
+
+_reviewer: Optional[CodeReviewerCrew] = None
+_reviewer_lock = threading.Lock()
+
+
+def get_reviewer() -> CodeReviewerCrew:
+    """Returns the process-wide reviewer, building it on first use."""
+    global _reviewer
+    with _reviewer_lock:
+        if _reviewer is None:
+            _reviewer = CodeReviewerCrew()
+        return _reviewer
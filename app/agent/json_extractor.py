@@ -0,0 +1,168 @@
+# app/agent/json_extractor.py
+import json
+import re
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+NAME_RE = re.compile(r'"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+@dataclass
+class Extraction:
+    """What could be read from one model reply."""
+    found: bool = False
+    # The whole JSON object, if the reply contained a valid one
+    data: Optional[dict] = None
+    # File objects that parsed on their own when the whole object did not
+    recovered_files: List[dict] = field(default_factory=list)
+    # The part of the reply that could not be parsed (for a repair re-ask)
+    broken: str = ""
+
+    @property
+    def complete(self) -> bool:
+        return self.data is not None
+
+
+class _Candidate:
+    """One '{ ... }' region of the reply, scanned one character at a time."""
+
+    def __init__(self):
+        self.chars: List[str] = []
+        self.stack: List[Tuple[str, int]] = []
+        self.in_string = False
+        self.escaped = False
+        # (start, end) of every nested object that closed
+        self.closed: List[Tuple[int, int]] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chars)
+
+    def push(self, ch: str) -> bool:
+        """Adds one character; returns True when the outermost object closes."""
+        pos = len(self.chars)
+        self.chars.append(ch)
+        if self.in_string:
+            if self.escaped:
+                self.escaped = False
+            elif ch == '\\':
+                self.escaped = True
+            elif ch == '"':
+                self.in_string = False
+            return False
+
+        if ch == '"':
+            self.in_string = True
+        elif ch in '{[':
+            self.stack.append((ch, pos))
+        elif ch in '}]':
+            if not self.stack:
+                return False
+            opener, start = self.stack.pop()
+            if ch == '}' and opener == '{' and self.stack:
+                self.closed.append((start, pos + 1))
+            return not self.stack
+        return False
+
+    def recover(self) -> Tuple[List[dict], str]:
+        """
+        Rebuilds the file objects of a truncated or malformed reply from the
+        nested objects that are valid on their own. Returns them with the
+        text after the last recovered object.
+        """
+        text = self.text
+        files: Dict[int, dict] = {}
+        issues: List[Tuple[int, int, dict]] = []
+        for start, end in self.closed:
+            try:
+                obj = json.loads(text[start:end])
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(obj, dict):
+                continue
+            if "name" in obj and "issues" in obj:
+                files[start] = obj
+            elif "line" in obj and "description" in obj:
+                issues.append((start, end, obj))
+
+        recovered_end = max((end for start, end in self.closed if start in files), default=0)
+        spans = [(start, end) for start, end in self.closed if start in files]
+        names = list(NAME_RE.finditer(text))
+        name_starts = [m.start() for m in names]
+        for start, end, obj in issues:
+            if any(s < start < e for s, e in spans):
+                continue
+            # An issue whose file object never closed (or is malformed)
+            # belongs to the nearest file name before it
+            i = bisect_left(name_starts, start) - 1
+            if i < 0:
+                continue
+            owner = names[i]
+            if owner.start() not in files:
+                files[owner.start()] = {"name": json.loads(f'"{owner.group(1)}"'), "issues": []}
+            files[owner.start()]["issues"].append(obj)
+            recovered_end = max(recovered_end, end)
+
+        return [files[k] for k in sorted(files)], text[recovered_end:]
+
+
+class JSONStreamExtractor:
+    """
+    Finds the first JSON object in a model reply without regexes or
+    backtracking. Text can be fed as it streams in; scanning is linear and
+    stops as soon as the object closes, so prose after it costs nothing.
+
+    Brace pairs in prose before the JSON ("use {x} here") are skipped: a
+    region only counts if it parses. If the reply ends before the object
+    closes, the complete file and issue objects inside it are recovered.
+    """
+
+    def __init__(self):
+        self._current: Optional[_Candidate] = None
+        self._failed: Optional[_Candidate] = None
+        self._data: Optional[dict] = None
+        self._found = False
+
+    @property
+    def done(self) -> bool:
+        return self._data is not None
+
+    def feed(self, piece: str) -> bool:
+        """Consumes the next piece of the reply; returns True once a valid object is read."""
+        if self.done:
+            return True
+        for ch in piece:
+            if self._current is None:
+                if ch != '{':
+                    continue
+                self._current = _Candidate()
+                self._found = True
+            if self._current.push(ch):
+                try:
+                    data = json.loads(self._current.text)
+                except json.JSONDecodeError:
+                    data = None
+                if isinstance(data, dict):
+                    self._data = data
+                    self._current = None
+                    return True
+                self._failed, self._current = self._current, None
+        return False
+
+    def result(self) -> Extraction:
+        if self._data is not None:
+            return Extraction(found=True, data=self._data)
+        # Prefer the object that was still open when the reply ended
+        candidate = self._current if self._current is not None and self._current.closed else None
+        candidate = candidate or self._failed or self._current
+        if candidate is None:
+            return Extraction(found=self._found)
+        files, broken = candidate.recover()
+        return Extraction(found=True, recovered_files=files, broken=broken)
+
+
+def extract_json(text: str) -> Extraction:
+    extractor = JSONStreamExtractor()
+    extractor.feed(text)
+    return extractor.result()
@@ -0,0 +1,288 @@
+# app/agent/llm_engine.py
+import asyncio
+import contextlib
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Coroutine, Dict, List, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from app.store.redis_client import REDIS_URL
+from app.telemetry import LLM_THROTTLED
+
+# Model calls in flight at the same time, across every worker (coordinated in Redis)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Prompt + completion tokens per minute across every worker; 0 means no limit
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))
+# A slot whose holder died mid-call is reclaimed after this long
+LLM_SLOT_LEASE_SECONDS = float(os.getenv("LLM_SLOT_LEASE_SECONDS", str(LLM_TIMEOUT + 30)))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+# 'redis' (limits shared by every worker) or 'local' (per-process concurrency only, no token budget)
+LLM_LIMITS_BACKEND = os.getenv("LLM_LIMITS_BACKEND", "redis")
+# Provider answers that mean "slow down" rather than "this request is wrong"
+THROTTLE_STATUSES = (429, 503)
+
+SLOTS_KEY = "llm-limit:slots"
+TOKENS_KEY_PREFIX = "llm-limit:tokens:"
+
+# Drops expired holders, then takes a slot if one is free. Uses the server
+# clock so workers with skewed clocks agree on lease expiry.
+_ACQUIRE_SLOT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[1]))
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[1])))
+    return 1
+end
+return 0
+"""
+
+# Fixed one-minute windows. Returns 0 once the tokens are booked, or the
+# seconds until the next window. A lone oversized request is let through.
+_RESERVE_TOKENS = """
+local t = redis.call('TIME')
+local second = tonumber(t[1])
+local key = KEYS[1] .. math.floor(second / 60)
+local used = tonumber(redis.call('GET', key) or '0')
+if used > 0 and used + tonumber(ARGV[1]) > tonumber(ARGV[2]) then
+    return 60 - second % 60
+end
+redis.call('INCRBY', key, ARGV[1])
+redis.call('EXPIRE', key, 120)
+return 0
+"""
+
+# Adds tokens to the current window without checking the budget
+_BOOK_TOKENS = """
+local t = redis.call('TIME')
+local key = KEYS[1] .. math.floor(tonumber(t[1]) / 60)
+redis.call('INCRBY', key, ARGV[1])
+redis.call('EXPIRE', key, 120)
+return 0
+"""
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Completion:
+    """A model reply and what it cost."""
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: int = 0
+    # Calls retried after the provider throttled us
+    retries: int = 0
+    # Served by an identical call that was already in flight (its tokens are counted there)
+    coalesced: bool = False
+
+
+@dataclass
+class _SharedCall:
+    """A model call in flight and how many callers are waiting for its reply."""
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class LLMEngine:
+    """
+    Runs model calls on one asyncio loop in a background thread, so a worker
+    process can keep the calls of many reviews in flight at once.
+
+    Every call takes a slot of a concurrency limit shared by all workers
+    through Redis, and books its tokens against an optional per-minute
+    budget. Identical prompts in flight at the same time share one call,
+    which is cancelled once every caller waiting for it was cancelled.
+    429 and 503 answers are retried with jittered exponential backoff.
+    If Redis is unreachable (or LLM_LIMITS_BACKEND is 'local') only the
+    per-process limit applies.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+                 client: Optional[aioredis.Redis] = None, shared: bool = LLM_LIMITS_BACKEND == "redis"):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.shared = shared
+        self.loop = asyncio.new_event_loop()
+        self._client = client
+        self._local_slots = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[str, _SharedCall] = {}
+        self._thread = threading.Thread(target=self.loop.run_forever, name="llm-engine", daemon=True)
+        self._thread.start()
+
+    def run(self, coro: Coroutine) -> Future:
+        """Schedules a coroutine on the engine's loop; callable from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _redis(self) -> aioredis.Redis:
+        if self._client is None:
+            self._client = aioredis.Redis.from_url(REDIS_URL)
+        return self._client
+
+    async def complete(self, model: str, messages: List[dict], tokens: int = 0) -> Completion:
+        """
+        Sends a chat completion request. `tokens` is the prompt size used to
+        book the token budget before the call; the real usage is booked after.
+        """
+        key = hashlib.sha256(json.dumps([model, messages], sort_keys=True).encode()).hexdigest()
+        call = self._inflight.get(key)
+        coalesced = call is not None
+        if call is None:
+            call = _SharedCall(asyncio.ensure_future(self._complete(model, messages, tokens)))
+            self._inflight[key] = call
+            call.task.add_done_callback(lambda _, call=call: self._forget(key, call))
+
+        call.waiters += 1
+        try:
+            # Shielded so a caller giving up does not cancel the call for the others sharing it
+            completion = await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is left waiting for the reply; stop spending tokens and a slot on it
+                self._forget(key, call)
+                call.task.cancel()
+        if coalesced:
+            return dataclasses.replace(completion, prompt_tokens=0, completion_tokens=0, coalesced=True)
+        return completion
+
+    def _forget(self, key: str, call: _SharedCall) -> None:
+        # A newer call with the same prompt may have taken the key already
+        if self._inflight.get(key) is call:
+            del self._inflight[key]
+
+    async def _complete(self, model: str, messages: List[dict], tokens: int) -> Completion:
+        # Takes a second or more to import; processes that never call a model skip it
+        import litellm
+
+        attempt = 0
+        while True:
+            try:
+                # Waiting for the token budget must not hold a slot other calls could use
+                await self._reserve_tokens(tokens)
+                async with self._slot():
+                    started = time.perf_counter()
+                    response = await litellm.acompletion(model=model, messages=messages, timeout=LLM_TIMEOUT)
+                    latency_ms = int((time.perf_counter() - started) * 1000)
+                break
+            except Exception as e:
+                if getattr(e, "status_code", None) not in THROTTLE_STATUSES or attempt >= LLM_MAX_RETRIES:
+                    raise
+                delay = self._backoff(attempt, e)
+                LLM_THROTTLED.labels(model).inc()
+                logger.warning("Model call throttled, backing off", extra={
+                    "model": model, "status": e.status_code, "attempt": attempt + 1, "retry_in_s": round(delay, 2),
+                })
+                attempt += 1
+                await asyncio.sleep(delay)
+
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        # The prompt was booked up front from the estimate; book the reply now
+        await self._book_tokens(completion_tokens)
+        return Completion(
+            text=response.choices[0].message.content or "",
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=latency_ms,
+            retries=attempt,
+        )
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Honours Retry-After when the provider sends one, else full-jitter exponential backoff."""
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_BACKOFF_MAX) + random.uniform(0, LLM_BACKOFF_BASE)
+            except ValueError:
+                pass
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        """One slot of the local and of the Redis-wide concurrency limit."""
+        async with self._local_slots:
+            holder = None
+            try:
+                holder = await self._acquire_slot()
+                yield
+            finally:
+                if holder is not None:
+                    await self._release_slot(holder)
+
+    async def _acquire_slot(self) -> Optional[str]:
+        if not self.shared:
+            return None
+        holder = uuid.uuid4().hex
+        wait = 0.05
+        while True:
+            try:
+                acquired = await self._redis().eval(
+                    _ACQUIRE_SLOT, 1, SLOTS_KEY, LLM_SLOT_LEASE_SECONDS, self.max_concurrency, holder
+                )
+            except redis.RedisError as e:
+                logger.warning("LLM slot limiter unavailable, using the local limit", extra={"error": str(e)})
+                return None
+            if acquired:
+                return holder
+            await asyncio.sleep(wait + random.uniform(0, wait))
+            wait = min(wait * 2, 1.0)
+
+    async def _release_slot(self, holder: str) -> None:
+        try:
+            await self._redis().zrem(SLOTS_KEY, holder)
+        except redis.RedisError as e:
+            # The lease expires on its own
+            logger.warning("Could not release LLM slot", extra={"error": str(e)})
+
+    async def _reserve_tokens(self, tokens: int) -> None:
+        if not self.shared or self.tokens_per_minute <= 0 or tokens <= 0:
+            return
+        while True:
+            try:
+                wait = await self._redis().eval(_RESERVE_TOKENS, 1, TOKENS_KEY_PREFIX, tokens, self.tokens_per_minute)
+            except redis.RedisError as e:
+                logger.warning("LLM token budget unavailable, not enforcing it", extra={"error": str(e)})
+                return
+            if not wait:
+                return
+            await asyncio.sleep(float(wait) + random.uniform(0, 1))
+
+    async def _book_tokens(self, tokens: int) -> None:
+        if not self.shared or self.tokens_per_minute <= 0 or tokens <= 0:
+            return
+        try:
+            await self._redis().eval(_BOOK_TOKENS, 1, TOKENS_KEY_PREFIX, tokens)
+        except redis.RedisError as e:
+            logger.warning("Could not book LLM tokens", extra={"error": str(e)})
+
+
+_engine: Optional[LLMEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> LLMEngine:
+    """Returns the process-wide engine, starting its loop on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = LLMEngine()
+        return _engine
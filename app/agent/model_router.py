@@ -0,0 +1,92 @@
+# app/agent/model_router.py
+import fnmatch
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+from app.diff.chunker import DiffChunk
+
+RISK_LEVELS = ("low", "medium", "high")
+
+DEFAULT_MODEL = os.getenv("REVIEW_MODEL", "huggingface/meta-llama/Meta-Llama-3-8B-Instruct")
+
+# Routes are tried in order; the first one that accepts the chunk's size and
+# risk wins. Override with a JSON list in REVIEW_MODEL_ROUTES.
+DEFAULT_ROUTES = [
+    {"name": "fast", "model": "huggingface/meta-llama/Llama-3.2-3B-Instruct",
+     "max_tokens": 600, "max_risk": "low"},
+    {"name": "standard", "model": DEFAULT_MODEL,
+     "max_tokens": 2500, "max_risk": "medium"},
+    {"name": "strong", "model": "huggingface/meta-llama/Meta-Llama-3-70B-Instruct",
+     "max_tokens": None, "max_risk": "high"},
+]
+
+# Paths whose changes are always reviewed by the strongest route
+CRITICAL_PATHS = [p.strip() for p in os.getenv(
+    "REVIEW_CRITICAL_PATHS",
+    "*auth*,*security*,*crypto*,*password*,*payment*,*billing*,*migrations/*,*.sql,"
+    "Dockerfile,*.github/workflows/*,*settings*.py,*config*.py"
+).split(",") if p.strip()]
+
+# Paths where a cheap review is good enough
+LOW_RISK_PATHS = ["*.md", "*.rst", "*.txt", "docs/*", "*tests/*", "*test_*.py", "*_test.go", "*.spec.*"]
+
+RISKY_CODE_RE = re.compile(
+    r'\b(?:eval|exec|pickle\.loads|yaml\.load|subprocess|os\.system|shell\s*=\s*True|'
+    r'password|secret|token|api_key|verify\s*=\s*False|innerHTML|dangerouslySetInnerHTML)\b'
+    r'|(?:SELECT|INSERT|UPDATE|DELETE)\s.*(?:%s|\{|\+\s*\w)',
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class ModelRoute:
+    name: str
+    model: str
+    max_tokens: Optional[int] = None
+    max_risk: str = "high"
+
+    def accepts(self, tokens: int, risk: str) -> bool:
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            return False
+        return RISK_LEVELS.index(risk) <= RISK_LEVELS.index(self.max_risk)
+
+
+def load_routes() -> List[ModelRoute]:
+    raw = os.getenv("REVIEW_MODEL_ROUTES")
+    routes = json.loads(raw) if raw else DEFAULT_ROUTES
+    return [ModelRoute(**route) for route in routes]
+
+
+def assess_risk(chunk: DiffChunk) -> str:
+    """Classifies a chunk as low, medium or high risk from its path and added code."""
+    path = chunk.file_path
+    if any(fnmatch.fnmatch(path, pattern) for pattern in CRITICAL_PATHS):
+        return "high"
+    for hunk in chunk.hunks:
+        for line in hunk.lines:
+            if line[:1] == '+' and RISKY_CODE_RE.search(line):
+                return "high"
+    if any(fnmatch.fnmatch(path, pattern) for pattern in LOW_RISK_PATHS):
+        return "low"
+    return "medium"
+
+
+class ModelRouter:
+    """Chooses the model for a chunk from a configurable routing table."""
+
+    def __init__(self, routes: Optional[List[ModelRoute]] = None):
+        self.routes = routes or load_routes()
+
+    @property
+    def models(self) -> List[str]:
+        return list(dict.fromkeys(route.model for route in self.routes))
+
+    def route(self, tokens: int, risk: str) -> ModelRoute:
+        for route in self.routes:
+            if route.accepts(tokens, risk):
+                return route
+        # Nothing matched (misconfigured table): use the last, usually strongest, route
+        return self.routes[-1]
@@ -0,0 +1,170 @@
+# app/agent/prompt_builder.py
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+from app.context.code_index import CodeIndex
+from app.context.retrieval import CONTEXT_TOKEN_BUDGET, select_context
+from app.diff.chunker import DiffChunk, estimate_tokens
+from app.diff.parser import Hunk
+from app.models import Issue
+
+# Unchanged lines kept around each change; the rest of the context is dropped
+PROMPT_CONTEXT_LINES = int(os.getenv("PROMPT_CONTEXT_LINES", "2"))
+# 'estimate' (chars / 4, same unit as the chunker) or 'litellm' (the model's
+# real tokenizer; it is downloaded from the Hugging Face hub on first use)
+PROMPT_TOKEN_COUNTER = os.getenv("PROMPT_TOKEN_COUNTER", "estimate")
+
+# Longest broken reply fragment sent back to the model for repair
+REPAIR_MAX_CHARS = int(os.getenv("REVIEW_REPAIR_MAX_CHARS", "4000"))
+
+# Compact replacement for the old pretty-printed schema. The summary is
+# computed by us, so the model only has to produce the per-file issues.
+COMPACT_SCHEMA = (
+    '{"files":[{"name":"<path>","issues":[{"type":"bug|style|performance|best_practice",'
+    '"line":<int>,"description":"<text>","suggestion":"<text>"}]}]}'
+)
+
+
+# The reviewer's persona, sent as the system message of every call
+SYSTEM_PROMPT = (
+    "You are a Senior Code Quality Reviewer, an AI assistant specialized in code review. "
+    "You have a keen eye for detail and a deep understanding of software engineering "
+    "principles. Your goal is to find bugs, style issues, performance bottlenecks and "
+    "best practice violations in GitHub pull request diffs, and to give constructive, "
+    "actionable feedback in a structured JSON format. You must identify the specific "
+    "file and line number for every issue."
+)
+
+
+def chat_messages(prompt: str) -> List[dict]:
+    """The system persona followed by one user prompt."""
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Counts tokens with the model's tokenizer when PROMPT_TOKEN_COUNTER is
+    'litellm', and with the ~4 characters per token estimate otherwise.
+    """
+    if model and PROMPT_TOKEN_COUNTER == "litellm":
+        try:
+            import litellm
+            return litellm.token_counter(model=model, text=text)
+        except Exception:
+            pass
+    return estimate_tokens(text)
+
+
+def compact_hunk(hunk: Hunk, context: int = PROMPT_CONTEXT_LINES) -> List[Hunk]:
+    """
+    Drops context lines further than `context` lines away from any change.
+    Where lines are dropped the hunk is split, and each piece gets a correct
+    '@@' header so reported line numbers stay right.
+    """
+    changed = [i for i, line in enumerate(hunk.lines) if line[:1] in ('+', '-')]
+    if not changed:
+        return []
+
+    keep = [False] * len(hunk.lines)
+    for i in changed:
+        for j in range(max(0, i - context), min(len(hunk.lines), i + context + 1)):
+            keep[j] = True
+
+    pieces: List[Hunk] = []
+    current: Optional[Hunk] = None
+    old_no, new_no = hunk.old_start, hunk.new_start
+    for i, line in enumerate(hunk.lines):
+        tag = line[:1]
+        if keep[i] or (tag == '\\' and current is not None):
+            if current is None:
+                current = Hunk(old_start=old_no, old_count=0, new_start=new_no, new_count=0, section=hunk.section)
+                pieces.append(current)
+            current.lines.append(line)
+            if tag in ('-', ' ', ''):
+                current.old_count += 1
+            if tag in ('+', ' ', ''):
+                current.new_count += 1
+        else:
+            current = None
+
+        if tag in ('-', ' ', ''):
+            old_no += 1
+        if tag in ('+', ' ', ''):
+            new_no += 1
+
+    return pieces
+
+
+@dataclass
+class ReviewPrompt:
+    """The text sent to the model for one chunk, with its measured size."""
+    text: str
+    diff_tokens: int
+    tokens: int
+    # Repository definitions attached for context, part of `tokens`
+    context_tokens: int = 0
+
+
+class PromptBuilder:
+    """Builds compact, token-counted review prompts for diff chunks."""
+
+    def __init__(self, context_lines: int = PROMPT_CONTEXT_LINES, context_tokens: int = CONTEXT_TOKEN_BUDGET):
+        self.context_lines = context_lines
+        self.context_tokens = context_tokens
+
+    def compact_diff(self, chunk: DiffChunk) -> str:
+        """The chunk's diff without the 'index' header and far-away context lines."""
+        header = [line for line in chunk.header_text.splitlines() if line.startswith(('---', '+++'))]
+        parts = header or [f"+++ b/{chunk.file_path}"]
+        for hunk in chunk.hunks:
+            for piece in compact_hunk(hunk, self.context_lines):
+                parts.append(piece.text())
+        return "\n".join(parts)
+
+    def build(self, repo_url: str, pr_number: int, chunk: DiffChunk,
+              known_issues: Optional[List[Issue]] = None, model: Optional[str] = None,
+              code_index: Optional[CodeIndex] = None) -> ReviewPrompt:
+        diff_text = self.compact_diff(chunk)
+
+        context = ""
+        if code_index is not None and self.context_tokens > 0:
+            blocks = select_context(code_index, chunk, self.context_tokens)
+            if blocks:
+                joined = "\n".join(blocks)
+                context = (
+                    f"Related code from the base branch, for reference only (do not review it):\n"
+                    f"---\n{joined}\n---\n"
+                )
+
+        already_reported = ""
+        if known_issues:
+            listed = "\n".join(f"- line {i.line}: {i.description}" for i in known_issues)
+            already_reported = f"\nAlready reported by automated checks, do NOT repeat:\n{listed}\n"
+
+        text = (
+            f"Review this diff of \"{chunk.file_path}\" (PR #{pr_number}, {repo_url}) for bugs, "
+            f"style, performance and best-practice issues. Line numbers are new-file line "
+            f"numbers (the '+' side of each @@ header).\n"
+            f"{context}"
+            f"Diff:\n---\n{diff_text}\n---\n"
+            f"{already_reported}"
+            f"Reply with JSON only, exactly in this shape: {COMPACT_SCHEMA}\n"
+            f'No issues: {{"files": []}}'
+        )
+        return ReviewPrompt(
+            text=text,
+            diff_tokens=count_tokens(diff_text, model),
+            tokens=count_tokens(text, model),
+            context_tokens=count_tokens(context, model) if context else 0,
+        )
+
+    def build_repair(self, file_path: str, fragment: str) -> str:
+        """A prompt asking the model to fix only the unparseable tail of its reply."""
+        fragment = fragment[:REPAIR_MAX_CHARS]
+        return (
+            f"This is the end of a code review of \"{file_path}\" that is not valid JSON "
+            f"(it was cut off or is malformed):\n---\n{fragment}\n---\n"
+            f"Rewrite the issues it contains as JSON only, exactly in this shape: {COMPACT_SCHEMA}\n"
+            f"Drop an issue if its text is cut off. No issues: {{\"files\": []}}"
+        )
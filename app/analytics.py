@@ -0,0 +1,264 @@
+# app/analytics.py
+import logging
+import os
+import sqlite3
+import threading
+from collections import Counter
+from typing import List, Optional
+
+import redis
+
+from .store.analytics_queue import AnalyticsQueue
+
+# Load finished reviews into the analytics database and serve /analytics
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "true").lower() == "true"
+ANALYTICS_DB_PATH = os.getenv("ANALYTICS_DB_PATH", os.path.join("data", "analytics.db"))
+# Run the loader in this process. The database is a local SQLite file with a
+# single writer: turn this on in exactly one API process, the one whose disk
+# holds ANALYTICS_DB_PATH. The others only serve /analytics from that file.
+ANALYTICS_LOADER = os.getenv("ANALYTICS_LOADER", "false").lower() == "true"
+# Reviews loaded per transaction, and seconds between loads while the queue is short
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "500"))
+ANALYTICS_FLUSH_SECONDS = float(os.getenv("ANALYTICS_FLUSH_SECONDS", "2"))
+
+logger = logging.getLogger(__name__)
+
+# One row per issue of the latest review of each PR, plus per-day counts
+# kept up to date as reviews are loaded. Aggregate queries only read the
+# counts, whose size grows with days and repositories, not with issues.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prs (
+    repo TEXT NOT NULL,
+    pr_number INTEGER NOT NULL,
+    head_sha TEXT,
+    reviewed_at INTEGER NOT NULL,
+    total_files INTEGER NOT NULL,
+    total_issues INTEGER NOT NULL,
+    critical_issues INTEGER NOT NULL,
+    PRIMARY KEY (repo, pr_number)
+);
+CREATE INDEX IF NOT EXISTS prs_by_time ON prs (reviewed_at, repo, total_issues, critical_issues);
+
+CREATE TABLE IF NOT EXISTS issues (
+    repo TEXT NOT NULL,
+    pr_number INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    type TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    on_added_line INTEGER,
+    reviewed_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS issues_by_pr ON issues (repo, pr_number, file, type);
+
+CREATE TABLE IF NOT EXISTS daily_file_issues (
+    repo TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (repo, day, file, type)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS daily_issue_types (
+    repo TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (repo, day, type)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS daily_issue_types_by_day ON daily_issue_types (day, repo, type, count);
+"""
+
+DAY_SECONDS = 86400
+
+
+def _bump(connection: sqlite3.Connection, repo: str, counts: Counter, sign: int) -> None:
+    """Adds (or with sign=-1 removes) issue counts keyed by (day, file, type)."""
+    connection.executemany(
+        "INSERT INTO daily_file_issues VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (repo, day, file, type) DO UPDATE SET count = count + excluded.count",
+        [(repo, day, file, issue_type, sign * n) for (day, file, issue_type), n in counts.items()],
+    )
+    by_type: Counter = Counter()
+    for (day, _, issue_type), n in counts.items():
+        by_type[(day, issue_type)] += n
+    connection.executemany(
+        "INSERT INTO daily_issue_types VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (repo, day, type) DO UPDATE SET count = count + excluded.count",
+        [(repo, day, issue_type, sign * n) for (day, issue_type), n in by_type.items()],
+    )
+
+
+class AnalyticsDB:
+    """
+    Issues of reviewed PRs in a local SQLite database, for aggregate
+    questions across PRs ("most frequent issue types per repo this week").
+    A re-review of a PR replaces its rows, so nothing is counted twice.
+    Counts are kept per UTC day, so a window of `days` days starts at the
+    beginning of the oldest day.
+    """
+
+    def __init__(self, path: str = ANALYTICS_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must stay on the thread that opened them
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            # Readers are never blocked by the loader
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def ingest(self, records: List[dict]) -> int:
+        """Loads queued reviews (see review_record) in one transaction; returns the issue rows written."""
+        connection = self._connection()
+        written = 0
+        with connection:
+            for record in records:
+                repo, pr_number, reviewed_at = record["repo"], record["pr"], record["at"]
+                existing = connection.execute(
+                    "SELECT reviewed_at FROM prs WHERE repo = ? AND pr_number = ?", (repo, pr_number)
+                ).fetchone()
+                if existing:
+                    if existing[0] > reviewed_at:
+                        # An older review that was loaded late
+                        continue
+                    previous = connection.execute(
+                        "SELECT reviewed_at / ?, file, type, COUNT(*) FROM issues "
+                        "WHERE repo = ? AND pr_number = ? GROUP BY 1, 2, 3",
+                        (DAY_SECONDS, repo, pr_number),
+                    ).fetchall()
+                    _bump(connection, repo, Counter({(d, f, t): n for d, f, t, n in previous}), -1)
+                    connection.execute("DELETE FROM issues WHERE repo = ? AND pr_number = ?", (repo, pr_number))
+
+                connection.execute(
+                    "INSERT OR REPLACE INTO prs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (repo, pr_number, record["sha"], reviewed_at, record["files"],
+                     len(record["issues"]), record["critical"]),
+                )
+                connection.executemany(
+                    "INSERT INTO issues VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(repo, pr_number, file, issue_type, line,
+                      None if on_added is None else int(on_added), reviewed_at)
+                     for file, issue_type, line, on_added in record["issues"]],
+                )
+                day = reviewed_at // DAY_SECONDS
+                _bump(connection, repo, Counter((day, file, issue_type)
+                                                for file, issue_type, _, _ in record["issues"]), 1)
+                written += len(record["issues"])
+            connection.execute("DELETE FROM daily_file_issues WHERE count <= 0")
+            connection.execute("DELETE FROM daily_issue_types WHERE count <= 0")
+        return written
+
+    def _query(self, sql: str, params: tuple) -> List[dict]:
+        cursor = self._connection().execute(sql, params)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def issue_types(self, since: int, repo: Optional[str] = None, limit: int = 20) -> List[dict]:
+        """Issue counts by type, per repository, most frequent first (`limit` types per repository)."""
+        where, params = "day >= ?", [since // DAY_SECONDS]
+        if repo:
+            where, params = "repo = ? AND day >= ?", [repo.lower(), since // DAY_SECONDS]
+        return self._query(
+            f"SELECT repo, type, count FROM ("
+            f"  SELECT repo, type, SUM(count) AS count,"
+            f"         ROW_NUMBER() OVER (PARTITION BY repo ORDER BY SUM(count) DESC, type) AS rank"
+            f"  FROM daily_issue_types WHERE {where} GROUP BY repo, type"
+            f") WHERE rank <= ? ORDER BY repo, count DESC, type",
+            (*params, limit),
+        )
+
+    def files(self, repo: str, since: int, issue_type: Optional[str] = None, limit: int = 20) -> List[dict]:
+        """The files of a repository with the most issues (of one type, if given)."""
+        where, params = "repo = ? AND day >= ?", [repo.lower(), since // DAY_SECONDS]
+        if issue_type:
+            where += " AND type = ?"
+            params.append(issue_type.lower())
+        return self._query(
+            f"SELECT repo, file, SUM(count) AS count FROM daily_file_issues WHERE {where} "
+            f"GROUP BY repo, file ORDER BY count DESC, file LIMIT ?",
+            (*params, limit),
+        )
+
+    def repos(self, since: int) -> List[dict]:
+        """PRs reviewed and issues found per repository."""
+        return self._query(
+            "SELECT repo, COUNT(*) AS prs_reviewed, SUM(total_issues) AS issues, "
+            "SUM(critical_issues) AS critical_issues FROM prs WHERE reviewed_at >= ? "
+            "GROUP BY repo ORDER BY issues DESC, repo",
+            (since // DAY_SECONDS * DAY_SECONDS,),
+        )
+
+
+class AnalyticsLoader:
+    """
+    Background thread that moves finished reviews from the Redis queue into
+    the database, one transaction per batch. It is the database's only
+    writer, so it runs in the one API process started with ANALYTICS_LOADER.
+    """
+
+    def __init__(self, db: AnalyticsDB, queue: Optional[AnalyticsQueue] = None,
+                 batch_size: int = ANALYTICS_BATCH_SIZE, interval: float = ANALYTICS_FLUSH_SECONDS):
+        self.db = db
+        self.queue = queue or AnalyticsQueue()
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def load_once(self) -> int:
+        """Loads one batch; returns the number of reviews taken from the queue."""
+        records = self.queue.take(self.batch_size)
+        if not records:
+            return 0
+        try:
+            rows = self.db.ingest(records)
+        except sqlite3.Error:
+            # Put them back for the next round rather than losing them
+            self.queue.push(records)
+            raise
+        logger.info("Analytics loaded", extra={"reviews": len(records), "issues": rows})
+        return len(records)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                taken = self.load_once()
+            except (redis.RedisError, sqlite3.Error) as e:
+                logger.warning("Analytics load failed", extra={"error": str(e)})
+                taken = 0
+            # A full batch means more are waiting
+            if taken < self.batch_size:
+                self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="analytics-loader", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+_db: Optional[AnalyticsDB] = None
+_db_lock = threading.Lock()
+
+
+def get_analytics_db() -> AnalyticsDB:
+    """Returns the process-wide analytics database."""
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = AnalyticsDB()
+        return _db
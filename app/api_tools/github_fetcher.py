@@ -1,59 +1,460 @@
 # app/api_tools/github_fetcher.py
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
 import requests
-from urllib.parse import urlparse
-from typing import Optional
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote, urlparse
+from typing import IO, List, Optional, Tuple, Union
+
+DIFF_MEDIA_TYPE = "application/vnd.github.v3.diff"
+JSON_MEDIA_TYPE = "application/vnd.github.v3+json"
+RAW_MEDIA_TYPE = "application/vnd.github.raw"
+# The compare API lists at most this many files; a full list may be truncated
+COMPARE_MAX_FILES = 300
+
+# Point this at a local stub server to run without touching github.com
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip('/')
+# (connect, read) timeouts in seconds
+REQUEST_TIMEOUT = (
+    float(os.getenv("GITHUB_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("GITHUB_READ_TIMEOUT", "60")),
+)
+MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", "4"))
+BACKOFF_BASE_SECONDS = float(os.getenv("GITHUB_BACKOFF_BASE", "1.0"))
+# Stop and wait for the reset once this few requests are left in the window
+RATE_LIMIT_RESERVE = int(os.getenv("GITHUB_RATE_LIMIT_RESERVE", "5"))
+# Never sleep longer than this for a rate limit reset; fail instead
+MAX_RATE_LIMIT_WAIT = float(os.getenv("GITHUB_MAX_RATE_LIMIT_WAIT", "120"))
+ETAG_CACHE_MAX_BYTES = int(os.getenv("GITHUB_ETAG_CACHE_BYTES", str(64 * 1024 * 1024)))
+POOL_SIZE = int(os.getenv("GITHUB_POOL_SIZE", "16"))
+# Downloaded diffs stay in memory up to this size and are spooled to disk beyond it
+DIFF_SPOOL_BYTES = int(os.getenv("GITHUB_DIFF_SPOOL_BYTES", str(8 * 1024 * 1024)))
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+# Items per page of paginated lists (GitHub's maximum)
+LIST_PAGE_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+class ConditionalCache:
+    """
+    Size-bounded LRU of GitHub responses keyed by (identity, url, media type).
+
+    Holds the ETag / Last-Modified validators, so a repeated request can be
+    sent as a conditional GET and a 304 answered from memory.
+    """
+
+    def __init__(self, max_bytes: int = ETAG_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Tuple[Optional[str], Optional[str], str]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, etag: Optional[str], last_modified: Optional[str], body: str) -> None:
+        if not etag and not last_modified:
+            return
+        cost = len(body)
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[2])
+            self._entries[key] = (etag, last_modified, body)
+            self._size += cost
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[2])
+
+
+class RateLimitTracker:
+    """Tracks X-RateLimit-* headers per token so we can slow down before a 403."""
+
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def update(self, identity: str, headers) -> None:
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        with self._lock:
+            self._state[identity] = (int(remaining), float(reset))
+
+    def wait_time(self, identity: str) -> float:
+        """Seconds to wait before the next request may be sent (0 if none)."""
+        with self._lock:
+            remaining, reset = self._state.get(identity, (None, 0.0))
+        if remaining is None or remaining > RATE_LIMIT_RESERVE:
+            return 0.0
+        return max(0.0, reset - time.time())
+
+
+# Shared by every GitHubFetcher in the process, so connections are reused
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_response_cache = ConditionalCache()
+_rate_limits = RateLimitTracker()
+
+
+def get_session() -> requests.Session:
+    """Returns the process-wide pooled session used for all GitHub calls."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
 
 class GitHubFetcher:
     """A tool to fetch Pull Request data from GitHub."""
-    
-    def __init__(self, token: Optional[str] = None):
+
+    def __init__(self, token: Optional[str] = None, api_url: Optional[str] = None):
+        self.api_url = (api_url or GITHUB_API_URL).rstrip('/')
         self.headers = {
-            "Accept": "application/vnd.github.v3.diff"
+            "Accept": DIFF_MEDIA_TYPE
         }
         if token:
             self.headers["Authorization"] = f"token {token}"
-            
+        # Rate limits and cached responses are tracked per token, never shared across them
+        self.identity = hashlib.sha256((token or "anonymous").encode()).hexdigest()[:16]
+        self.session = get_session()
+
     def _parse_url(self, repo_url: str):
         """Extracts 'owner/repo' from 'https://github.com/owner/repo'."""
         path = urlparse(repo_url).path.strip('/')
-        
+
         # Remove .git suffix if present
         if path.endswith('.git'):
             path = path[:-4]
-            
+
         parts = path.split('/')
         if len(parts) >= 2:
             return f"{parts[0]}/{parts[1]}"
-        
+
         raise ValueError("Invalid GitHub repository URL format. Expected 'https://github.com/owner/repo'.")
 
+    def repo_path(self, repo_url: str) -> str:
+        """Public wrapper around _parse_url, used to build stable per-repo keys."""
+        return self._parse_url(repo_url)
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """Delay before retry number `attempt`; honours Retry-After when GitHub sends it."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                reset = float(response.headers.get("X-RateLimit-Reset", time.time()))
+                return max(1.0, reset - time.time())
+        return BACKOFF_BASE_SECONDS * (2 ** attempt) + random.uniform(0, BACKOFF_BASE_SECONDS)
+
+    def _is_retryable(self, response: requests.Response, write: bool = False) -> bool:
+        """
+        5xx, 429 and GitHub's secondary rate limits (a 403 with Retry-After)
+        are transient. A write answered with a 5xx may have been applied, so
+        only rate limits are retried for writes.
+        """
+        if response.status_code == 429 or (response.status_code >= 500 and not write):
+            return True
+        if response.status_code == 403:
+            if response.headers.get("Retry-After"):
+                return True
+            return "secondary rate limit" in response.text.lower()
+        return False
+
+    def _wait_for_rate_limit(self) -> None:
+        wait = _rate_limits.wait_time(self.identity)
+        if wait <= 0:
+            return
+        if wait > MAX_RATE_LIMIT_WAIT:
+            raise PermissionError(f"GitHub API rate limit nearly exhausted; resets in {int(wait)}s.")
+        logger.warning("GitHub rate limit almost used up, waiting for the reset", extra={"wait_s": round(wait, 1)})
+        time.sleep(wait)
+
+    def _send(self, api_url: str, headers: dict, not_found_message: str, stream: bool = False,
+              method: str = "GET", payload: Optional[dict] = None) -> requests.Response:
+        """
+        Sends a request to `api_url` (a GET unless `method` says otherwise,
+        with `payload` as its JSON body), retrying transient failures with
+        backoff. Returns the 2xx (or 304) response and raises for anything else.
+        """
+        write = method != "GET"
+        for attempt in range(MAX_RETRIES + 1):
+            self._wait_for_rate_limit()
+            logger.debug("Sending to GitHub", extra={"url": api_url, "method": method, "accept": headers.get("Accept")})
+
+            try:
+                response = self.session.request(method, api_url, headers=headers, json=payload,
+                                                timeout=REQUEST_TIMEOUT, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # A write is only sent again if it never reached GitHub
+                if attempt == MAX_RETRIES or (write and not isinstance(e, requests.exceptions.ConnectTimeout)):
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning("GitHub request failed, retrying", extra={"error": str(e), "retry_in_s": round(delay, 1)})
+                time.sleep(delay)
+                continue
+
+            _rate_limits.update(self.identity, response.headers)
+
+            if response.status_code in (200, 201, 304):
+                return response
+            if response.status_code == 404:
+                response.close()
+                raise FileNotFoundError(not_found_message)
+            if self._is_retryable(response, write) and attempt < MAX_RETRIES:
+                delay = self._backoff(attempt, response)
+                if delay > MAX_RATE_LIMIT_WAIT:
+                    break
+                logger.warning("GitHub returned an error, retrying",
+                               extra={"status": response.status_code, "retry_in_s": round(delay, 1)})
+                response.close()
+                time.sleep(delay)
+                continue
+            break
+
+        if response.status_code in (403, 429):
+            logger.warning("GitHub API rate limit exceeded or forbidden", extra={"url": api_url})
+            try:
+                message = response.json().get('message')
+            except ValueError:
+                message = response.text
+            raise PermissionError(f"GitHub API error: {message}")
+
+        # Raise an exception for other bad status codes
+        response.raise_for_status()
+        return response
+
+    def _get(self, api_url: str, accept: str, not_found_message: str) -> str:
+        """
+        Performs a conditional GET with the given media type and returns the body.
+
+        A 304 answer is served from the ETag cache and does not count against
+        the rate limit. Transient failures are retried with backoff.
+        """
+        cache_key = (self.identity, api_url, accept)
+        cached = _response_cache.get(cache_key)
+        headers = {**self.headers, "Accept": accept}
+        if cached is not None:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        response = self._send(api_url, headers, not_found_message)
+        if response.status_code == 304 and cached is not None:
+            return cached[2]
+        body = response.text
+        _response_cache.put(cache_key, response.headers.get("ETag"), response.headers.get("Last-Modified"), body)
+        return body
+
+    def _download(self, api_url: str, accept: str, not_found_message: str) -> IO[bytes]:
+        """
+        Streams a response body into a temporary file, kept in memory up to
+        DIFF_SPOOL_BYTES and on disk beyond, and returns it rewound. Large
+        bodies are never held whole, nor put in the ETag cache. A connection
+        lost half-way restarts the download.
+        """
+        headers = {**self.headers, "Accept": accept}
+        for attempt in range(MAX_RETRIES + 1):
+            response = self._send(api_url, headers, not_found_message, stream=True)
+            spool = tempfile.SpooledTemporaryFile(max_size=DIFF_SPOOL_BYTES)
+            try:
+                for block in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+                    spool.write(block)
+            except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                spool.close()
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning("GitHub download interrupted, retrying",
+                               extra={"error": str(e), "retry_in_s": round(delay, 1)})
+                time.sleep(delay)
+                continue
+            finally:
+                response.close()
+            spool.seek(0)
+            return spool
+
     def fetch_pr_diff(self, repo_url: str, pr_number: int) -> str:
         """Fetches the unified diff content of a pull request."""
-        
+
         try:
             repo_path = self._parse_url(repo_url)
-            api_url = f"https://api.github.com/repos/{repo_path}/pulls/{pr_number}"
-            
-            print(f"Fetching diff from: {api_url}")
-            
-            response = requests.get(api_url, headers=self.headers)
-            
-            if response.status_code == 200:
-                # The response.text is the unified diff
-                return response.text
-            elif response.status_code == 404:
-                raise FileNotFoundError(f"PR #{pr_number} not found for {repo_path}")
-            elif response.status_code == 403:
-                print("GitHub API rate limit exceeded or forbidden.")
-                raise PermissionError(f"GitHub API error: {response.json().get('message')}")
-            else:
-                # Raise an exception for other bad status codes
-                response.raise_for_status()
-                return "" # Should not be reached
+            api_url = f"{self.api_url}/repos/{repo_path}/pulls/{pr_number}"
+
+            # The body is the unified diff
+            return self._get(api_url, DIFF_MEDIA_TYPE, f"PR #{pr_number} not found for {repo_path}")
 
         except requests.exceptions.RequestException as e:
-            print(f"HTTP Request failed: {e}")
+            logger.error("HTTP request failed", extra={"error": str(e)})
             raise
         except ValueError as e:
-            print(f"URL parsing failed: {e}")
-            raise
\ No newline at end of file
+            logger.error("URL parsing failed", extra={"error": str(e)})
+            raise
+
+    def fetch_pr_diff_stream(self, repo_url: str, pr_number: int) -> IO[bytes]:
+        """
+        Downloads the unified diff of a pull request into a temporary binary
+        file (see _download), for PRs too large to hold as one string. The
+        caller closes it; app.diff.parser.diff_lines reads it line by line.
+        """
+        repo_path = self._parse_url(repo_url)
+        api_url = f"{self.api_url}/repos/{repo_path}/pulls/{pr_number}"
+        return self._download(api_url, DIFF_MEDIA_TYPE, f"PR #{pr_number} not found for {repo_path}")
+
+    def fetch_pr_info(self, repo_url: str, pr_number: int) -> dict:
+        """Fetches the pull request metadata (head/base SHAs, size counters...)."""
+        try:
+            repo_path = self._parse_url(repo_url)
+            api_url = f"{self.api_url}/repos/{repo_path}/pulls/{pr_number}"
+            return json.loads(self._get(api_url, JSON_MEDIA_TYPE, f"PR #{pr_number} not found for {repo_path}"))
+
+        except requests.exceptions.RequestException as e:
+            logger.error("HTTP request failed", extra={"error": str(e)})
+            raise
+
+    def fetch_compare_diff(self, repo_url: str, base_sha: str, head_sha: str,
+                           stream: bool = False) -> Union[str, IO[bytes], None]:
+        """
+        Fetches the unified diff between two commits; with `stream`, as a
+        temporary binary file like fetch_pr_diff_stream.
+
+        Returns None when head_sha does not simply extend base_sha (force
+        push, rebase), because the delta would not describe the PR anymore.
+        """
+        try:
+            repo_path = self._parse_url(repo_url)
+            api_url = f"{self.api_url}/repos/{repo_path}/compare/{base_sha}...{head_sha}"
+            not_found = f"Cannot compare {base_sha}...{head_sha} in {repo_path}"
+
+            comparison = json.loads(self._get(api_url, JSON_MEDIA_TYPE, not_found))
+            if comparison.get("status") != "ahead":
+                logger.info("Compare is not a fast-forward, a full review is needed",
+                            extra={"compare_status": comparison.get("status")})
+                return None
+
+            if stream:
+                return self._download(api_url, DIFF_MEDIA_TYPE, not_found)
+            return self._get(api_url, DIFF_MEDIA_TYPE, not_found)
+
+        except FileNotFoundError as e:
+            # The old head can disappear after a force push
+            logger.info("Previous head not found, a full review is needed", extra={"error": str(e)})
+            return None
+        except requests.exceptions.RequestException as e:
+            logger.error("HTTP request failed", extra={"error": str(e)})
+            raise
+
+    def fetch_archive(self, repo_url: str, sha: str) -> requests.Response:
+        """
+        Opens the gzipped tarball of the tree at `sha` as a streamed response
+        (one request, no history); the caller reads `.raw` and closes it.
+        """
+        repo_path = self._parse_url(repo_url)
+        self._wait_for_rate_limit()
+        response = self.session.get(
+            f"{self.api_url}/repos/{repo_path}/tarball/{sha}",
+            headers=self.headers, timeout=REQUEST_TIMEOUT, stream=True,
+        )
+        _rate_limits.update(self.identity, response.headers)
+        if response.status_code == 404:
+            response.close()
+            raise FileNotFoundError(f"Tree {sha} not found for {repo_path}")
+        if response.status_code != 200:
+            response.close()
+            response.raise_for_status()
+        response.raw.decode_content = True
+        return response
+
+    def fetch_file(self, repo_url: str, path: str, sha: str) -> str:
+        """Fetches one file of the tree at `sha`."""
+        repo_path = self._parse_url(repo_url)
+        api_url = f"{self.api_url}/repos/{repo_path}/contents/{quote(path)}?ref={sha}"
+        return self._get(api_url, RAW_MEDIA_TYPE, f"{path} not found at {sha} in {repo_path}")
+
+    def _list(self, api_url: str, not_found_message: str) -> List[dict]:
+        """Every item of a paginated JSON list, LIST_PAGE_SIZE per request."""
+        items: List[dict] = []
+        page = 1
+        while True:
+            batch = json.loads(self._get(f"{api_url}?per_page={LIST_PAGE_SIZE}&page={page}",
+                                         JSON_MEDIA_TYPE, not_found_message))
+            items.extend(batch)
+            if len(batch) < LIST_PAGE_SIZE:
+                return items
+            page += 1
+
+    def _write(self, method: str, api_url: str, payload: dict, not_found_message: str) -> dict:
+        headers = {**self.headers, "Accept": JSON_MEDIA_TYPE}
+        response = self._send(api_url, headers, not_found_message, method=method, payload=payload)
+        return response.json()
+
+    def fetch_review_comments(self, repo_url: str, pr_number: int) -> List[dict]:
+        """The inline review comments of a pull request ('id', 'path', 'line', 'body'...)."""
+        repo_path = self._parse_url(repo_url)
+        return self._list(f"{self.api_url}/repos/{repo_path}/pulls/{pr_number}/comments",
+                          f"PR #{pr_number} not found for {repo_path}")
+
+    def fetch_reviews(self, repo_url: str, pr_number: int) -> List[dict]:
+        """The reviews submitted on a pull request ('id', 'body', 'commit_id'...)."""
+        repo_path = self._parse_url(repo_url)
+        return self._list(f"{self.api_url}/repos/{repo_path}/pulls/{pr_number}/reviews",
+                          f"PR #{pr_number} not found for {repo_path}")
+
+    def create_review(self, repo_url: str, pr_number: int, commit_id: str, body: str,
+                      comments: List[dict], event: str = "COMMENT") -> dict:
+        """
+        Submits one review of `commit_id` with its inline comments ('path',
+        'line', 'side', 'body') in a single call. GitHub answers 422 when a
+        comment is not on a line of the diff.
+        """
+        repo_path = self._parse_url(repo_url)
+        return self._write("POST", f"{self.api_url}/repos/{repo_path}/pulls/{pr_number}/reviews",
+                           {"commit_id": commit_id, "body": body, "event": event, "comments": comments},
+                           f"PR #{pr_number} not found for {repo_path}")
+
+    def update_review_comment(self, repo_url: str, comment_id: int, body: str) -> dict:
+        """Replaces the text of an inline review comment."""
+        repo_path = self._parse_url(repo_url)
+        return self._write("PATCH", f"{self.api_url}/repos/{repo_path}/pulls/comments/{comment_id}",
+                           {"body": body}, f"Review comment {comment_id} not found in {repo_path}")
+
+    def fetch_changed_files(self, repo_url: str, base_sha: str, head_sha: str) -> Optional[List[dict]]:
+        """
+        The files changed from base_sha to head_sha ('filename', 'status',
+        'previous_filename'). Returns None unless head_sha simply extends
+        base_sha and the list is complete.
+        """
+        repo_path = self._parse_url(repo_url)
+        api_url = f"{self.api_url}/repos/{repo_path}/compare/{base_sha}...{head_sha}"
+        try:
+            comparison = json.loads(self._get(api_url, JSON_MEDIA_TYPE, f"Cannot compare {base_sha}...{head_sha}"))
+        except FileNotFoundError:
+            return None
+        files = comparison.get("files") or []
+        if comparison.get("status") != "ahead" or len(files) >= COMPARE_MAX_FILES:
+            return None
+        return files
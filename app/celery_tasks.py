@@ -1,49 +1,339 @@
 # app/celery_tasks.py
+import logging
+import os
+import time
 import traceback
-from typing import Optional
+from dataclasses import asdict
+from typing import IO, Optional
+import redis
 import requests
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import task_postrun, worker_init, worker_process_init
 from pydantic import ValidationError  # Correct import
 
-from .worker import celery_app
+from .worker import (REVIEW_MAX_REDELIVERIES, REVIEW_MAX_RETRIES, REVIEW_SOFT_TIME_LIMIT, REVIEW_TIME_LIMIT,
+                     ReviewDeadlineExceeded, celery_app)
 from .api_tools.github_fetcher import GitHubFetcher
-from .agent.code_reviewer import CodeReviewerCrew
+from .context.code_index import REVIEW_CONTEXT_ENABLED, get_code_index_store
+from .diff.triage import TRIAGE_ENABLED, FileTriage
 from .models import AnalysisResults
+from .publish import PUBLISH_REVIEWS, ReviewPublisher
+from .store.review_history import ReviewHistory
+from .store.result_store import ResultStore
+from .store.events import TaskEvents
+from .store.pending_pushes import PendingPushes
+from .store.checkpoints import ReviewCheckpoints
+from .store.analytics_queue import AnalyticsQueue, review_record
+from .store.admission import AdmissionCounters
+from .store.publish_locks import PublishLocks
+from .telemetry import TASK_SECONDS, configure_tracing, observe_stage, span, stage
 
-@celery_app.task(bind=True)
+# Seconds before a publish that was rate limited, or found another one running, tries again
+PUBLISH_RETRY_SECONDS = int(os.getenv("PUBLISH_RETRY_SECONDS", "60"))
+PUBLISH_MAX_RETRIES = int(os.getenv("PUBLISH_MAX_RETRIES", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """Builds the reviewer agent and LLM client once per worker process, before any task."""
+    # Span exporters run a background thread, which does not survive the fork
+    configure_tracing()
+    from .agent.code_reviewer import get_reviewer
+
+    start = time.perf_counter()
+    try:
+        get_reviewer()
+    except ValueError as e:
+        # Don't kill the pool process; the task reports the problem to the user
+        logger.error("Reviewer could not be initialized", extra={"error": str(e)})
+        return
+    logger.info("Reviewer initialized", extra={"seconds": round(time.perf_counter() - start, 2)})
+
+
+@worker_init.connect
+def init_threaded_worker(sender=None, **kwargs):
+    """Thread and solo pools run tasks in the main process, where worker_process_init never fires."""
+    if "prefork" not in str(getattr(sender, "pool_cls", "prefork")).lower():
+        init_worker_process()
+
+
+# Acknowledged only once finished, so a review whose worker died is delivered
+# again (up to REVIEW_MAX_REDELIVERIES times); its checkpointed chunks are not
+# reviewed twice
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=REVIEW_MAX_RETRIES,
+                 soft_time_limit=REVIEW_SOFT_TIME_LIMIT, time_limit=REVIEW_TIME_LIMIT)
 def analyze_pr_task(self, repo_url: str, pr_number: int, github_token: Optional[str] = None):
-    
-    print(f"Starting task {self.request.id} for {repo_url}/pull/{pr_number}")
+    context = {"task_id": self.request.id, "repo": repo_url, "pr": pr_number}
+    enqueued_at = getattr(self.request, "enqueued_at", None)
+    if enqueued_at:
+        observe_stage("queue_wait", time.time() - enqueued_at)
+
+    # Attempts in a row that never ended: their worker died under them
+    checkpoint = ReviewCheckpoints(self.request.id)
+    lost = checkpoint.begin_attempt() - 1
+    if lost > REVIEW_MAX_REDELIVERIES:
+        user_message = f"The review stopped its worker {lost} times in a row (out of memory?) and was abandoned."
+        logger.error("Review keeps losing its worker, giving up", extra={**context, "lost": lost})
+        TaskEvents(self.request.id).publish('error', {'error': user_message})
+        self.update_state(state='FAILED', meta={'error': user_message})
+        raise RuntimeError(user_message)
+
+    logger.info("Starting task", extra=context)
+    started = time.perf_counter()
+    # Thread pools ignore soft_time_limit, so the review loop checks this itself
+    deadline = time.monotonic() + REVIEW_SOFT_TIME_LIMIT
+    outcome = "failed"
+    with span("analyze_pr", **context):
+        try:
+            result = _analyze(self, repo_url, pr_number, github_token, context, deadline)
+            outcome = "succeeded"
+            return result
+        finally:
+            checkpoint.end_attempt()
+            TASK_SECONDS.labels(outcome).observe(time.perf_counter() - started)
+
+
+@task_postrun.connect(sender=analyze_pr_task)
+def record_completion(state=None, **kwargs):
+    """Counts finished reviews; the API estimates queue waits from their pace (see app/admission.py)."""
+    if state == "RETRY":
+        return
+    try:
+        AdmissionCounters().record_completion()
+    except redis.RedisError as e:
+        logger.warning("Could not record review completion", extra={"error": str(e)})
+
+
+@celery_app.task
+def debounced_review_task(repo_path: str, pr_number: int, generation: int, github_token: Optional[str] = None):
+    """
+    Fires once the pushes of a PR have been quiet for the debounce window.
+    Queues a review of the newest head, unless a later push took over.
+    """
+    # The scheduler imports this module for analyze_pr_task
+    from .scheduler import submit_review
+
+    push = PendingPushes().take(repo_path, pr_number, generation)
+    if push is None:
+        logger.info("Push superseded before its review was queued",
+                    extra={"repo": repo_path, "pr": pr_number, "generation": generation})
+        return None
+    submission = submit_review(repo_path, push["repo_url"], pr_number, github_token, push["pr_info"])
+    logger.info("Debounced review queued", extra={
+        "repo": repo_path, "pr": pr_number, "head_sha": push["pr_info"]["head"]["sha"],
+        "task_id": submission.task_id, "deduplicated": submission.deduplicated,
+    })
+    return submission.task_id
+
+
+@celery_app.task(bind=True, max_retries=PUBLISH_MAX_RETRIES)
+def publish_review_task(self, result_ref: str, repo_url: str, pr_number: int, head_sha: str,
+                        github_token: Optional[str] = None):
+    """
+    Posts a finished review to its PR as a GitHub review (see app/publish.py).
+    Safe to run again: findings already on the PR are not posted twice.
+    """
+    context = {"task_id": self.request.id, "repo": repo_url, "pr": pr_number, "head_sha": head_sha}
+    results = ResultStore().load(result_ref)
+    if results is None:
+        logger.warning("Results expired before they were published", extra=context)
+        return None
+
+    fetcher = GitHubFetcher(token=github_token)
+    repo_path = fetcher.repo_path(repo_url)
+    locks = PublishLocks()
+    if not locks.acquire(repo_path, pr_number, self.request.id):
+        raise self.retry(countdown=PUBLISH_RETRY_SECONDS)
+    try:
+        with stage("publish", **context) as publish_span:
+            report = ReviewPublisher(fetcher).publish(repo_url, pr_number, head_sha, results)
+            publish_span.set_attribute("comments", report.comments)
+    except (PermissionError, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        # Rate limited or GitHub unreachable; what was posted is recognised by the retry
+        logger.warning("Publishing failed, retrying", extra={**context, "error": str(e)})
+        raise self.retry(exc=e, countdown=PUBLISH_RETRY_SECONDS)
+    except FileNotFoundError as e:
+        logger.warning("PR not found, nothing published", extra={**context, "error": str(e)})
+        return None
+    finally:
+        locks.release(repo_path, pr_number, self.request.id)
+    logger.info("Review published", extra={**context, **asdict(report)})
+    return asdict(report)
+
+
+def _queue_publish(result_ref: str, repo_url: str, pr_number: int, head_sha: str,
+                   github_token: Optional[str], context: dict) -> None:
+    if not PUBLISH_REVIEWS:
+        return
+    if not github_token:
+        logger.warning("PUBLISH_REVIEWS is set but no GitHub token was given, not publishing", extra=context)
+        return
+    publish_review_task.delay(result_ref, repo_url, pr_number, head_sha, github_token)
+
+
+def _store_result(task_id: str, results: AnalysisResults) -> dict:
+    """
+    Saves the full results compactly in the ResultStore and returns what the
+    Celery backend keeps: a reference to them and the summary.
+    """
+    size = ResultStore().save(task_id, results)
+    logger.info("Results stored", extra={"task_id": task_id, "bytes": size})
+    return {"result_ref": task_id, "summary": results.summary.dict()}
+
+
+def _size(spool: IO[bytes]) -> int:
+    """Size of a downloaded diff, leaving it rewound."""
+    size = spool.seek(0, os.SEEK_END)
+    spool.seek(0)
+    return size
+
+
+def _gitattributes(fetcher: GitHubFetcher, repo_url: str, sha: str) -> Optional[str]:
+    """The repository's root .gitattributes (for linguist-generated hints), if it has one."""
+    try:
+        return fetcher.fetch_file(repo_url, ".gitattributes", sha)
+    except FileNotFoundError:
+        return None
+    except (requests.exceptions.RequestException, PermissionError) as e:
+        logger.warning("Could not fetch .gitattributes, triaging by path and content only",
+                       extra={"repo": repo_url, "error": str(e)})
+        return None
+
+
+def _done_event(results: AnalysisResults) -> dict:
+    """What the stream needs besides the issues it already sent, to show the finished review."""
+    return {'summary': results.summary.dict(), 'skipped_files': [f.dict() for f in results.skipped_files]}
+
+
+def _analyze(task, repo_url: str, pr_number: int, github_token: Optional[str], context: dict,
+             deadline: Optional[float] = None):
+    events = TaskEvents(task.request.id)
+    checkpoint = ReviewCheckpoints(task.request.id)
     
     try:
         # 1. Update status to PROCESSING
-        self.update_state(state='PROCESSING', meta={'repo': repo_url, 'pr': pr_number})
+        task.update_state(state='PROCESSING', meta={'repo': repo_url, 'pr': pr_number})
+        # Each attempt (retry or redelivery) starts here and streams every issue again, so
+        # clients drop what earlier attempts sent when they see this event
+        events.publish('state', {'state': 'PROCESSING'})
+
+        def publish_file(analysis):
+            # Stream each chunk's issues to /stream/{task_id} as soon as it is reviewed
+            if analysis.issues:
+                events.publish('file', analysis.dict())
 
-        # 2. Fetch Code Diff
-        print(f"[{self.request.id}] Fetching diff...")
+        # 2. Find out which head we are reviewing and what we reviewed before
         fetcher = GitHubFetcher(token=github_token)
-        pr_diff = fetcher.fetch_pr_diff(repo_url, pr_number)
-        
-        if not pr_diff or pr_diff.strip() == "":
-            print(f"[{self.request.id}] No diff content found.")
-            raise ValueError("No diff content found for the specified PR.")
+        repo_path = fetcher.repo_path(repo_url)
+        with stage("fetch", what="pr_info"):
+            pr_info = fetcher.fetch_pr_info(repo_url, pr_number)
+        head_sha = pr_info["head"]["sha"]
 
-        # 3. Run AI Agent Review
-        print(f"[{self.request.id}] Starting AI review...")
-        
-        reviewer = CodeReviewerCrew()
-        analysis_results: AnalysisResults = reviewer.review_code(repo_url, pr_number, pr_diff)
-        
-        print(f"[{self.request.id}] AI review complete.")
+        history = ReviewHistory()
+        previous = history.load(repo_path, pr_number)
 
-        # 4. Store Result
-        return analysis_results.dict()
+        if previous and previous[0] == head_sha:
+            # Nothing was pushed since the last review
+            logger.info("Head was already reviewed, reusing results", extra={**context, "head_sha": head_sha})
+            for analysis in previous[1].files:
+                publish_file(analysis)
+            with stage("result_store"):
+                result = _store_result(task.request.id, previous[1])
+            # Posts nothing if the earlier run already published them
+            _queue_publish(task.request.id, repo_url, pr_number, head_sha, github_token, context)
+            events.publish('done', _done_event(previous[1]))
+            return result
+
+        # Deferred so that processes which only queue tasks never load the agent stack
+        from .agent.code_reviewer import get_reviewer
+        reviewer = get_reviewer()
+
+        # Definitions from the base tree the prompts can refer to
+        code_index = None
+        base_sha = pr_info.get("base", {}).get("sha")
+        if REVIEW_CONTEXT_ENABLED and base_sha:
+            with stage("code_index", base_sha=base_sha) as index_span:
+                code_index = get_code_index_store().get(fetcher, repo_url, base_sha)
+                index_span.set_attribute("files", len(code_index.files) if code_index else 0)
+
+        # Lockfiles, vendored, generated and binary files are not reviewed
+        triage = None
+        if TRIAGE_ENABLED:
+            with stage("fetch", what="gitattributes"):
+                triage = FileTriage(_gitattributes(fetcher, repo_url, head_sha))
+
+        # 3. Review only the new commits if the PR was reviewed before. Diffs
+        # are downloaded to a temporary file and read one file at a time.
+        delta_diff = None
+        if previous:
+            logger.info("Fetching delta", extra={**context, "base_sha": previous[0], "head_sha": head_sha})
+            with stage("fetch", what="compare_diff") as fetch_span:
+                delta_diff = fetcher.fetch_compare_diff(repo_url, previous[0], head_sha, stream=True)
+                fetch_span.set_attribute("bytes", _size(delta_diff) if delta_diff else 0)
+
+        if delta_diff is not None:
+            logger.info("Starting incremental AI review", extra=context)
+            with delta_diff:
+                analysis_results: AnalysisResults = reviewer.review_incremental(
+                    repo_url, pr_number, delta_diff, previous[1],
+                    total_files=pr_info.get("changed_files", previous[1].summary.total_files),
+                    on_result=publish_file, code_index=code_index, checkpoint=checkpoint, triage=triage,
+                    deadline=deadline
+                )
+            analysis_results.stats.previous_head_sha = previous[0]
+        else:
+            logger.info("Fetching diff", extra=context)
+            with stage("fetch", what="pr_diff") as fetch_span:
+                pr_diff = fetcher.fetch_pr_diff_stream(repo_url, pr_number)
+                size = _size(pr_diff)
+                fetch_span.set_attribute("bytes", size)
+
+            with pr_diff:
+                if size == 0:
+                    logger.warning("No diff content found", extra=context)
+                    raise ValueError("No diff content found for the specified PR.")
+
+                logger.info("Starting AI review", extra={**context, "diff_bytes": size})
+                analysis_results: AnalysisResults = reviewer.review_code(
+                    repo_url, pr_number, pr_diff, on_result=publish_file, code_index=code_index,
+                    checkpoint=checkpoint, triage=triage, deadline=deadline
+                )
+
+        analysis_results.stats.head_sha = head_sha
+        with stage("result_store"):
+            history.save(repo_path, pr_number, head_sha, analysis_results)
+            result = _store_result(task.request.id, analysis_results)
+            # Loaded into the analytics database by the API, in batches
+            AnalyticsQueue().push([review_record(repo_path, pr_number, head_sha, analysis_results)])
+        checkpoint.clear()
+        _queue_publish(task.request.id, repo_url, pr_number, head_sha, github_token, context)
+        logger.info("AI review complete", extra={**context, "issues": analysis_results.summary.total_issues})
+        events.publish('done', _done_event(analysis_results))
+
+        # 4. Hand Celery the pointer to the stored results
+        return result
 
     # --- CORRECT ERROR HANDLING ---
+    except (SoftTimeLimitExceeded, ReviewDeadlineExceeded) as e:
+        if task.request.retries < task.max_retries:
+            # The chunks reviewed so far are checkpointed; the retry continues from them
+            logger.warning("Review hit its time limit, retrying", extra={**context, "retries": task.request.retries})
+            events.publish('state', {'state': 'RETRYING'})
+            # A review that already started is finished even past its queue deadline
+            raise task.retry(exc=e, countdown=0, expires=None)
+        user_message = "The review did not finish within its time limit, even after retries."
+        events.publish('error', {'error': user_message})
+        task.update_state(state='FAILED', meta={'error': user_message, 'traceback': traceback.format_exc()})
+        raise
+
     except requests.exceptions.ConnectionError as e:
-        print(f"[{self.request.id}] NETWORK ERROR: {e}")
+        logger.error("Network error", extra={**context, "error": str(e)})
         user_message = "Network Error: Could not connect to GitHub or AI service. Please check your internet connection and try again."
         
-        self.update_state(state='FAILED', meta={
+        events.publish('error', {'error': user_message})
+        task.update_state(state='FAILED', meta={
             'error': user_message,
             'traceback': traceback.format_exc()
         })
@@ -51,12 +341,13 @@ def analyze_pr_task(self, repo_url: str, pr_number: int, github_token: Optional[
     
     except (ValidationError, ValueError) as e:
         # This catches Pydantic errors AND our custom ValueError
-        print(f"[{self.request.id}] VALIDATION/VALUE ERROR: {e}")
+        logger.error("Validation or value error", extra={**context, "error": str(e)})
         
         # Get the clean error message we raised from the agent
         user_message = str(e)
 
-        self.update_state(state='FAILED', meta={
+        events.publish('error', {'error': user_message})
+        task.update_state(state='FAILED', meta={
             'error': user_message,
             'traceback': traceback.format_exc()
         })
@@ -64,11 +355,12 @@ def analyze_pr_task(self, repo_url: str, pr_number: int, github_token: Optional[
         
     except Exception as e:
         # This catches all other unexpected errors
-        print(f"[{self.request.id}] TASK FAILED: {e}")
+        logger.exception("Task failed", extra=context)
         user_message = f"An unexpected error occurred: {str(e)}"
 
-        self.update_state(state='FAILED', meta={
+        events.publish('error', {'error': user_message})
+        task.update_state(state='FAILED', meta={
             'error': user_message,
             'traceback': traceback.format_exc()
         })
-        raise
\ No newline at end of file
+        raise
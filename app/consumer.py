@@ -0,0 +1,136 @@
+# app/consumer.py
+"""
+Single-shot consumer for cron-driven reviews.
+
+    python -m app.consumer --max-jobs 10
+
+Takes up to --max-jobs tasks off the review queues, runs them one after the
+other in this process, records their results like a worker would, and
+exits. It starts no pool, no heartbeats and no remote control, and an empty
+queue costs a few Redis calls: the agent is only loaded once a task arrives.
+"""
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List
+
+from celery.app.trace import build_tracer
+from celery.result import AsyncResult
+from kombu import Queue
+
+from .worker import celery_app
+from .scheduler import LARGE_QUEUE, SMALL_QUEUE
+from .telemetry import configure_logging
+
+DEFAULT_QUEUES = (SMALL_QUEUE, LARGE_QUEUE, "celery")
+
+logger = logging.getLogger(__name__)
+
+
+def _header_time(value: str) -> datetime:
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _due(message) -> bool:
+    """False for countdown/ETA tasks (the webhook debounce) whose time has not come yet."""
+    eta = message.headers.get("eta")
+    return not eta or _header_time(eta) <= datetime.now(timezone.utc)
+
+
+def _expired(message) -> bool:
+    """True for tasks past their queue deadline (see REVIEW_QUEUE_DEADLINE), which a worker drops unrun."""
+    expires = message.headers.get("expires")
+    return bool(expires) and _header_time(expires) <= datetime.now(timezone.utc)
+
+
+def run_message(message) -> str:
+    """Runs one task message in this process through Celery's tracer; returns its final state."""
+    headers = message.headers
+    task_id = headers["id"]
+    if AsyncResult(task_id, app=celery_app).status == "REVOKED":
+        return "REVOKED"
+    if _expired(message):
+        celery_app.backend.mark_as_revoked(task_id, reason="expired")
+        return "REVOKED"
+
+    task = celery_app.tasks[headers["task"]]
+    args, kwargs, embed = message.decode()
+    request = dict(headers, **(embed or {}))
+    request.update(id=task_id, delivery_info=message.delivery_info, is_eager=False)
+    # The same tracer a worker uses: stores the result or failure, fires task signals
+    tracer = build_tracer(task.name, task, app=celery_app, eager=False)
+    outcome = tracer(task_id, args, kwargs, request)
+    return outcome.info.state if outcome.info is not None else "SUCCESS"
+
+
+def consume(max_jobs: int = 1, queues=DEFAULT_QUEUES) -> int:
+    """
+    Runs up to `max_jobs` due tasks, taking from `queues` in order (small
+    reviews first). Returns how many ran. Tasks that are not due yet go
+    back to their queue.
+    """
+    ran = 0
+    warmed = False
+    deferred: List = []
+    with celery_app.connection_for_read() as connection:
+        channel = connection.default_channel
+        bound = [Queue(name).bind(channel) for name in queues]
+        try:
+            while ran < max_jobs:
+                message = None
+                for queue in bound:
+                    message = queue.get(no_ack=False, accept=["json"])
+                    if message is not None:
+                        break
+                if message is None:
+                    break
+                if not _due(message):
+                    # Held unacked until the end so the same message is not fetched again
+                    deferred.append(message)
+                    continue
+
+                if not warmed:
+                    # What worker_process_init does for a pool process: tracing and the reviewer
+                    from .celery_tasks import init_worker_process
+                    init_worker_process()
+                    warmed = True
+
+                started = time.perf_counter()
+                try:
+                    state = run_message(message)
+                finally:
+                    # The outcome is in the result backend either way
+                    message.ack()
+                ran += 1
+                logger.info("Consumer ran task", extra={
+                    "task_id": message.headers["id"], "task": message.headers["task"], "state": state,
+                    "seconds": round(time.perf_counter() - started, 3),
+                })
+        finally:
+            for message in deferred:
+                message.requeue()
+    return ran
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.consumer", description=__doc__.splitlines()[1])
+    parser.add_argument("--max-jobs", type=int, default=1, help="tasks to run before exiting")
+    parser.add_argument("--queues", default=",".join(DEFAULT_QUEUES),
+                        help="comma-separated queues, taken from in this order")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    # Registers the tasks by name; the agent itself is imported by the first task
+    from . import celery_tasks  # noqa: F401
+
+    started = time.perf_counter()
+    ran = consume(args.max_jobs, [q for q in args.queues.split(",") if q])
+    logger.info("Consumer done", extra={"tasks": ran, "seconds": round(time.perf_counter() - started, 3)})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
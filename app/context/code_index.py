@@ -0,0 +1,267 @@
+# app/context/code_index.py
+import logging
+import os
+import tarfile
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import msgpack
+import zstandard
+
+from app.api_tools.github_fetcher import GitHubFetcher
+from .symbols import INDEXED_EXTENSIONS, Definition, FileSymbols, extract_symbols
+
+# Attach definitions from the base tree to review prompts
+REVIEW_CONTEXT_ENABLED = os.getenv("REVIEW_CONTEXT_ENABLED", "true").lower() == "true"
+# Indexes are cached here, one file per (repository, base SHA)
+CODE_INDEX_DIR = os.getenv("CODE_INDEX_DIR", os.path.join(tempfile.gettempdir(), "code-index"))
+# Indexes kept on disk per repository; the oldest are deleted
+CODE_INDEX_KEEP = int(os.getenv("CODE_INDEX_KEEP", "3"))
+# Larger files (generated code, data) are not indexed
+CODE_INDEX_MAX_FILE_BYTES = int(os.getenv("CODE_INDEX_MAX_FILE_BYTES", str(256 * 1024)))
+# Loaded indexes kept in memory per process
+CODE_INDEX_MEMORY_ENTRIES = int(os.getenv("CODE_INDEX_MEMORY_ENTRIES", "8"))
+# Call sites remembered per name; enough to show a few callers
+MAX_CALL_SITES = 20
+
+# Bump when the on-disk layout or the extraction changes; older files are rebuilt
+INDEX_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+class CodeIndex:
+    """
+    Definitions and call sites of every source file of one tree, looked up
+    by name. Built from a tree once, then patched file by file.
+    """
+
+    def __init__(self, sha: str, files: Dict[str, FileSymbols]):
+        self.sha = sha
+        self.files = files
+        self._rebuild_lookups()
+
+    def _rebuild_lookups(self) -> None:
+        self.definitions: Dict[str, List[Definition]] = {}
+        for symbols in self.files.values():
+            for definition in symbols.definitions:
+                self.definitions.setdefault(definition.name, []).append(definition)
+        self.calls: Dict[str, List[Tuple[str, int]]] = {}
+        for path, symbols in self.files.items():
+            for name, line in symbols.calls:
+                # Only calls of something the repository defines are worth keeping
+                if name in self.definitions:
+                    sites = self.calls.setdefault(name, [])
+                    if len(sites) < MAX_CALL_SITES:
+                        sites.append((path, line))
+
+    def definitions_of(self, name: str) -> List[Definition]:
+        return self.definitions.get(name, [])
+
+    def definitions_in(self, path: str) -> List[Definition]:
+        symbols = self.files.get(path)
+        return symbols.definitions if symbols else []
+
+    def call_sites(self, name: str) -> List[Tuple[str, int]]:
+        return self.calls.get(name, [])
+
+    def patch(self, sha: str, changed: Dict[str, Optional[FileSymbols]]) -> None:
+        """Moves the index to `sha`: files mapped to None are removed, the others replaced."""
+        for path, symbols in changed.items():
+            if symbols is None:
+                self.files.pop(path, None)
+            else:
+                self.files[path] = symbols
+        self.sha = sha
+        self._rebuild_lookups()
+
+    def encode(self) -> bytes:
+        payload = {
+            "v": INDEX_VERSION,
+            "sha": self.sha,
+            "files": {
+                path: [
+                    [[d.name, d.line, d.end_line, d.snippet] for d in symbols.definitions],
+                    symbols.calls,
+                ]
+                for path, symbols in self.files.items()
+            },
+        }
+        return zstandard.ZstdCompressor().compress(msgpack.packb(payload, use_bin_type=True))
+
+    @classmethod
+    def decode(cls, blob: bytes) -> "CodeIndex":
+        payload = msgpack.unpackb(zstandard.ZstdDecompressor().decompress(blob), raw=False)
+        if payload.get("v") != INDEX_VERSION:
+            raise ValueError(f"Unsupported code index version {payload.get('v')!r}")
+        files = {
+            path: FileSymbols(
+                definitions=[Definition(name, path, line, end, snippet) for name, line, end, snippet in definitions],
+                calls=[(name, line) for name, line in calls],
+            )
+            for path, (definitions, calls) in payload["files"].items()
+        }
+        return cls(payload["sha"], files)
+
+
+def _indexable(path: str, size: int) -> bool:
+    return os.path.splitext(path)[1].lower() in INDEXED_EXTENSIONS and size <= CODE_INDEX_MAX_FILE_BYTES
+
+
+def _archive_files(fetcher: GitHubFetcher, repo_url: str, sha: str) -> Iterable[Tuple[str, str]]:
+    """(path, text) of every indexable file in the tarball of `sha`, streamed."""
+    response = fetcher.fetch_archive(repo_url, sha)
+    try:
+        with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                # Members live under a '<owner>-<repo>-<sha>/' directory
+                path = member.name.split("/", 1)[-1]
+                if not _indexable(path, member.size):
+                    continue
+                data = archive.extractfile(member).read()
+                yield path, data.decode("utf-8", errors="replace")
+    finally:
+        response.close()
+
+
+class CodeIndexStore:
+    """
+    Builds, caches and updates the code index of a repository's base tree.
+
+    A new base SHA of a repository that is already indexed is reached by
+    re-indexing only the files changed since the newest cached index; the
+    first index of a repository comes from one tarball download. Indexes
+    live on disk under CODE_INDEX_DIR and the most recent ones in memory.
+    """
+
+    def __init__(self, directory: str = CODE_INDEX_DIR):
+        self.directory = directory
+        self._memory: "OrderedDict[Tuple[str, str], CodeIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._repo_locks: Dict[str, threading.Lock] = {}
+
+    def _repo_dir(self, repo_path: str) -> str:
+        return os.path.join(self.directory, repo_path.lower().replace("/", "__"))
+
+    def _repo_lock(self, repo_path: str) -> threading.Lock:
+        with self._lock:
+            return self._repo_locks.setdefault(repo_path.lower(), threading.Lock())
+
+    def get(self, fetcher: GitHubFetcher, repo_url: str, sha: str) -> Optional[CodeIndex]:
+        """
+        The index of the tree at `sha`, or None if it could not be built (the
+        review then goes ahead without repository context).
+        """
+        repo_path = fetcher.repo_path(repo_url)
+        key = (repo_path.lower(), sha)
+        with self._lock:
+            index = self._memory.get(key)
+            if index is not None:
+                self._memory.move_to_end(key)
+                return index
+
+        # One build per repository at a time; the others wait and reuse it
+        with self._repo_lock(repo_path):
+            try:
+                index = self._load(repo_path, sha) or self._build(fetcher, repo_url, repo_path, sha)
+            except Exception as e:
+                logger.warning("Code index unavailable, reviewing without repository context",
+                               extra={"repo": repo_path, "sha": sha, "error": str(e)})
+                return None
+
+        with self._lock:
+            self._memory[key] = index
+            while len(self._memory) > CODE_INDEX_MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+        return index
+
+    def _path(self, repo_path: str, sha: str) -> str:
+        return os.path.join(self._repo_dir(repo_path), f"{sha}.idx")
+
+    def _load(self, repo_path: str, sha: str) -> Optional[CodeIndex]:
+        try:
+            with open(self._path(repo_path, sha), "rb") as f:
+                return CodeIndex.decode(f.read())
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.info("Discarding unreadable code index", extra={"repo": repo_path, "sha": sha, "error": str(e)})
+            return None
+
+    def _newest(self, repo_path: str) -> Optional[CodeIndex]:
+        """The most recently written index of the repository, if any."""
+        directory = self._repo_dir(repo_path)
+        try:
+            names = [n for n in os.listdir(directory) if n.endswith(".idx")]
+        except FileNotFoundError:
+            return None
+        for name in sorted(names, key=lambda n: os.path.getmtime(os.path.join(directory, n)), reverse=True):
+            index = self._load(repo_path, name[:-len(".idx")])
+            if index is not None:
+                return index
+        return None
+
+    def _build(self, fetcher: GitHubFetcher, repo_url: str, repo_path: str, sha: str) -> CodeIndex:
+        index = self._newest(repo_path)
+        changed = fetcher.fetch_changed_files(repo_url, index.sha, sha) if index is not None else None
+        if changed is not None:
+            updates: Dict[str, Optional[FileSymbols]] = {}
+            for entry in changed:
+                path = entry["filename"]
+                if entry.get("previous_filename"):
+                    updates[entry["previous_filename"]] = None
+                if entry.get("status") == "removed" or not _indexable(path, 0):
+                    updates[path] = None
+                    continue
+                try:
+                    text = fetcher.fetch_file(repo_url, path, sha)
+                except FileNotFoundError:
+                    # Submodules and symlinks have no contents to index
+                    updates[path] = None
+                    continue
+                updates[path] = extract_symbols(path, text) if _indexable(path, len(text)) else None
+            index.patch(sha, updates)
+            logger.info("Code index updated", extra={"repo": repo_path, "sha": sha, "files": len(updates)})
+        else:
+            files = {path: extract_symbols(path, text) for path, text in _archive_files(fetcher, repo_url, sha)}
+            index = CodeIndex(sha, files)
+            logger.info("Code index built", extra={"repo": repo_path, "sha": sha, "files": len(files),
+                                                   "definitions": sum(len(d) for d in index.definitions.values())})
+        self._save(repo_path, index)
+        return index
+
+    def _save(self, repo_path: str, index: CodeIndex) -> None:
+        directory = self._repo_dir(repo_path)
+        os.makedirs(directory, exist_ok=True)
+        # Written aside and renamed, so other processes never read half a file
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(index.encode())
+        os.replace(temporary, self._path(repo_path, index.sha))
+
+        stored = sorted(
+            (os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".idx")),
+            key=os.path.getmtime, reverse=True,
+        )
+        for stale in stored[CODE_INDEX_KEEP:]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+_store: Optional[CodeIndexStore] = None
+_store_lock = threading.Lock()
+
+
+def get_code_index_store() -> CodeIndexStore:
+    """Returns the process-wide index store, so threads share its memory cache."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CodeIndexStore()
+        return _store
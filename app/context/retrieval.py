@@ -0,0 +1,94 @@
+# app/context/retrieval.py
+import os
+from typing import List, Set
+
+from app.diff.chunker import DiffChunk, estimate_tokens
+from .code_index import CodeIndex
+from .symbols import Definition, referenced_names
+
+# Tokens of repository context added to one chunk's prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "600"))
+# Definitions attached to one chunk's prompt
+CONTEXT_MAX_DEFINITIONS = int(os.getenv("CONTEXT_MAX_DEFINITIONS", "3"))
+# A name defined in more places than this is too ambiguous to pick one
+CONTEXT_MAX_AMBIGUITY = 3
+# Callers listed for a definition the chunk edits
+MAX_CALLERS_SHOWN = 3
+
+
+def _changed_text(chunk: DiffChunk) -> str:
+    return "\n".join(line[1:] for hunk in chunk.hunks for line in hunk.lines if line[:1] in ('+', '-'))
+
+
+def _touched_old_lines(chunk: DiffChunk) -> Set[int]:
+    """Base-tree line numbers the chunk removes, or inserts lines at."""
+    touched = set()
+    for hunk in chunk.hunks:
+        old_no = hunk.old_start
+        for line in hunk.lines:
+            tag = line[:1]
+            if tag in ('-', '+'):
+                touched.add(old_no)
+            if tag in ('-', ' ', ''):
+                old_no += 1
+    return touched
+
+
+def _contains(definition: Definition, lines: Set[int]) -> bool:
+    return any(definition.line <= n <= definition.end_line for n in lines)
+
+
+def _locality(definition: Definition, path: str) -> int:
+    """0 for the same file, 1 for the same directory, 2 elsewhere."""
+    if definition.path == path:
+        return 0
+    return 1 if os.path.dirname(definition.path) == os.path.dirname(path) else 2
+
+
+def select_context(index: CodeIndex, chunk: DiffChunk, max_tokens: int = CONTEXT_TOKEN_BUDGET,
+                   max_definitions: int = CONTEXT_MAX_DEFINITIONS) -> List[str]:
+    """
+    Context blocks for one chunk, most relevant first, within `max_tokens`:
+    the definitions of what its changed lines call (then of other names
+    they use), closest to the file first, and where the functions it edits
+    are called from. Definitions the chunk edits are already in the diff.
+    """
+    touched = _touched_old_lines(chunk)
+    # Innermost definitions around the change (a method rather than its class)
+    edited = [d for d in index.definitions_in(chunk.file_path) if _contains(d, touched)]
+    edited = [d for d in edited if not any(o is not d and d.line <= o.line and o.end_line <= d.end_line
+                                           for o in edited)]
+
+    blocks: List[str] = []
+    used = 0
+    seen = {d.name for d in edited}
+    called, others = referenced_names(_changed_text(chunk))
+    for name in called + others:
+        if len(blocks) >= max_definitions:
+            break
+        if name in seen:
+            continue
+        seen.add(name)
+        candidates = index.definitions_of(name)
+        if not candidates or len(candidates) > CONTEXT_MAX_AMBIGUITY:
+            continue
+        best = min(candidates, key=lambda d: _locality(d, chunk.file_path))
+        block = f"# {best.path}:{best.line}\n{best.snippet}"
+        cost = estimate_tokens(block)
+        if used + cost <= max_tokens:
+            blocks.append(block)
+            used += cost
+
+    for definition in edited:
+        sites = [
+            f"{path}:{line}" for path, line in index.call_sites(definition.name)
+            if not (path == definition.path and definition.line <= line <= definition.end_line)
+        ][:MAX_CALLERS_SHOWN]
+        if not sites:
+            continue
+        block = f"# {definition.name} (edited here) is called from {', '.join(sites)}"
+        cost = estimate_tokens(block)
+        if used + cost <= max_tokens:
+            blocks.append(block)
+            used += cost
+    return blocks
@@ -0,0 +1,160 @@
+# app/context/symbols.py
+import ast
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Longest snippet kept for one definition (signature, docstring, first lines)
+CONTEXT_DEF_MAX_LINES = int(os.getenv("CONTEXT_DEF_MAX_LINES", "12"))
+
+# Languages whose definitions are found with the regexes below
+_BRACE_DEFINITIONS = {
+    ('.js', '.jsx', '.mjs', '.ts', '.tsx'): [
+        re.compile(r'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)'),
+        re.compile(r'^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+([A-Za-z_$][\w$]*)'),
+        re.compile(r'^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?'
+                   r'(?:\([^)]*\)|[A-Za-z_$][\w$]*)\s*=>'),
+    ],
+    ('.go',): [
+        re.compile(r'^func\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)'),
+        re.compile(r'^type\s+([A-Za-z_]\w*)\s+(?:struct|interface)\b'),
+    ],
+    ('.java', '.kt', '.cs', '.scala'): [
+        re.compile(r'^\s*(?:[\w@]+\s+)*(?:class|interface|enum|record|object)\s+([A-Za-z_]\w*)'),
+        re.compile(r'^\s*(?:(?:public|private|protected|internal|static|final|abstract|override|suspend|'
+                   r'synchronized|async|virtual)\s+)+[\w<>\[\],.?]+\s+([A-Za-z_]\w*)\s*\('),
+        re.compile(r'^\s*(?:[\w]+\s+)*fun\s+(?:<[^>]*>\s*)?(?:[\w.]+\.)?([A-Za-z_]\w*)\s*\('),
+    ],
+    ('.rs',): [
+        re.compile(r'^\s*(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?(?:unsafe\s+)?fn\s+([A-Za-z_]\w*)'),
+        re.compile(r'^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait)\s+([A-Za-z_]\w*)'),
+    ],
+    ('.rb',): [
+        re.compile(r'^\s*def\s+(?:self\.)?([A-Za-z_]\w*[?!]?)'),
+        re.compile(r'^\s*(?:class|module)\s+([A-Z]\w*)'),
+    ],
+    ('.php',): [
+        re.compile(r'^\s*(?:(?:public|private|protected|static|final|abstract)\s+)*function\s+([A-Za-z_]\w*)'),
+        re.compile(r'^\s*(?:(?:abstract|final)\s+)?(?:class|interface|trait)\s+([A-Za-z_]\w*)'),
+    ],
+}
+_PYTHON_FALLBACK = re.compile(r'^\s*(?:async\s+)?(?:def|class)\s+([A-Za-z_]\w*)')
+
+EXTENSION_PATTERNS: Dict[str, List["re.Pattern"]] = {
+    ext: patterns for exts, patterns in _BRACE_DEFINITIONS.items() for ext in exts
+}
+INDEXED_EXTENSIONS = frozenset(EXTENSION_PATTERNS) | {'.py'}
+
+# Lines that close a block rather than start the next statement
+_CLOSER_RE = re.compile(r'^(?:[})\]]|end\b)')
+CALL_RE = re.compile(r'([A-Za-z_$][\w$]*)\s*\(')
+IDENTIFIER_RE = re.compile(r'[A-Za-z_$][\w$]*')
+# Words followed by '(' that are syntax, not calls
+_NOT_CALLS = frozenset((
+    'if', 'elif', 'for', 'while', 'switch', 'catch', 'return', 'with', 'and', 'or', 'not', 'in',
+    'def', 'class', 'function', 'func', 'fn', 'new', 'typeof', 'sizeof', 'await', 'yield', 'assert',
+    'lambda', 'print', 'super', 'except', 'raise', 'del', 'import', 'from',
+))
+
+
+@dataclass
+class Definition:
+    """A function, method or class of the base tree, with the start of its source."""
+    name: str
+    path: str
+    line: int
+    end_line: int
+    snippet: str
+
+
+@dataclass
+class FileSymbols:
+    """What one file defines, and the names it calls (with their line numbers)."""
+    definitions: List[Definition] = field(default_factory=list)
+    calls: List[Tuple[str, int]] = field(default_factory=list)
+
+
+def _snippet(lines: List[str], start: int, end: int, max_lines: int) -> str:
+    """Lines start..end (1-based, inclusive), cut at max_lines with a marker."""
+    body = lines[start - 1:min(end, start + max_lines - 1)]
+    if end - start + 1 > max_lines:
+        body.append("    ...")
+    return "\n".join(line.rstrip() for line in body)
+
+
+def _python_definitions(path: str, source: str, lines: List[str], max_lines: int) -> Optional[List[Definition]]:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    found = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            # Decorators belong to the definition a reader sees
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            end = getattr(node, "end_lineno", None) or node.lineno
+            found.append(Definition(node.name, path, start, end, _snippet(lines, start, end, max_lines)))
+    return found
+
+
+def _block_end(lines: List[str], start: int) -> int:
+    """
+    Last line of a block opened on line `start`: the first later line that is
+    indented no deeper ends it, and is included if it closes it ('}', 'end').
+    """
+    indent = len(lines[start - 1]) - len(lines[start - 1].lstrip())
+    for i in range(start, len(lines)):
+        text = lines[i]
+        stripped = text.strip()
+        if not stripped:
+            continue
+        if len(text) - len(text.lstrip()) <= indent:
+            return i + 1 if _CLOSER_RE.match(stripped) else i
+    return len(lines)
+
+
+def _pattern_definitions(path: str, lines: List[str], patterns: List["re.Pattern"],
+                         max_lines: int) -> List[Definition]:
+    found = []
+    for number, text in enumerate(lines, start=1):
+        for pattern in patterns:
+            match = pattern.match(text)
+            if match:
+                end = _block_end(lines, number)
+                found.append(Definition(match.group(1), path, number, end, _snippet(lines, number, end, max_lines)))
+                break
+    return found
+
+
+def extract_symbols(path: str, source: str, max_lines: int = CONTEXT_DEF_MAX_LINES) -> FileSymbols:
+    """Definitions and call sites of one source file; unknown languages yield nothing."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in INDEXED_EXTENSIONS:
+        return FileSymbols()
+    lines = source.splitlines()
+
+    if extension == '.py':
+        definitions = _python_definitions(path, source, lines, max_lines)
+        if definitions is None:
+            definitions = _pattern_definitions(path, lines, [_PYTHON_FALLBACK], max_lines)
+    else:
+        definitions = _pattern_definitions(path, lines, EXTENSION_PATTERNS[extension], max_lines)
+
+    # A definition's own line ('def name(') is not a call of it
+    defined_at = {(d.name, d.line) for d in definitions}
+    calls = [
+        (name, number)
+        for number, text in enumerate(lines, start=1)
+        for name in CALL_RE.findall(text)
+        if name not in _NOT_CALLS and (name, number) not in defined_at
+    ]
+    return FileSymbols(definitions=definitions, calls=calls)
+
+
+def referenced_names(text: str) -> Tuple[List[str], List[str]]:
+    """(called names, other identifiers) of a piece of code, each in order of first use."""
+    called = [name for name in dict.fromkeys(CALL_RE.findall(text)) if name not in _NOT_CALLS]
+    seen = set(called)
+    others = [name for name in dict.fromkeys(IDENTIFIER_RE.findall(text)) if name not in seen]
+    return called, others
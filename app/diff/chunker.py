@@ -0,0 +1,96 @@
+# app/diff/chunker.py
+import os
+from dataclasses import dataclass, field
+from typing import List
+
+from .parser import FileDiff, Hunk
+
+# Token budget for the diff text of a single review chunk.
+DEFAULT_CHUNK_TOKENS = int(os.getenv("REVIEW_CHUNK_TOKENS", "3000"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for code)."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class DiffChunk:
+    """A reviewable slice of a single file's diff that fits the token budget."""
+    file_path: str
+    part: int
+    header_text: str
+    hunks: List[Hunk] = field(default_factory=list)
+
+    @property
+    def key(self) -> str:
+        return f"{self.file_path}#{self.part}"
+
+    def text(self) -> str:
+        return "\n".join([self.header_text] + [h.text() for h in self.hunks])
+
+
+def split_hunk(hunk: Hunk, max_tokens: int) -> List[Hunk]:
+    """
+    Splits an oversized hunk into consecutive sub-hunks with correct
+    '@@' headers, so every line is still reviewed with its real line number.
+    """
+    if estimate_tokens(hunk.text()) <= max_tokens:
+        return [hunk]
+
+    max_chars = max_tokens * 4
+    pieces: List[Hunk] = []
+    old_line, new_line = hunk.old_start, hunk.new_start
+    current = Hunk(old_start=old_line, old_count=0, new_start=new_line, new_count=0, section=hunk.section)
+    size = 0
+
+    for line in hunk.lines:
+        if current.lines and size + len(line) + 1 > max_chars:
+            pieces.append(current)
+            current = Hunk(old_start=old_line, old_count=0, new_start=new_line, new_count=0, section=hunk.section)
+            size = 0
+
+        current.lines.append(line)
+        size += len(line) + 1
+        tag = line[:1]
+        if tag == '-':
+            current.old_count += 1
+            old_line += 1
+        elif tag == '+':
+            current.new_count += 1
+            new_line += 1
+        elif tag != '\\':
+            current.old_count += 1
+            current.new_count += 1
+            old_line += 1
+            new_line += 1
+
+    if current.lines:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_file_diff(file_diff: FileDiff, max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[DiffChunk]:
+    """Packs the hunks of one file into as few chunks as the budget allows."""
+    header_text = file_diff.header_text()
+    budget = max(max_tokens - estimate_tokens(header_text), 64)
+
+    chunks: List[DiffChunk] = []
+    current = DiffChunk(file_path=file_diff.path, part=0, header_text=header_text)
+    used = 0
+
+    for hunk in file_diff.hunks:
+        for piece in split_hunk(hunk, budget):
+            cost = estimate_tokens(piece.text())
+            if current.hunks and used + cost > budget:
+                chunks.append(current)
+                current = DiffChunk(file_path=file_diff.path, part=len(chunks), header_text=header_text)
+                used = 0
+            current.hunks.append(piece)
+            used += cost
+
+    # Files without hunks (binary files, pure renames, mode changes) still get
+    # a chunk so they are accounted for in the review.
+    if current.hunks or not chunks:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,133 @@
+# app/diff/index.py
+import os
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .parser import FileDiff
+
+# A reported line this close to an added line is moved onto it instead of dropped
+ISSUE_SNAP_LINES = int(os.getenv("ISSUE_SNAP_LINES", "3"))
+
+
+class FileIndex:
+    """
+    Line lookups for one file of a diff, built in a single pass over its hunks.
+
+    Hunk ranges and the old-to-new anchors of context lines are kept in
+    sorted arrays and searched with bisect; added lines are a bitset over
+    the new file. Nothing refers back to the diff text.
+    """
+
+    def __init__(self, file_diff: FileDiff):
+        self.path = file_diff.path
+        self.new_starts = array('l')
+        self.new_ends = array('l')      # inclusive
+        # First old line at or after which a hunk applies, the old line just
+        # past it, and the total line shift once the hunk is passed
+        self.old_los = array('l')
+        self.old_his = array('l')
+        self.shifts = array('l')
+        # Old and new numbers of every context line, sorted by old number
+        self.context_old = array('l')
+        self.context_new = array('l')
+
+        added_lines: List[int] = []
+        shift = 0
+        for hunk in file_diff.hunks:
+            self.new_starts.append(hunk.new_start)
+            self.new_ends.append(hunk.new_end)
+            # A hunk with old_count == 0 inserts lines *after* old_start
+            self.old_los.append(hunk.old_start if hunk.old_count else hunk.old_start + 1)
+            self.old_his.append(hunk.old_start + hunk.old_count)
+            shift += hunk.new_count - hunk.old_count
+            self.shifts.append(shift)
+
+            old_no, new_no = hunk.old_start, hunk.new_start
+            for line in hunk.lines:
+                tag = line[:1]
+                if tag == '+':
+                    added_lines.append(new_no)
+                    new_no += 1
+                elif tag == '-':
+                    old_no += 1
+                elif tag != '\\':
+                    self.context_old.append(old_no)
+                    self.context_new.append(new_no)
+                    old_no += 1
+                    new_no += 1
+
+        self.added_count = len(added_lines)
+        self._base = added_lines[0] if added_lines else 0
+        size = (added_lines[-1] - self._base + 1) if added_lines else 0
+        self._added = bytearray((size + 7) // 8)
+        for line in added_lines:
+            offset = line - self._base
+            self._added[offset >> 3] |= 1 << (offset & 7)
+
+    def hunk_at(self, line: int) -> Optional[int]:
+        """Position of the hunk whose new-file range contains `line`, or None."""
+        i = bisect_right(self.new_starts, line) - 1
+        if i >= 0 and line <= self.new_ends[i]:
+            return i
+        return None
+
+    def contains(self, line: int) -> bool:
+        """True if `line` of the new file is shown in the diff (added or context)."""
+        return self.hunk_at(line) is not None
+
+    def is_added(self, line: int) -> bool:
+        offset = line - self._base
+        if offset < 0 or (offset >> 3) >= len(self._added):
+            return False
+        return bool(self._added[offset >> 3] & (1 << (offset & 7)))
+
+    def nearest_added(self, line: int, distance: int) -> Optional[int]:
+        """The added line closest to `line` within `distance`, preferring the one before it."""
+        for step in range(1, distance + 1):
+            if self.is_added(line - step):
+                return line - step
+            if self.is_added(line + step):
+                return line + step
+        return None
+
+    def place(self, line: int, snap: int = ISSUE_SNAP_LINES) -> Optional[Tuple[int, bool]]:
+        """
+        Validates a reported line. Returns (line, on_added_line), with the
+        line snapped onto a nearby added line if it is outside the diff, or
+        None if nothing in the diff is close enough.
+        """
+        if self.is_added(line):
+            return line, True
+        if self.contains(line):
+            return line, False
+        nearest = self.nearest_added(line, snap)
+        if nearest is not None:
+            return nearest, True
+        return None
+
+    def map_old_to_new(self, old_line: int) -> Optional[int]:
+        """
+        Maps a line number of the old version of the file to the new version.
+
+        Returns None when the line was removed or rewritten by the diff.
+        """
+        i = bisect_right(self.old_los, old_line) - 1
+        if i < 0:
+            return old_line
+        if old_line < self.old_his[i]:
+            j = bisect_right(self.context_old, old_line) - 1
+            if j >= 0 and self.context_old[j] == old_line:
+                return self.context_new[j]
+            return None
+        return old_line + self.shifts[i]
+
+
+class DiffIndex:
+    """FileIndexes of every file of a parsed diff, built once per review."""
+
+    def __init__(self, file_diffs: Iterable[FileDiff]):
+        self.files: Dict[str, FileIndex] = {f.path: FileIndex(f) for f in file_diffs}
+
+    def get(self, path: str) -> Optional[FileIndex]:
+        return self.files.get(path)
@@ -0,0 +1,151 @@
+# app/diff/parser.py
+import re
+from dataclasses import dataclass, field
+from typing import IO, Iterable, Iterator, List, Optional, Union
+
+# Matches '@@ -12,7 +12,9 @@ optional section heading'
+HUNK_HEADER_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$')
+
+
+@dataclass
+class Hunk:
+    """A single '@@' hunk of a unified diff."""
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+    section: str = ""
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def header(self) -> str:
+        return f"@@ -{self.old_start},{self.old_count} +{self.new_start},{self.new_count} @@{self.section}"
+
+    @property
+    def new_end(self) -> int:
+        """Last line number (inclusive) covered by this hunk in the new file."""
+        return self.new_start + max(self.new_count, 1) - 1
+
+    def text(self) -> str:
+        return "\n".join([self.header] + self.lines)
+
+
+@dataclass
+class FileDiff:
+    """All hunks of one file in a unified diff, plus its 'diff --git' header lines."""
+    path: str
+    old_path: Optional[str] = None
+    header_lines: List[str] = field(default_factory=list)
+    hunks: List[Hunk] = field(default_factory=list)
+    is_binary: bool = False
+    is_deleted: bool = False
+    is_new: bool = False
+
+    def header_text(self) -> str:
+        return "\n".join(self.header_lines)
+
+    def text(self) -> str:
+        return "\n".join([self.header_text()] + [h.text() for h in self.hunks])
+
+
+def _strip_prefix(path: str) -> str:
+    """Removes the 'a/' or 'b/' prefix git puts in front of diff paths."""
+    path = path.strip().split('\t')[0]
+    if path.startswith('"') and path.endswith('"'):
+        path = path[1:-1]
+    if path[:2] in ('a/', 'b/'):
+        return path[2:]
+    return path
+
+
+def _path_from_git_header(line: str) -> str:
+    """Extracts the new path from a 'diff --git a/x b/x' line."""
+    rest = line[len('diff --git '):]
+    idx = rest.rfind(' b/')
+    if idx != -1:
+        return rest[idx + 3:]
+    return _strip_prefix(rest.split(' ')[-1])
+
+
+def diff_lines(diff: Union[str, IO[bytes]]) -> Iterator[str]:
+    """
+    Lines of a diff held in a string, or read one at a time from a binary
+    file (such as the spooled download of GitHubFetcher.fetch_pr_diff_stream).
+    """
+    if isinstance(diff, str):
+        yield from diff.splitlines()
+        return
+    for raw in diff:
+        if raw.endswith(b'\n'):
+            raw = raw[:-1]
+        if raw.endswith(b'\r'):
+            raw = raw[:-1]
+        yield raw.decode('utf-8', errors='replace')
+
+
+def iter_file_diffs(lines: Iterable[str]) -> Iterator[FileDiff]:
+    """
+    Parses a unified diff (as returned by the GitHub diff media type) into
+    per-file records with their hunks, yielding each file as soon as the
+    next one starts. Only one file is held at a time.
+
+    Lines that do not belong to any file are ignored; every line that
+    belongs to a file ends up either in its header or in one of its hunks.
+    """
+    current: Optional[FileDiff] = None
+    hunk: Optional[Hunk] = None
+
+    for line in lines:
+        if line.startswith('diff --git '):
+            if current is not None:
+                yield current
+            current = FileDiff(path=_path_from_git_header(line), header_lines=[line])
+            hunk = None
+            continue
+
+        if current is None:
+            continue
+
+        if hunk is None:
+            # Still inside the file header
+            if line.startswith('--- '):
+                current.header_lines.append(line)
+                if line[4:].strip() == '/dev/null':
+                    current.is_new = True
+                else:
+                    current.old_path = _strip_prefix(line[4:])
+                continue
+            if line.startswith('+++ '):
+                current.header_lines.append(line)
+                if line[4:].strip() == '/dev/null':
+                    current.is_deleted = True
+                else:
+                    current.path = _strip_prefix(line[4:])
+                continue
+            if line.startswith('Binary files ') or line.startswith('GIT binary patch'):
+                current.is_binary = True
+                current.header_lines.append(line)
+                continue
+            if line.startswith('deleted file mode'):
+                current.is_deleted = True
+            if line.startswith('new file mode'):
+                current.is_new = True
+
+        match = HUNK_HEADER_RE.match(line)
+        if match:
+            old_start, old_count, new_start, new_count, section = match.groups()
+            hunk = Hunk(
+                old_start=int(old_start),
+                old_count=int(old_count) if old_count is not None else 1,
+                new_start=int(new_start),
+                new_count=int(new_count) if new_count is not None else 1,
+                section=section or "",
+            )
+            current.hunks.append(hunk)
+        elif hunk is not None:
+            hunk.lines.append(line)
+        else:
+            current.header_lines.append(line)
+
+    if current is not None:
+        yield current
@@ -0,0 +1,23 @@
+# app/diff/remap.py
+from typing import Optional
+
+from app.models import FileAnalysis
+from .index import FileIndex
+from .parser import FileDiff
+
+
+def carry_forward_file(previous: FileAnalysis, file_diff: FileDiff,
+                       file_index: Optional[FileIndex] = None) -> Optional[FileAnalysis]:
+    """
+    The issues of an earlier review of a file that the delta diff touches,
+    moved to their new line numbers; None if none of them survive.
+    """
+    if file_diff.is_deleted:
+        return None
+    file_index = file_index or FileIndex(file_diff)
+    issues = []
+    for issue in previous.issues:
+        new_line = file_index.map_old_to_new(issue.line)
+        if new_line is not None:
+            issues.append(issue.copy(update={"line": new_line}))
+    return FileAnalysis(name=file_diff.path, issues=issues) if issues else None
@@ -0,0 +1,165 @@
+# app/diff/triage.py
+import fnmatch
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from .parser import FileDiff
+
+# Skip files no reviewer would read (lockfiles, vendored and generated code, binaries)
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "true").lower() == "true"
+
+
+def _globs(name: str, default: str = "") -> List[str]:
+    return [p.strip() for p in os.getenv(name, default).split(",") if p.strip()]
+
+
+# Skipped, with the reason reported for them. fnmatch's '*' also matches '/'.
+LOCKFILE_PATHS = [
+    "package-lock.json", "*/package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "*/yarn.lock",
+    "pnpm-lock.yaml", "*/pnpm-lock.yaml", "poetry.lock", "*/poetry.lock", "Pipfile.lock", "uv.lock",
+    "Cargo.lock", "*/Cargo.lock", "Gemfile.lock", "composer.lock", "go.sum", "*/go.sum", "*.lock",
+]
+VENDORED_PATHS = ["vendor/*", "*/vendor/*", "node_modules/*", "*/node_modules/*", "third_party/*",
+                  "*/third_party/*", "*/site-packages/*"]
+GENERATED_PATHS = [
+    "*.min.js", "*.min.css", "*.map", "*.bundle.js", "dist/*", "*/dist/*", "*.snap", "*__snapshots__/*",
+    "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "*.pb.cc", "*.pb.h", "*.generated.*", "*.g.dart",
+]
+# More globs to skip, and globs that are always reviewed even if another rule would skip them
+TRIAGE_SKIP_PATHS = _globs("TRIAGE_SKIP_PATHS")
+TRIAGE_REVIEW_PATHS = _globs("TRIAGE_REVIEW_PATHS")
+
+# Added lines averaging more characters than this are minified or data
+TRIAGE_MAX_AVG_LINE_LENGTH = int(os.getenv("TRIAGE_MAX_AVG_LINE_LENGTH", "250"))
+# Added text with more bits of entropy per character than this is encoded data
+# (base64 is ~6; source code stays well under 5)
+TRIAGE_MAX_ENTROPY = float(os.getenv("TRIAGE_MAX_ENTROPY", "5.5"))
+# Content heuristics only judge files with at least this much added text
+TRIAGE_MIN_CONTENT_CHARS = 2000
+# Entropy is measured on this much added text
+ENTROPY_SAMPLE_CHARS = 64 * 1024
+# Markers that generators put at the top of their output
+GENERATED_MARKER_RE = re.compile(r'@generated|\bDO NOT EDIT\b|auto-?generated|generated by\b', re.IGNORECASE)
+GENERATED_MARKER_LINES = 10
+
+
+def parse_gitattributes(text: str) -> List[Tuple[str, str]]:
+    """
+    (pattern, reason) of the .gitattributes lines that mark files as
+    generated or vendored for GitHub linguist. Unset values ('-attr',
+    'attr=false') are kept with an empty reason, since later lines win.
+    """
+    rules = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        pattern, *attributes = line.split()
+        for attribute in attributes:
+            name, _, value = attribute.lstrip('-!').partition('=')
+            if name not in ('linguist-generated', 'linguist-vendored'):
+                continue
+            unset = attribute[:1] in ('-', '!') or value.lower() == 'false'
+            rules.append((pattern, "" if unset else name.split('-')[1]))
+    return rules
+
+
+def _attribute_matches(pattern: str, path: str) -> bool:
+    """gitattributes matching: a pattern without '/' matches the file name at any depth."""
+    pattern = pattern.lstrip('/')
+    if pattern.endswith('/**'):
+        return path.startswith(pattern[:-2])
+    if '/' not in pattern:
+        return fnmatch.fnmatch(os.path.basename(path), pattern)
+    if pattern.startswith('**/'):
+        return fnmatch.fnmatch(path, pattern[3:]) or fnmatch.fnmatch(path, '*/' + pattern[3:])
+    return fnmatch.fnmatch(path, pattern)
+
+
+def entropy(text: str) -> float:
+    """Shannon entropy of the text, in bits per character."""
+    if not text:
+        return 0.0
+    total = len(text)
+    return -sum(n / total * math.log2(n / total) for n in Counter(text).values())
+
+
+def diff_size(file_diff: FileDiff) -> Tuple[int, int, int]:
+    """(added lines, removed lines, estimated tokens) of one file's diff."""
+    added = removed = chars = 0
+    for hunk in file_diff.hunks:
+        chars += len(hunk.header) + 1
+        for line in hunk.lines:
+            chars += len(line) + 1
+            tag = line[:1]
+            if tag == '+':
+                added += 1
+            elif tag == '-':
+                removed += 1
+    # Same ~4 characters per token estimate as the chunker
+    return added, removed, chars // 4 + 1
+
+
+class FileTriage:
+    """
+    Decides which files of a diff are worth a review. Lockfiles, vendored
+    and generated files (by path, by the repository's .gitattributes, or
+    because they look minified or encoded) and binaries are skipped.
+    """
+
+    def __init__(self, gitattributes: Optional[str] = None, skip_paths: Optional[List[str]] = None,
+                 review_paths: Optional[List[str]] = None):
+        self.attributes = parse_gitattributes(gitattributes) if gitattributes else []
+        self.skip_paths = TRIAGE_SKIP_PATHS if skip_paths is None else skip_paths
+        self.review_paths = TRIAGE_REVIEW_PATHS if review_paths is None else review_paths
+
+    def classify(self, file_diff: FileDiff) -> Optional[str]:
+        """Why the file is skipped ('binary', 'lockfile', 'vendored', 'generated', ...), or None to review it."""
+        path = file_diff.path
+        if file_diff.is_binary:
+            return "binary"
+        if any(fnmatch.fnmatch(path, p) for p in self.review_paths):
+            return None
+        if any(fnmatch.fnmatch(path, p) for p in self.skip_paths):
+            return "configured"
+
+        # The last matching line of .gitattributes wins
+        for pattern, reason in reversed(self.attributes):
+            if _attribute_matches(pattern, path):
+                if reason:
+                    return reason
+                break
+        else:
+            if any(fnmatch.fnmatch(path, p) for p in LOCKFILE_PATHS):
+                return "lockfile"
+            if any(fnmatch.fnmatch(path, p) for p in VENDORED_PATHS):
+                return "vendored"
+            if any(fnmatch.fnmatch(path, p) for p in GENERATED_PATHS):
+                return "generated"
+
+        return self._classify_content(file_diff)
+
+    def _classify_content(self, file_diff: FileDiff) -> Optional[str]:
+        lines = []
+        for hunk in file_diff.hunks:
+            new_no = hunk.new_start
+            for line in hunk.lines:
+                tag = line[:1]
+                if tag == '+':
+                    if new_no <= GENERATED_MARKER_LINES and GENERATED_MARKER_RE.search(line):
+                        return "generated"
+                    lines.append(line[1:])
+                if tag in ('+', ' ', ''):
+                    new_no += 1
+
+        chars = sum(len(line) for line in lines)
+        if chars < TRIAGE_MIN_CONTENT_CHARS:
+            return None
+        if chars / len(lines) > TRIAGE_MAX_AVG_LINE_LENGTH:
+            return "minified"
+        if entropy("\n".join(lines)[:ENTROPY_SAMPLE_CHARS]) > TRIAGE_MAX_ENTROPY:
+            return "encoded"
+        return None
@@ -1,25 +1,78 @@
 # app/main.py
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware  # <-- ADDED
 from celery.result import AsyncResult
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import json
+import logging
 import os
+import time
+import uuid
 
 # Import our Celery task and models
-from .celery_tasks import analyze_pr_task
 from .worker import celery_app  # Import the celery_app instance
+from .scheduler import submit_review
+from .api_tools.github_fetcher import GitHubFetcher
+from .store.batches import BatchStore
+from .store.result_store import ResultCache, ResultStore
+from .store.checkpoints import ReviewCheckpoints
+from .store.redis_client import get_async_redis
+from .store.events import TERMINAL_EVENTS, events_channel, events_log_key
+from .telemetry import configure_logging, configure_tracing, metrics_payload
+from .webhooks import WEBHOOK_SECRET, GitHubWebhooks, MalformedDelivery, verify_signature
+from .analytics import ANALYTICS_ENABLED, ANALYTICS_LOADER, AnalyticsLoader, get_analytics_db
+from .admission import (ADMISSION_CLIENT_HEADER, ADMISSION_ENABLED, Admission, Overloaded, get_admission_controller,
+                        largest_admissible)
 from .models import (
     PRAnalysisRequest, 
+    BatchAnalysisRequest,
+    BatchStatus,
+    BatchTaskStatus,
+    WebhookAck,
+    IssueTypeCount,
+    FileIssueCount,
+    RepoActivity,
     TaskStatus, 
     FinalTaskResult, 
     AnalysisResults
 )
 
+configure_logging()
+configure_tracing()
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Autonomous Code Reviewer API")
 
+# Seconds between SSE keep-alive comments while a task is quiet
+STREAM_KEEPALIVE_SECONDS = 15
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "200"))
+
+# Serialized responses of completed tasks; repeat reads skip Redis and validation
+result_cache = ResultCache()
+
+# Moves finished reviews from the workers into the analytics database;
+# only in the process started with ANALYTICS_LOADER=true (single writer)
+analytics_loader: Optional[AnalyticsLoader] = None
+
+
+@app.on_event("startup")
+def start_analytics_loader():
+    global analytics_loader
+    if ANALYTICS_ENABLED and ANALYTICS_LOADER:
+        analytics_loader = AnalyticsLoader(get_analytics_db())
+        analytics_loader.start()
+
+
+@app.on_event("shutdown")
+def stop_analytics_loader():
+    if analytics_loader is not None:
+        analytics_loader.stop()
+
 # --- 1. ADD CORS MIDDLEWARE ---
 # This allows our front-end (on the same origin) to talk to the API
 app.add_middleware(
@@ -48,24 +101,199 @@ async def read_root(request: Request):
 
 # --- 4. API ENDPOINTS (No changes here, just for context) ---
 
+def _admit(http_request: Request, cost: int = 1) -> Optional[Admission]:
+    """
+    Admission control of review requests: over a rate limit or over capacity,
+    the request is refused (429 / 503) with a Retry-After header.
+    """
+    if not ADMISSION_ENABLED:
+        return None
+    client = ""
+    if ADMISSION_CLIENT_HEADER:
+        # X-Forwarded-For lists the original client first
+        client = http_request.headers.get(ADMISSION_CLIENT_HEADER, "").split(",")[0].strip()
+    if not client:
+        client = http_request.client.host if http_request.client else "unknown"
+    try:
+        return get_admission_controller().admit(client, cost)
+    except Overloaded as e:
+        logger.info("Review request refused", extra={"client": client, "status": e.status_code,
+                                                     "retry_after": e.retry_after})
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
 # POST /analyze-pr
 @app.post("/analyze-pr", response_model=TaskStatus)
-async def analyze_pr(request: PRAnalysisRequest):
+def analyze_pr(request: PRAnalysisRequest, http_request: Request):
+    admission = _admit(http_request)
     github_token = os.getenv("GITHUB_TOKEN")
-    task = analyze_pr_task.delay(
-        request.repo_url, 
-        request.pr_number, 
-        github_token
-    )
+    fetcher = GitHubFetcher(token=github_token)
+    try:
+        repo_path = fetcher.repo_path(request.repo_url)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # The head SHA lets us reuse an identical queued/running review; without
+    # it (GitHub unreachable) the task is queued anyway and reports the error
+    try:
+        pr_info = fetcher.fetch_pr_info(request.repo_url, request.pr_number)
+    except Exception as e:
+        logger.warning("Could not fetch PR info",
+                       extra={"repo": repo_path, "pr": request.pr_number, "error": str(e)})
+        pr_info = None
+
+    submission = submit_review(repo_path, request.repo_url, request.pr_number, github_token, pr_info)
     return TaskStatus(
-        task_id=task.id,
-        status=task.status,
-        message="Analysis task queued successfully."
+        task_id=submission.task_id,
+        status=AsyncResult(submission.task_id, app=celery_app).status,
+        message=("An identical analysis is already queued or done; reusing it."
+                 if submission.deduplicated else "Analysis task queued successfully."),
+        estimated_wait_seconds=admission.estimated_wait_seconds if admission else None,
     )
 
+# POST /analyze-batch
+@app.post("/analyze-batch", response_model=BatchStatus)
+def analyze_batch(batch: BatchAnalysisRequest, http_request: Request):
+    """
+    Queues reviews for many PRs at once. Identical (repo, PR, head SHA) jobs,
+    inside the batch or already in flight, share one task. Small PRs go to a
+    separate, higher priority queue so they finish quickly.
+    """
+    # A batch over the rate limits would be refused in every window, so say so instead of asking to retry
+    max_size = min(MAX_BATCH_SIZE, largest_admissible()) if ADMISSION_ENABLED else MAX_BATCH_SIZE
+    if len(batch.requests) > max_size:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {max_size} PRs.")
+    # Every PR of the batch counts against the limits
+    _admit(http_request, cost=len(batch.requests))
+
+    github_token = os.getenv("GITHUB_TOKEN")
+    fetcher = GitHubFetcher(token=github_token)
+
+    def lookup(item: PRAnalysisRequest):
+        try:
+            return fetcher.repo_path(item.repo_url), fetcher.fetch_pr_info(item.repo_url, item.pr_number), None
+        except Exception as e:
+            return None, None, str(e)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        lookups = list(pool.map(lookup, batch.requests))
+
+    # Queue the smallest PRs first
+    order = sorted(
+        range(len(batch.requests)),
+        key=lambda i: (lookups[i][1] or {}).get("additions", 0) + (lookups[i][1] or {}).get("deletions", 0)
+    )
+
+    items: List[dict] = [None] * len(batch.requests)
+    for i in order:
+        item = batch.requests[i]
+        repo_path, pr_info, error = lookups[i]
+        entry = {"repo_url": item.repo_url, "pr_number": item.pr_number}
+        if error:
+            entry.update(status="REJECTED", message=error)
+        else:
+            submission = submit_review(repo_path, item.repo_url, item.pr_number, github_token, pr_info)
+            entry.update(
+                head_sha=pr_info["head"]["sha"],
+                task_id=submission.task_id,
+                queue=submission.queue,
+                deduplicated=submission.deduplicated,
+                status="PENDING",
+            )
+        items[i] = entry
+
+    batch_id = str(uuid.uuid4())
+    BatchStore().save(batch_id, items)
+    return _batch_status(batch_id, items)
+
+# GET /batch/<batch_id>
+@app.get("/batch/{batch_id}", response_model=BatchStatus)
+def get_batch_status(batch_id: str):
+    items = BatchStore().load(batch_id)
+    if items is None:
+        raise HTTPException(status_code=404, detail="Batch not found.")
+    return _batch_status(batch_id, items)
+
+
+def _batch_status(batch_id: str, items: List[dict]) -> BatchStatus:
+    """Aggregates the state of every task of a batch."""
+    tasks: List[BatchTaskStatus] = []
+    counts = {}
+    for entry in items:
+        task = BatchTaskStatus(**entry)
+        if task.task_id:
+            task.status = AsyncResult(task.task_id, app=celery_app).status
+        counts[task.status] = counts.get(task.status, 0) + 1
+        tasks.append(task)
+
+    finished = sum(counts.get(state, 0) for state in ("SUCCESS", "FAILURE", "REVOKED", "REJECTED"))
+    if finished < len(tasks):
+        status = "PROCESSING" if finished or counts.get("PROCESSING") or counts.get("STARTED") else "PENDING"
+    elif counts.get("SUCCESS", 0) == len(tasks):
+        status = "SUCCESS"
+    elif counts.get("SUCCESS", 0) == 0:
+        status = "FAILURE"
+    else:
+        status = "PARTIAL_FAILURE"
+
+    return BatchStatus(batch_id=batch_id, status=status, total=len(tasks), counts=counts, tasks=tasks)
+
+# POST /webhook/github
+@app.post("/webhook/github", response_model=WebhookAck)
+async def github_webhook(request: Request):
+    """
+    Receives GitHub pull_request deliveries. Pushes to a PR are debounced:
+    the review of the latest head is queued once the pushes stop, and
+    queued reviews of older heads are revoked.
+    """
+    if not WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="GITHUB_WEBHOOK_SECRET is not configured.")
+    body = await request.body()
+    if not verify_signature(WEBHOOK_SECRET, body, request.headers.get("x-hub-signature-256")):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature.")
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Webhook body is not JSON.")
+    # Handling talks to Redis and the broker synchronously; keep it off the event loop
+    try:
+        return await run_in_threadpool(GitHubWebhooks().handle, request.headers.get("x-github-event", ""), payload)
+    except MalformedDelivery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# GET /analytics/...
+def _analytics_since(days: int) -> int:
+    if not ANALYTICS_ENABLED:
+        raise HTTPException(status_code=503, detail="Analytics are disabled (ANALYTICS_ENABLED=false).")
+    return int(time.time()) - days * 86400
+
+@app.get("/analytics/issue-types", response_model=List[IssueTypeCount])
+def analytics_issue_types(repo: Optional[str] = None, days: int = Query(7, ge=1),
+                          limit: int = Query(20, ge=1, le=1000)):
+    """Most frequent issue types per repository ('owner/repo') in PRs reviewed in the last `days` days."""
+    return get_analytics_db().issue_types(_analytics_since(days), repo=repo, limit=limit)
+
+@app.get("/analytics/files", response_model=List[FileIssueCount])
+def analytics_files(repo: str, type: Optional[str] = None, days: int = Query(7, ge=1),
+                    limit: int = Query(20, ge=1, le=1000)):
+    """The files of a repository with the most issues, optionally of one type."""
+    return get_analytics_db().files(repo, _analytics_since(days), issue_type=type, limit=limit)
+
+@app.get("/analytics/repos", response_model=List[RepoActivity])
+def analytics_repos(days: int = Query(7, ge=1)):
+    """PRs reviewed and issues found per repository."""
+    return get_analytics_db().repos(_analytics_since(days))
+
+# GET /metrics
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics of the API (and, when the tasks run in it, of the review stages)."""
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
 # GET /status/<task_id>
 @app.get("/status/{task_id}", response_model=TaskStatus)
-async def get_task_status(task_id: str):
+def get_task_status(task_id: str):
+    # Plain def: the result backend and the progress counters are synchronous Redis calls
     task_result = AsyncResult(task_id, app=celery_app)
     status = task_result.status
     message = status
@@ -82,16 +310,27 @@ async def get_task_status(task_id: str):
         message = "Task is currently being processed by a worker."
     elif status == 'PENDING':
         message = "Task is waiting in the queue."
-        
+
+    progress = ReviewCheckpoints(task_id).progress()
+    chunks_done, chunks_total = progress if progress else (None, None)
+    if status in ('PROCESSING', 'RETRY') and progress:
+        message = f"Task is currently being processed by a worker ({chunks_done}/{chunks_total} chunks reviewed)."
+
     return TaskStatus(
         task_id=task_id,
         status=status,
-        message=message
+        message=message,
+        chunks_done=chunks_done,
+        chunks_total=chunks_total,
     )
 
 # GET /results/<task_id>
 @app.get("/results/{task_id}", response_model=FinalTaskResult)
 async def get_task_results(task_id: str):
+    cached = result_cache.get(task_id)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
     task_result = AsyncResult(task_id, app=celery_app)
     
     if not task_result.ready():
@@ -103,14 +342,19 @@ async def get_task_results(task_id: str):
     if task_result.status == 'SUCCESS':
         results_data = task_result.result
         try:
-            results_model = AnalysisResults.parse_obj(results_data)
-            return FinalTaskResult(
-                task_id=task_id,
-                status="completed",
-                results=results_model
-            )
+            if isinstance(results_data, dict) and "result_ref" in results_data:
+                results_model = ResultStore().load(results_data["result_ref"])
+            else:
+                # Tasks that finished before results were stored separately
+                results_model = AnalysisResults.parse_obj(results_data)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Result schema validation failed: {e}")
+        if results_model is None:
+            raise HTTPException(status_code=404, detail=f"Results of task {task_id} have expired.")
+
+        body = FinalTaskResult(task_id=task_id, status="completed", results=results_model).json().encode()
+        result_cache.put(task_id, body)
+        return Response(content=body, media_type="application/json")
             
     elif task_result.status == 'FAILURE':
         result = task_result.info
@@ -120,4 +364,77 @@ async def get_task_results(task_id: str):
             detail=f"Task {task_id} failed. Error: {error_message}"
         )
         
-    return HTTPException(status_code=404, detail="Task not found.")
\ No newline at end of file
+    return HTTPException(status_code=404, detail="Task not found.")
+
+
+def _sse(event: dict) -> str:
+    """Formats one task event as a Server-Sent Event (the seq is the event id)."""
+    return f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+# GET /stream/<task_id>
+@app.get("/stream/{task_id}")
+async def stream_task(task_id: str, request: Request):
+    """
+    Streams a task's progress as Server-Sent Events: state changes, each
+    file's issues as soon as they are reviewed, then 'done' or 'error'.
+
+    Events come from the worker over Redis pub/sub. Earlier events are
+    replayed from the task's event log, skipping those the client already
+    has (Last-Event-ID), so late joiners and reconnects see everything.
+    """
+    redis_client = get_async_redis()
+    last_seen = int(request.headers.get("last-event-id") or 0)
+
+    async def event_source():
+        nonlocal last_seen
+        pubsub = redis_client.pubsub()
+        # Subscribe before reading the log so nothing falls in between
+        await pubsub.subscribe(events_channel(task_id))
+        try:
+            backlog = await redis_client.lrange(events_log_key(task_id), 0, -1)
+            for raw in backlog:
+                event = json.loads(raw)
+                if event["seq"] <= last_seen:
+                    continue
+                last_seen = event["seq"]
+                yield _sse(event)
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+
+            if not backlog:
+                # The task may have finished before events existed (or they expired)
+                task_result = AsyncResult(task_id, app=celery_app)
+                if task_result.ready():
+                    kind = "done" if task_result.status == "SUCCESS" else "error"
+                    yield _sse({"seq": 0, "event": kind, "data": {"state": task_result.status}})
+                    return
+
+            while not await request.is_disconnected():
+                message = await pubsub.get_message(ignore_subscribe_messages=True,
+                                                   timeout=STREAM_KEEPALIVE_SECONDS)
+                if message is None:
+                    # Quiet for a while: make sure the worker did not die without a final event
+                    task_result = AsyncResult(task_id, app=celery_app)
+                    if task_result.ready():
+                        kind = "done" if task_result.status == "SUCCESS" else "error"
+                        yield _sse({"seq": last_seen + 1, "event": kind, "data": {"state": task_result.status}})
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                event = json.loads(message["data"])
+                if event["seq"] <= last_seen:
+                    continue
+                last_seen = event["seq"]
+                yield _sse(event)
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            await pubsub.unsubscribe(events_channel(task_id))
+            await pubsub.aclose()
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,6 +1,6 @@
 # app/models.py
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 # --- API Input Model ---
 class PRAnalysisRequest(BaseModel):
@@ -9,6 +9,10 @@ class PRAnalysisRequest(BaseModel):
     pr_number: int = Field(..., example=123)
     github_token: Optional[str] = Field(None, description="Optional GitHub PAT")
 
+class BatchAnalysisRequest(BaseModel):
+    """Input model for the POST /analyze-batch endpoint."""
+    requests: List[PRAnalysisRequest] = Field(..., min_length=1)
+
 # --- Structured AI Output Models ---
 class Issue(BaseModel):
     """Represents a single issue found in a file."""
@@ -16,31 +20,147 @@ class Issue(BaseModel):
     line: int = Field(..., description="Line number where the issue was found")
     description: str = Field(..., description="Detailed description of the issue")
     suggestion: str = Field(..., description="Proposed fix or improvement")
+    # Set once the line is checked against the diff (see app/diff/index.py)
+    on_added_line: Optional[bool] = Field(None, description="Whether the line was added by the PR")
 
 class FileAnalysis(BaseModel):
     """Analysis results for a single file."""
     name: str = Field(..., description="Name of the file (e.g., 'app/main.py')")
     issues: List[Issue] = Field(..., description="List of issues found in the file")
 
+class SkippedFile(BaseModel):
+    """A file of the diff that triage left out of the review (see app/diff/triage.py)."""
+    name: str
+    # 'binary', 'lockfile', 'vendored', 'generated', 'minified', 'encoded' or 'configured'
+    reason: str
+    added_lines: int = 0
+    removed_lines: int = 0
+    # Diff tokens that were not sent to the model
+    tokens_saved: int = 0
+
 class AnalysisSummary(BaseModel):
     """Summary of the overall analysis."""
     total_files: int
     total_issues: int
     critical_issues: int = Field(..., description="Count of issues marked as 'bug' or 'critical'")
 
+class LLMCallStats(BaseModel):
+    """Size, routing and latency of one model call."""
+    chunk: str
+    route: str
+    model: str
+    risk: str
+    prompt_tokens: int
+    completion_tokens: int = 0
+    latency_ms: int
+    # Part of prompt_tokens spent on repository context (see app/context/)
+    context_tokens: int = 0
+    # Issues recovered from a truncated or malformed reply
+    recovered_issues: int = 0
+    # A second, small call was made to fix the unparseable part of the reply
+    repaired: bool = False
+    # Reported lines moved onto a nearby added line, or dropped as outside the diff
+    snapped_issues: int = 0
+    dropped_issues: int = 0
+    # Retries after the provider throttled the call (429/503)
+    throttle_retries: int = 0
+    # Shared the reply of an identical call that was already in flight
+    coalesced: bool = False
+
+class ReviewStats(BaseModel):
+    """Bookkeeping about how a review was produced (not part of the AI output)."""
+    chunks: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    head_sha: Optional[str] = None
+    incremental: bool = False
+    previous_head_sha: Optional[str] = None
+    carried_issues: int = 0
+    static_issues: int = 0
+    chunks_skipped: int = 0
+    # Chunks reviewed by an earlier attempt of the same task (see app/store/checkpoints.py)
+    chunks_resumed: int = 0
+    # Chunks given the review of a nearly identical chunk (see app/store/near_duplicates.py)
+    near_duplicate_hits: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    context_tokens: int = 0
+    issues_snapped: int = 0
+    issues_dropped: int = 0
+    # Files left out by triage, and the diff tokens they would have cost
+    files_skipped: int = 0
+    tokens_saved: int = 0
+    llm_calls: List[LLMCallStats] = []
+
 class AnalysisResults(BaseModel):
     """The final structured output from the AI agent."""
     files: List[FileAnalysis]
     summary: AnalysisSummary
+    skipped_files: List[SkippedFile] = []
+    stats: Optional[ReviewStats] = None
 
 # --- API Output Models (for tracking tasks) ---
 class TaskStatus(BaseModel):
     task_id: str
     status: str
     message: Optional[str] = None
+    # Review progress, once the task reads its diff; the total grows until the whole diff is read
+    chunks_done: Optional[int] = None
+    chunks_total: Optional[int] = None
+    # Expected time in the queue when the task was accepted, from recent throughput
+    estimated_wait_seconds: Optional[float] = None
     
 class FinalTaskResult(BaseModel):
     """Model for the GET /results/<task_id> endpoint."""
     task_id: str
     status: str
-    results: Optional[AnalysisResults] = None
\ No newline at end of file
+    results: Optional[AnalysisResults] = None
+
+class WebhookAck(BaseModel):
+    """Model for the POST /webhook/github endpoint."""
+    status: str = Field(..., description="'scheduled', 'ignored' or 'pong'")
+    message: Optional[str] = None
+    repo: Optional[str] = None
+    pr_number: Optional[int] = None
+    head_sha: Optional[str] = None
+    # The review is queued after this long unless another push arrives first
+    review_in_seconds: Optional[float] = None
+
+class BatchTaskStatus(BaseModel):
+    """One job of a batch. Duplicate jobs point at the task that already owns them."""
+    repo_url: str
+    pr_number: int
+    head_sha: Optional[str] = None
+    task_id: Optional[str] = None
+    queue: Optional[str] = None
+    deduplicated: bool = False
+    status: str
+    message: Optional[str] = None
+
+class BatchStatus(BaseModel):
+    """Model for the POST /analyze-batch and GET /batch/<batch_id> endpoints."""
+    batch_id: str
+    status: str
+    total: int
+    counts: Dict[str, int]
+    tasks: List[BatchTaskStatus]
+
+# --- Analytics Models (see app/analytics.py) ---
+class IssueTypeCount(BaseModel):
+    """Model for the GET /analytics/issue-types endpoint."""
+    repo: str
+    type: str
+    count: int
+
+class FileIssueCount(BaseModel):
+    """Model for the GET /analytics/files endpoint."""
+    repo: str
+    file: str
+    count: int
+
+class RepoActivity(BaseModel):
+    """Model for the GET /analytics/repos endpoint."""
+    repo: str
+    prs_reviewed: int
+    issues: int
+    critical_issues: int
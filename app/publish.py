@@ -0,0 +1,238 @@
+# app/publish.py
+import hashlib
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import requests
+
+from .api_tools.github_fetcher import GitHubFetcher
+from .diff.index import DiffIndex
+from .diff.parser import diff_lines, iter_file_diffs
+from .models import AnalysisResults, Issue
+
+# Post finished reviews to their PR as one GitHub review with inline comments
+PUBLISH_REVIEWS = os.getenv("PUBLISH_REVIEWS", "false").lower() == "true"
+# Inline comments and JSON bytes per submitted review; more are split over several reviews
+PUBLISH_MAX_COMMENTS = int(os.getenv("PUBLISH_MAX_COMMENTS", "100"))
+PUBLISH_MAX_PAYLOAD_BYTES = int(os.getenv("PUBLISH_MAX_PAYLOAD_BYTES", str(512 * 1024)))
+# GitHub refuses comment and review bodies longer than this
+MAX_BODY_CHARS = 65536
+# Findings that cannot be inline comments are listed in the review body, this many per review
+MAX_LISTED_FINDINGS = 50
+LISTED_DESCRIPTION_CHARS = 300
+
+# Every posted finding carries its fingerprint, which is how re-runs recognise it
+MARKER = "<!-- ai-code-review:{} -->"
+MARKER_RE = re.compile(r'<!-- ai-code-review:([0-9a-f]{16}) -->')
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(path: str, issue: Issue) -> str:
+    """
+    Identifies a finding across re-runs: its file, line, type and description
+    (whitespace and case aside). Rule findings share one description per
+    rule, so the line is what tells them apart.
+    """
+    description = " ".join(issue.description.split()).lower()
+    return hashlib.sha256(f"{path}\0{issue.line}\0{issue.type.lower()}\0{description}".encode()).hexdigest()[:16]
+
+
+def _title(issue: Issue) -> str:
+    return issue.type.replace('_', ' ').capitalize()
+
+
+def comment_body(issue: Issue, mark: str) -> str:
+    """The text of the inline comment for a finding, ending with its marker."""
+    text = f"**{_title(issue)}**: {issue.description}"
+    if issue.suggestion:
+        text += f"\n\n**Suggestion:** {issue.suggestion}"
+    marker = MARKER.format(mark)
+    return text[:MAX_BODY_CHARS - len(marker) - 2] + "\n\n" + marker
+
+
+@dataclass
+class Finding:
+    """An issue of the results that is not on the PR yet."""
+    path: str
+    issue: Issue
+    mark: str
+    body: str
+
+    def comment(self) -> dict:
+        """The review comment of the create-review payload, on the new side of the diff."""
+        return {"path": self.path, "line": self.issue.line, "side": "RIGHT", "body": self.body}
+
+    def listing(self) -> str:
+        description = " ".join(self.issue.description.split())
+        if len(description) > LISTED_DESCRIPTION_CHARS:
+            description = description[:LISTED_DESCRIPTION_CHARS - 1] + "…"
+        return (f"- `{self.path}` line {self.issue.line}: **{_title(self.issue)}** {description} "
+                f"{MARKER.format(self.mark)}")
+
+
+@dataclass
+class PublishPlan:
+    """What a publish has to do, given what earlier runs already posted."""
+    pending: List[Finding] = field(default_factory=list)
+    # (comment id, new body) of posted comments whose text changed
+    updates: List[Tuple[int, str]] = field(default_factory=list)
+    unchanged: int = 0
+
+
+@dataclass
+class PublishReport:
+    reviews: int = 0
+    comments: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    # Findings listed in a review body because their line is not in the diff
+    listed: int = 0
+    # Why nothing was published, if so
+    skipped: Optional[str] = None
+
+
+def plan_review(results: AnalysisResults, comments: List[dict], reviews: List[dict]) -> PublishPlan:
+    """
+    Sorts the findings into new ones, posted ones whose text changed, and
+    posted ones left as they are. A posted comment that GitHub marks as
+    outdated (its line was changed since) does not count as posted.
+    """
+    posted = {}
+    for comment in comments:
+        match = MARKER_RE.search(comment.get("body") or "")
+        if match and comment.get("line") is not None:
+            posted[match.group(1)] = comment
+    listed = {mark for review in reviews for mark in MARKER_RE.findall(review.get("body") or "")}
+
+    plan = PublishPlan()
+    seen = set()
+    for analysis in results.files:
+        for issue in analysis.issues:
+            mark = fingerprint(analysis.name, issue)
+            if mark in seen:
+                continue
+            seen.add(mark)
+            body = comment_body(issue, mark)
+            comment = posted.get(mark)
+            if comment is not None and comment.get("body") != body:
+                plan.updates.append((comment["id"], body))
+            elif comment is not None or mark in listed:
+                plan.unchanged += 1
+            else:
+                plan.pending.append(Finding(analysis.name, issue, mark, body))
+    return plan
+
+
+def place_findings(findings: List[Finding], index: DiffIndex) -> Tuple[List[Finding], List[Finding]]:
+    """(inline, listed): GitHub only takes inline comments on lines the diff shows."""
+    inline, listed = [], []
+    for finding in findings:
+        file_index = index.get(finding.path)
+        if file_index is not None and file_index.contains(finding.issue.line):
+            inline.append(finding)
+        else:
+            listed.append(finding)
+    return inline, listed
+
+
+def split_batches(findings: List[Finding], max_comments: int = PUBLISH_MAX_COMMENTS,
+                  max_bytes: int = PUBLISH_MAX_PAYLOAD_BYTES) -> List[List[Finding]]:
+    """As few reviews as GitHub's payload limits allow: one, unless there are very many comments."""
+    batches: List[List[Finding]] = []
+    current: List[Finding] = []
+    size = 0
+    for finding in findings:
+        cost = len(json.dumps(finding.comment()).encode())
+        if current and (len(current) >= max_comments or size + cost > max_bytes):
+            batches.append(current)
+            current, size = [], 0
+        current.append(finding)
+        size += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def split_listed(findings: List[Finding], size: int = MAX_LISTED_FINDINGS) -> List[List[Finding]]:
+    """The listed findings in groups of `size`, one group per review body."""
+    return [findings[i:i + size] for i in range(0, len(findings), size)]
+
+
+def review_body(results: AnalysisResults, head_sha: str, listed: List[Finding], part: int = 1, parts: int = 1) -> str:
+    summary = results.summary
+    heading = (f"Automated review of {head_sha[:7]}: {summary.total_issues} issue(s) in "
+               f"{summary.total_files} file(s), {summary.critical_issues} critical.")
+    if parts > 1:
+        heading += f" (part {part} of {parts})"
+    lines = [heading]
+    if listed:
+        lines += ["", "Findings on lines this diff does not show:"]
+        lines += [finding.listing() for finding in listed]
+    return "\n".join(lines)[:MAX_BODY_CHARS]
+
+
+class ReviewPublisher:
+    """
+    Posts the findings of a review to its PR as one GitHub review with inline
+    comments (several only when the payload limits or the number of listed
+    findings require it). Running it again posts only what is missing and
+    edits comments whose text changed.
+    """
+
+    def __init__(self, fetcher: GitHubFetcher):
+        self.fetcher = fetcher
+
+    def publish(self, repo_url: str, pr_number: int, head_sha: str, results: AnalysisResults) -> PublishReport:
+        pr_info = self.fetcher.fetch_pr_info(repo_url, pr_number)
+        if pr_info.get("head", {}).get("sha") != head_sha:
+            # The review of the new head publishes its own findings
+            return PublishReport(skipped="head moved")
+
+        plan = plan_review(results, self.fetcher.fetch_review_comments(repo_url, pr_number),
+                           self.fetcher.fetch_reviews(repo_url, pr_number))
+        report = PublishReport(unchanged=plan.unchanged)
+        for comment_id, body in plan.updates:
+            self.fetcher.update_review_comment(repo_url, comment_id, body)
+            report.updated += 1
+        if not plan.pending:
+            return report
+
+        # Which lines take a comment is decided against the PR's diff, as GitHub sees it
+        with self.fetcher.fetch_pr_diff_stream(repo_url, pr_number) as diff:
+            index = DiffIndex(iter_file_diffs(diff_lines(diff)))
+        inline, listed = place_findings(plan.pending, index)
+
+        # Listed findings that do not fit the bodies of the inline batches get reviews of their own
+        batches = split_batches(inline)
+        listings = split_listed(listed)
+        part = 0
+        while batches or listings:
+            part += 1
+            batch = batches.pop(0) if batches else []
+            batch_listed = listings.pop(0) if listings else []
+            parts = part + max(len(batches), len(listings))
+            body = review_body(results, head_sha, batch_listed, part, parts)
+            try:
+                self.fetcher.create_review(repo_url, pr_number, head_sha, body, [f.comment() for f in batch])
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code != 422 or not batch:
+                    raise
+                # GitHub refused a line after all; list the batch in this body and, past the cap, in more reviews
+                logger.warning("Inline comments refused, listing them in the review body",
+                               extra={"repo": repo_url, "pr": pr_number, "comments": len(batch)})
+                room = MAX_LISTED_FINDINGS - len(batch_listed)
+                batch_listed = batch_listed + batch[:room]
+                listings += split_listed(batch[room:])
+                parts = part + max(len(batches), len(listings))
+                body = review_body(results, head_sha, batch_listed, part, parts)
+                self.fetcher.create_review(repo_url, pr_number, head_sha, body, [])
+                batch = []
+            report.reviews += 1
+            report.comments += len(batch)
+            report.listed += len(batch_listed)
+        return report
@@ -0,0 +1,109 @@
+# app/rules/builtin.py
+import ast
+import os
+import re
+from typing import List
+
+from app.diff.parser import FileDiff
+from app.models import Issue
+from .engine import FileRule, LineRule, register
+
+MAX_LINE_LENGTH = int(os.getenv("STATIC_MAX_LINE_LENGTH", "120"))
+
+PYTHON = ('.py',)
+JAVASCRIPT = ('.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs')
+
+
+register(LineRule(
+    id="trailing-whitespace",
+    issue_type="style",
+    pattern=re.compile(r'[ \t]+$'),
+    description="Trailing whitespace.",
+    suggestion="Remove the whitespace at the end of the line.",
+))
+
+register(LineRule(
+    id="line-too-long",
+    issue_type="style",
+    pattern=re.compile(r'^.{%d,}' % (MAX_LINE_LENGTH + 1)),
+    description=f"Line is longer than {MAX_LINE_LENGTH} characters.",
+    suggestion="Wrap the line or extract part of the expression into a variable.",
+))
+
+register(LineRule(
+    id="python-debug-statement",
+    issue_type="best_practice",
+    pattern=re.compile(r'^\s*(?:print\(|breakpoint\(\)|import\s+i?pdb\b|i?pdb\.set_trace\(\))'),
+    description="Debug statement left in the code.",
+    suggestion="Remove it or use the logging module instead.",
+    extensions=PYTHON,
+))
+
+register(LineRule(
+    id="python-bare-except",
+    issue_type="best_practice",
+    pattern=re.compile(r'^\s*except\s*:'),
+    description="Bare 'except:' also catches SystemExit and KeyboardInterrupt.",
+    suggestion="Catch a specific exception, or at least 'except Exception:'.",
+    extensions=PYTHON,
+))
+
+register(LineRule(
+    id="js-debug-statement",
+    issue_type="best_practice",
+    pattern=re.compile(r'^\s*(?:console\.(?:log|debug)\(|debugger\s*;?\s*$)'),
+    description="Debug statement left in the code.",
+    suggestion="Remove it before merging.",
+    extensions=JAVASCRIPT,
+))
+
+
+def _unused_imports(file_diff: FileDiff) -> List[Issue]:
+    """
+    Reports imports that are never used. This needs the whole post-image,
+    so it only runs on files the PR adds (every line is in the diff).
+    """
+    if not file_diff.is_new or os.path.basename(file_diff.path) == "__init__.py":
+        return []
+
+    source = "\n".join(
+        line[1:] for hunk in file_diff.hunks for line in hunk.lines if line[:1] == '+'
+    )
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+
+    imported = {}
+    used = set()
+    exported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imported.setdefault((alias.asname or alias.name).split('.')[0], node.lineno)
+        elif isinstance(node, ast.ImportFrom):
+            if node.module == "__future__":
+                continue
+            for alias in node.names:
+                if alias.name != '*':
+                    imported.setdefault(alias.asname or alias.name, node.lineno)
+        elif isinstance(node, ast.Name):
+            used.add(node.id)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            # Names in __all__ or string annotations count as used
+            exported.add(node.value)
+
+    base = file_diff.hunks[0].new_start if file_diff.hunks else 1
+    return [
+        Issue(
+            type="style",
+            line=base + lineno - 1,
+            description=f"'{name}' is imported but never used.",
+            suggestion=f"Remove the unused import of '{name}'.",
+        )
+        for name, lineno in sorted(imported.items(), key=lambda item: item[1])
+        if name not in used and name not in exported
+    ]
+
+
+register(FileRule(id="python-unused-import", check=_unused_imports, extensions=PYTHON))
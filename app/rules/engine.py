@@ -0,0 +1,170 @@
+# app/rules/engine.py
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.diff.parser import FileDiff
+from app.diff.chunker import DiffChunk
+from app.models import Issue
+
+# Rule ids listed here (comma separated) are switched off
+DISABLED_RULES = {r.strip() for r in os.getenv("STATIC_RULES_DISABLED", "").split(",") if r.strip()}
+
+
+def file_extension(path: str) -> str:
+    return os.path.splitext(path)[1].lower()
+
+
+def added_lines(file_diff: FileDiff) -> Iterable[Tuple[int, str]]:
+    """Yields (new line number, text without the '+') for every added line."""
+    for hunk in file_diff.hunks:
+        new_no = hunk.new_start
+        for line in hunk.lines:
+            tag = line[:1]
+            if tag == '+':
+                yield new_no, line[1:]
+                new_no += 1
+            elif tag == ' ' or tag == '':
+                new_no += 1
+
+
+@dataclass
+class LineRule:
+    """A rule applied to every added line of matching files."""
+    id: str
+    issue_type: str
+    pattern: "re.Pattern"
+    description: str
+    suggestion: str
+    extensions: Optional[Tuple[str, ...]] = None
+
+    def applies_to(self, extension: str) -> bool:
+        return self.extensions is None or extension in self.extensions
+
+    def check(self, text: str) -> bool:
+        return self.pattern.search(text) is not None
+
+
+@dataclass
+class FileRule:
+    """A rule that looks at a whole file diff at once (e.g. to parse it)."""
+    id: str
+    check: Callable[[FileDiff], List[Issue]]
+    extensions: Optional[Tuple[str, ...]] = None
+
+    def applies_to(self, extension: str) -> bool:
+        return self.extensions is None or extension in self.extensions
+
+
+_registry: List[object] = []
+
+
+def register(rule) -> None:
+    """Adds a LineRule or FileRule to the default rule set."""
+    _registry.append(rule)
+
+
+def default_rules() -> List[object]:
+    # Importing the module registers the built-in rules
+    from . import builtin  # noqa: F401
+    return [rule for rule in _registry if rule.id not in DISABLED_RULES]
+
+
+# Comment markers by file extension. Files of other types only count blank lines as trivial.
+_HASH_COMMENT = r'#'
+_SLASH_COMMENT = r'//|/\*|\*/'
+COMMENT_PREFIXES = {
+    **dict.fromkeys((".py", ".pyi", ".rb", ".sh", ".bash", ".yaml", ".yml", ".toml", ".r", ".pl"), _HASH_COMMENT),
+    **dict.fromkeys((".js", ".jsx", ".ts", ".tsx", ".java", ".kt", ".scala", ".go", ".rs", ".swift", ".cs",
+                     ".c", ".h", ".cc", ".cpp", ".hpp", ".css", ".scss"), _SLASH_COMMENT),
+    ".php": _SLASH_COMMENT + '|' + _HASH_COMMENT,
+    **dict.fromkeys((".sql", ".lua", ".hs"), r'--'),
+}
+IMPORT_PREFIXES = {
+    **dict.fromkeys((".py", ".pyi"), r'import\s|from\s+\S+\s+import\s'),
+    **dict.fromkeys((".js", ".jsx", ".ts", ".tsx", ".java", ".kt", ".scala", ".go", ".swift"), r'import\s'),
+}
+# Languages where only braces and keywords carry structure, so a line that
+# moved with nothing but its indentation changed means the same thing
+INDENT_INSENSITIVE = {".js", ".jsx", ".ts", ".tsx", ".java", ".kt", ".scala", ".go", ".rs", ".swift", ".cs",
+                      ".c", ".h", ".cc", ".cpp", ".hpp", ".php", ".css", ".scss", ".sql"}
+
+_trivial_res: Dict[str, "re.Pattern"] = {}
+
+
+def trivial_line_re(extension: str) -> "re.Pattern":
+    """Lines of this file type that can't hide a real bug: blank, comments, imports."""
+    pattern = _trivial_res.get(extension)
+    if pattern is None:
+        prefixes = [p for p in (COMMENT_PREFIXES.get(extension), IMPORT_PREFIXES.get(extension)) if p]
+        pattern = re.compile(r'^\s*(?:$' + ''.join('|' + p for p in prefixes) + ')')
+        _trivial_res[extension] = pattern
+    return pattern
+
+
+class RuleEngine:
+    """
+    Fast deterministic pre-pass over the added lines of a diff.
+
+    Its findings are reported as regular Issues, without a model call.
+    """
+
+    def __init__(self, rules: Optional[List[object]] = None):
+        rules = default_rules() if rules is None else rules
+        self.line_rules = [r for r in rules if isinstance(r, LineRule)]
+        self.file_rules = [r for r in rules if isinstance(r, FileRule)]
+        self._by_extension: Dict[str, Tuple[list, list]] = {}
+
+    def _rules_for(self, extension: str):
+        rules = self._by_extension.get(extension)
+        if rules is None:
+            rules = (
+                [r for r in self.line_rules if r.applies_to(extension)],
+                [r for r in self.file_rules if r.applies_to(extension)],
+            )
+            self._by_extension[extension] = rules
+        return rules
+
+    def check_file(self, file_diff: FileDiff) -> List[Issue]:
+        if file_diff.is_binary or file_diff.is_deleted:
+            return []
+        line_rules, file_rules = self._rules_for(file_extension(file_diff.path))
+
+        issues: List[Issue] = []
+        if line_rules:
+            for line_no, text in added_lines(file_diff):
+                for rule in line_rules:
+                    if rule.check(text):
+                        issues.append(Issue(type=rule.issue_type, line=line_no,
+                                            description=rule.description, suggestion=rule.suggestion))
+        for rule in file_rules:
+            issues.extend(rule.check(file_diff))
+        return issues
+
+
+def is_mechanical_only(chunk: DiffChunk) -> bool:
+    """
+    True if the chunk only adds or removes blank lines, comments or imports,
+    and otherwise puts back the lines it removes, in the same order. Only
+    languages where indentation carries no meaning may re-indent them.
+    The model has nothing left to look at in such a chunk.
+    """
+    extension = file_extension(chunk.file_path)
+    trivial = trivial_line_re(extension)
+    loose = extension in INDENT_INSENSITIVE
+    removed: List[str] = []
+    added: List[str] = []
+    any_added = False
+    for hunk in chunk.hunks:
+        for line in hunk.lines:
+            tag = line[:1]
+            if tag not in ('+', '-'):
+                continue
+            text = line[1:]
+            if tag == '+':
+                any_added = True
+            if trivial.match(text):
+                continue
+            (added if tag == '+' else removed).append(text.strip() if loose else text)
+    return any_added and added == removed
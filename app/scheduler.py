@@ -0,0 +1,92 @@
+# app/scheduler.py
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from celery.result import AsyncResult
+
+from .worker import ANALYZE_PR_TASK, celery_app
+from .store.inflight import InflightRegistry
+
+# PRs with at most this many changed lines (additions + deletions) are "small"
+SMALL_PR_MAX_LINES = int(os.getenv("SMALL_PR_MAX_LINES", "400"))
+SMALL_QUEUE = "reviews.small"
+LARGE_QUEUE = "reviews.large"
+# Each step of this many changed lines lowers the priority by one (0 = first)
+PRIORITY_STEP_LINES = int(os.getenv("PRIORITY_STEP_LINES", "1000"))
+
+# Queued reviews not started within this many seconds are dropped by the
+# workers unrun (0 = never); the API refuses reviews it expects to wait longer
+REVIEW_QUEUE_DEADLINE = int(os.getenv("REVIEW_QUEUE_DEADLINE", "3600"))
+
+# A previous owner in one of these states cannot deliver a result anymore
+DEAD_STATES = ("FAILURE", "REVOKED", "FAILED")
+# Once a task has left these states, revoking it would not stop anything
+QUEUED_STATES = ("PENDING",)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Submission:
+    task_id: str
+    queue: str
+    priority: int
+    deduplicated: bool = False
+
+
+def route_for(pr_info: Optional[dict]):
+    """Picks (queue, priority) from the PR's size; unknown sizes count as large."""
+    if not pr_info:
+        return LARGE_QUEUE, 9
+    changed = pr_info.get("additions", 0) + pr_info.get("deletions", 0)
+    queue = SMALL_QUEUE if changed <= SMALL_PR_MAX_LINES else LARGE_QUEUE
+    return queue, min(9, changed // PRIORITY_STEP_LINES)
+
+
+def submit_review(repo_path: str, repo_url: str, pr_number: int, github_token: Optional[str],
+                  pr_info: Optional[dict], registry: Optional[InflightRegistry] = None) -> Submission:
+    """
+    Queues a review unless an identical (repo, PR, head SHA) job is already
+    queued, running or done, in which case its task id is returned. A review
+    of an older head of the same PR that is still queued is revoked.
+    """
+    queue, priority = route_for(pr_info)
+    head_sha = (pr_info or {}).get("head", {}).get("sha")
+    registry = registry or InflightRegistry()
+    task_id = str(uuid.uuid4())
+
+    if head_sha:
+        owner = registry.claim(repo_path, pr_number, head_sha, task_id)
+        if owner is not None:
+            if AsyncResult(owner, app=celery_app).status not in DEAD_STATES:
+                return Submission(task_id=owner, queue=queue, priority=priority, deduplicated=True)
+            registry.replace(repo_path, pr_number, head_sha, task_id)
+
+    celery_app.send_task(
+        ANALYZE_PR_TASK,
+        args=(repo_url, pr_number, github_token),
+        task_id=task_id,
+        queue=queue,
+        priority=priority,
+        expires=REVIEW_QUEUE_DEADLINE or None,
+    )
+    if head_sha:
+        _revoke_stale(registry.supersede(repo_path, pr_number, head_sha, task_id), head_sha)
+    return Submission(task_id=task_id, queue=queue, priority=priority)
+
+
+def _revoke_stale(previous, head_sha: str) -> None:
+    """Drops the previous review of a PR if it targets another head and has not started yet."""
+    if previous is None:
+        return
+    stale_sha, stale_task_id = previous
+    if stale_sha == head_sha or AsyncResult(stale_task_id, app=celery_app).status not in QUEUED_STATES:
+        return
+    celery_app.control.revoke(stale_task_id)
+    # Recorded in the backend too, for consumers that get no revoke broadcasts (app/consumer.py)
+    celery_app.backend.mark_as_revoked(stale_task_id, reason="superseded")
+    logger.info("Revoked review of a superseded head",
+                extra={"task_id": stale_task_id, "head_sha": stale_sha, "new_head_sha": head_sha})
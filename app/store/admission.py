@@ -0,0 +1,65 @@
+# app/store/admission.py
+import time
+from typing import Optional, Tuple
+
+import redis
+
+from .redis_client import get_redis
+
+RATE_PREFIX = "admission:rate:"
+COMPLETED_PREFIX = "admission:completed:"
+# Completions are counted per minute and kept this long
+COMPLETED_TTL_SECONDS = 3600
+
+
+class AdmissionCounters:
+    """
+    Counters shared by every API process and worker: requests per client and
+    overall in fixed windows, and reviews finished per minute (throughput).
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None):
+        self.client = client
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def window_key(self, name: str, window: int) -> str:
+        """The key of counter `name` in the current window."""
+        return f"{RATE_PREFIX}{name}:{window}:{int(time.time() // window)}"
+
+    def hit(self, key: str, cost: int, window: int, limit: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Adds `cost` to the counter at `key` (see window_key); returns its
+        total with `cost` and the seconds until the next window starts. A
+        cost that takes the total past `limit` is taken back out again, so
+        refused requests do not use up the window.
+        """
+        pipe = self._redis().pipeline()
+        pipe.incrby(key, cost)
+        pipe.expire(key, window * 2)
+        count, _ = pipe.execute()
+        if limit is not None and count > limit:
+            self.refund(key, cost)
+        return count, int(window - time.time() % window) + 1
+
+    def refund(self, key: str, cost: int) -> None:
+        """Takes back the cost of a request that was refused after all."""
+        self._redis().decrby(key, cost)
+
+    def record_completion(self) -> None:
+        key = f"{COMPLETED_PREFIX}{int(time.time() // 60)}"
+        pipe = self._redis().pipeline()
+        pipe.incr(key)
+        pipe.expire(key, COMPLETED_TTL_SECONDS)
+        pipe.execute()
+
+    def throughput(self, minutes: int) -> float:
+        """Reviews finished per second over the last `minutes` minutes plus the current one."""
+        now = time.time()
+        current = int(now // 60)
+        keys = [f"{COMPLETED_PREFIX}{m}" for m in range(current - minutes, current + 1)]
+        completed = sum(int(v) for v in self._redis().mget(keys) if v)
+        return completed / (minutes * 60 + now % 60)
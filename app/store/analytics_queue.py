@@ -0,0 +1,74 @@
+# app/store/analytics_queue.py
+import json
+import logging
+import os
+import time
+from typing import List, Optional
+
+import redis
+
+from app.models import AnalysisResults
+from .redis_client import get_redis
+
+ANALYTICS_QUEUE_KEY = "analytics:pending"
+# Reviews waiting to be loaded into the analytics database; the oldest are
+# dropped if nothing loads them for a long time
+ANALYTICS_QUEUE_MAX_ENTRIES = int(os.getenv("ANALYTICS_QUEUE_MAX_ENTRIES", "100000"))
+
+logger = logging.getLogger(__name__)
+
+
+def review_record(repo_path: str, pr_number: int, head_sha: Optional[str], results: AnalysisResults) -> dict:
+    """The per-issue rows of one finished review, compact enough to queue."""
+    return {
+        "repo": repo_path.lower(),
+        "pr": pr_number,
+        "sha": head_sha,
+        "at": int(time.time()),
+        "files": results.summary.total_files,
+        "critical": results.summary.critical_issues,
+        # [file, type, line, on_added_line]
+        "issues": [
+            [analysis.name, issue.type.lower(), issue.line, issue.on_added_line]
+            for analysis in results.files for issue in analysis.issues
+        ],
+    }
+
+
+class AnalyticsQueue:
+    """
+    Finished reviews on their way from the workers to the analytics
+    database (see app/analytics.py), which loads them in batches.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None, max_entries: int = ANALYTICS_QUEUE_MAX_ENTRIES):
+        self.client = client
+        self.max_entries = max_entries
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def push(self, records: List[dict]) -> None:
+        if not records:
+            return
+        try:
+            pipe = self._redis().pipeline()
+            pipe.rpush(ANALYTICS_QUEUE_KEY, *(json.dumps(r, separators=(",", ":")) for r in records))
+            pipe.ltrim(ANALYTICS_QUEUE_KEY, -self.max_entries, -1)
+            pipe.execute()
+        except redis.RedisError as e:
+            # Analytics are best effort; the review itself is stored already
+            logger.warning("Could not queue review for analytics", extra={"error": str(e)})
+
+    def take(self, max_items: int) -> List[dict]:
+        """Removes and returns up to `max_items` of the oldest queued reviews."""
+        pipe = self._redis().pipeline()
+        pipe.lrange(ANALYTICS_QUEUE_KEY, 0, max_items - 1)
+        pipe.ltrim(ANALYTICS_QUEUE_KEY, max_items, -1)
+        raw, _ = pipe.execute()
+        return [json.loads(r) for r in raw]
+
+    def size(self) -> int:
+        return self._redis().llen(ANALYTICS_QUEUE_KEY)
@@ -0,0 +1,31 @@
+# app/store/batches.py
+import json
+import os
+from typing import List, Optional
+
+import redis
+
+from .redis_client import get_redis
+
+BATCH_TTL_SECONDS = int(os.getenv("BATCH_TTL", str(24 * 3600)))
+BATCH_PREFIX = "batch:"
+
+
+class BatchStore:
+    """Keeps the list of jobs submitted together through /analyze-batch."""
+
+    def __init__(self, client: Optional[redis.Redis] = None, ttl: int = BATCH_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def save(self, batch_id: str, items: List[dict]) -> None:
+        self._redis().set(f"{BATCH_PREFIX}{batch_id}", json.dumps(items), ex=self.ttl)
+
+    def load(self, batch_id: str) -> Optional[List[dict]]:
+        raw = self._redis().get(f"{BATCH_PREFIX}{batch_id}")
+        return json.loads(raw) if raw is not None else None
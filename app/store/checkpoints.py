@@ -0,0 +1,144 @@
+# app/store/checkpoints.py
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+import redis
+
+from app.diff.chunker import DiffChunk
+from app.models import FileAnalysis, LLMCallStats
+from .redis_client import get_redis
+from .review_cache import normalize_chunk
+
+# Long enough to outlive every retry of a task
+CHECKPOINT_TTL_SECONDS = int(os.getenv("REVIEW_CHECKPOINT_TTL", str(24 * 3600)))
+CHECKPOINT_PREFIX = "review-checkpoint:"
+
+logger = logging.getLogger(__name__)
+
+
+def checkpoint_field(chunk: DiffChunk) -> str:
+    """The chunk key plus a digest of its content, so a changed diff never reuses a stale entry."""
+    digest = hashlib.sha1(normalize_chunk(chunk).encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    return f"{chunk.key}@{digest}"
+
+
+class ReviewCheckpoints:
+    """
+    The chunks of one task that a model already reviewed, with their call
+    stats, so a retried or re-delivered task only reviews the rest. Also
+    holds the task's chunk progress for /status.
+    """
+
+    def __init__(self, task_id: str, client: Optional[redis.Redis] = None, ttl: int = CHECKPOINT_TTL_SECONDS):
+        self.task_id = task_id
+        self.client = client
+        self.ttl = ttl
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    @property
+    def _chunks_key(self) -> str:
+        return f"{CHECKPOINT_PREFIX}{self.task_id}"
+
+    @property
+    def _progress_key(self) -> str:
+        return f"{CHECKPOINT_PREFIX}{self.task_id}:progress"
+
+    @property
+    def _attempts_key(self) -> str:
+        return f"{CHECKPOINT_PREFIX}{self.task_id}:attempts"
+
+    def begin_attempt(self) -> int:
+        """
+        Counts an attempt at the task; end_attempt() resets the count when it
+        ends normally. The count therefore says how many attempts in a row died
+        with their worker. 0 if Redis is down.
+        """
+        try:
+            pipe = self._redis().pipeline()
+            pipe.incr(self._attempts_key)
+            pipe.expire(self._attempts_key, self.ttl)
+            return pipe.execute()[0]
+        except redis.RedisError as e:
+            logger.warning("Could not count review attempts", extra={"error": str(e)})
+            return 0
+
+    def end_attempt(self) -> None:
+        try:
+            self._redis().delete(self._attempts_key)
+        except redis.RedisError as e:
+            logger.warning("Could not count review attempts", extra={"error": str(e)})
+
+    def load(self) -> Dict[str, Tuple[FileAnalysis, LLMCallStats]]:
+        """Checkpointed chunks by checkpoint_field; empty if there are none (or Redis is down)."""
+        try:
+            raw = self._redis().hgetall(self._chunks_key)
+        except redis.RedisError as e:
+            logger.warning("Checkpoints unavailable, reviewing every chunk", extra={"error": str(e)})
+            return {}
+        restored = {}
+        for field, value in raw.items():
+            entry = json.loads(value)
+            restored[field.decode()] = (FileAnalysis.parse_obj(entry["analysis"]), LLMCallStats.parse_obj(entry["call"]))
+        return restored
+
+    def save(self, chunk: DiffChunk, analysis: FileAnalysis, call: LLMCallStats) -> None:
+        value = json.dumps({"analysis": analysis.dict(), "call": call.dict()})
+        try:
+            pipe = self._redis().pipeline()
+            pipe.hset(self._chunks_key, checkpoint_field(chunk), value)
+            pipe.expire(self._chunks_key, self.ttl)
+            pipe.hincrby(self._progress_key, "done", 1)
+            pipe.expire(self._progress_key, self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            # Only costs a repeated model call if the task is retried
+            logger.warning("Could not checkpoint chunk", extra={"chunk": chunk.key, "error": str(e)})
+
+    def start(self) -> None:
+        """Resets the progress of an attempt; chunks are added with expect() as the diff is read."""
+        try:
+            pipe = self._redis().pipeline()
+            pipe.hset(self._progress_key, mapping={"total": 0, "done": 0})
+            pipe.expire(self._progress_key, self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Could not record review progress", extra={"error": str(e)})
+
+    def expect(self, total: int, done: int) -> None:
+        """Adds a file's chunks to the progress, and those of them that need no (further) model call."""
+        try:
+            pipe = self._redis().pipeline()
+            pipe.hincrby(self._progress_key, "total", total)
+            pipe.hincrby(self._progress_key, "done", done)
+            pipe.expire(self._progress_key, self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Could not record review progress", extra={"error": str(e)})
+
+    def progress(self) -> Optional[Tuple[int, int]]:
+        """
+        (chunks done, chunks found so far), or None before the task has read
+        its diff or when Redis cannot be asked.
+        """
+        try:
+            raw = self._redis().hmget(self._progress_key, "done", "total")
+        except redis.RedisError as e:
+            logger.warning("Review progress unavailable", extra={"error": str(e)})
+            return None
+        if raw[1] is None:
+            return None
+        return int(raw[0] or 0), int(raw[1])
+
+    def clear(self) -> None:
+        """Drops the reviewed chunks once the task's results are stored; progress stays until it expires."""
+        try:
+            self._redis().delete(self._chunks_key)
+        except redis.RedisError as e:
+            logger.warning("Could not clear checkpoints", extra={"error": str(e)})
@@ -0,0 +1,64 @@
+# app/store/events.py
+import json
+import logging
+import os
+from typing import Optional
+
+import redis
+
+from .redis_client import get_redis
+
+# How long the replay log of a task's events is kept after its last event
+EVENTS_TTL_SECONDS = int(os.getenv("TASK_EVENTS_TTL", "3600"))
+EVENTS_PREFIX = "task-events:"
+
+# Event types that end a stream
+TERMINAL_EVENTS = ("done", "error")
+
+logger = logging.getLogger(__name__)
+
+
+def events_channel(task_id: str) -> str:
+    return f"{EVENTS_PREFIX}{task_id}"
+
+
+def events_log_key(task_id: str) -> str:
+    return f"{EVENTS_PREFIX}{task_id}:log"
+
+
+def events_seq_key(task_id: str) -> str:
+    return f"{EVENTS_PREFIX}{task_id}:seq"
+
+
+class TaskEvents:
+    """
+    Publishes progress events of one task over Redis pub/sub.
+
+    Every event is also appended to a short-lived log, so a client that
+    connects late (or reconnects) can replay what it missed. Events carry a
+    sequence number that doubles as the SSE event id.
+    """
+
+    def __init__(self, task_id: str, client: Optional[redis.Redis] = None):
+        self.task_id = task_id
+        self.client = client
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def publish(self, event: str, data: dict) -> None:
+        try:
+            seq = self._redis().incr(events_seq_key(self.task_id))
+            payload = json.dumps({"seq": seq, "event": event, "data": data})
+            pipe = self._redis().pipeline()
+            pipe.rpush(events_log_key(self.task_id), payload)
+            pipe.expire(events_log_key(self.task_id), EVENTS_TTL_SECONDS)
+            pipe.expire(events_seq_key(self.task_id), EVENTS_TTL_SECONDS)
+            pipe.publish(events_channel(self.task_id), payload)
+            pipe.execute()
+        except redis.RedisError as e:
+            # Streaming is best effort; the result backend still has the final answer
+            logger.warning("Could not publish task event",
+                           extra={"event": event, "task_id": self.task_id, "error": str(e)})
@@ -0,0 +1,56 @@
+# app/store/inflight.py
+import json
+import os
+from typing import Optional, Tuple
+
+import redis
+
+from .redis_client import get_redis
+
+INFLIGHT_TTL_SECONDS = int(os.getenv("INFLIGHT_TTL", str(6 * 3600)))
+INFLIGHT_PREFIX = "inflight:"
+# Newest review task of each PR, whatever its head
+LATEST_PREFIX = "inflight-latest:"
+
+
+class InflightRegistry:
+    """
+    Maps a (repo, pr_number, head_sha) review job to the task id that owns it,
+    so identical submissions share one task instead of reviewing twice.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None, ttl: int = INFLIGHT_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def _key(self, repo_path: str, pr_number: int, head_sha: str) -> str:
+        return f"{INFLIGHT_PREFIX}{repo_path.lower()}:{pr_number}:{head_sha}"
+
+    def claim(self, repo_path: str, pr_number: int, head_sha: str, task_id: str) -> Optional[str]:
+        """
+        Registers task_id for the job. Returns the id of the task that already
+        owns it, or None if the claim succeeded.
+        """
+        key = self._key(repo_path, pr_number, head_sha)
+        if self._redis().set(key, task_id, nx=True, ex=self.ttl):
+            return None
+        owner = self._redis().get(key)
+        return owner.decode() if owner else None
+
+    def replace(self, repo_path: str, pr_number: int, head_sha: str, task_id: str) -> None:
+        """Hands the job to a new task (used when the previous owner failed)."""
+        self._redis().set(self._key(repo_path, pr_number, head_sha), task_id, ex=self.ttl)
+
+    def supersede(self, repo_path: str, pr_number: int, head_sha: str, task_id: str) -> Optional[Tuple[str, str]]:
+        """
+        Records task_id as the newest review of the PR. Returns the
+        (head_sha, task_id) of the review it replaces, if any.
+        """
+        key = f"{LATEST_PREFIX}{repo_path.lower()}:{pr_number}"
+        previous = self._redis().set(key, json.dumps([head_sha, task_id]), ex=self.ttl, get=True)
+        return tuple(json.loads(previous)) if previous else None
@@ -0,0 +1,244 @@
+# app/store/near_duplicates.py
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import redis
+
+from app.diff.chunker import DiffChunk
+from app.models import Issue
+from .redis_client import get_redis
+from .review_cache import CACHE_TTL_SECONDS, chunk_base_line
+
+# Reuse the review of a similar, already reviewed chunk (backports, cherry-picks, rebases)
+NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true"
+# Estimated Jaccard similarity of the changed lines above which a review is reused
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+# Chunks with fewer shingles are too small to judge and always go to the model
+NEAR_DUPLICATE_MIN_SHINGLES = int(os.getenv("NEAR_DUPLICATE_MIN_SHINGLES", "24"))
+
+# 64 MinHash values in 8 bands of 8: chunks at 0.9 similarity share a band
+# 99% of the time, chunks at 0.5 about 3% of the time
+NUM_HASHES = 64
+BANDS = 8
+ROWS = NUM_HASHES // BANDS
+SHINGLE_TOKENS = 3
+# Newest entries kept per band bucket; a bucket only fills up with near-identical chunks
+BUCKET_MAX_ENTRIES = 16
+MAX_CANDIDATES = 64
+
+NEAR_DUPLICATE_PREFIX = "near-dup:"
+_EMPTY = (1 << 64) - 1
+_VALUE_BITS = 58
+_TOKEN_RE = re.compile(r'[A-Za-z_]\w*|\d[\w.]*|[^\s\w]')
+
+logger = logging.getLogger(__name__)
+
+
+def _tokens(chunk: DiffChunk) -> Iterator[str]:
+    """Tokens of the changed lines, each line led by its '+' or '-' and numbers folded together."""
+    for hunk in chunk.hunks:
+        for line in hunk.lines:
+            tag = line[:1]
+            if tag not in ('+', '-'):
+                continue
+            yield tag
+            for token in _TOKEN_RE.findall(line, 1):
+                yield '0' if token[0].isdigit() else token
+
+
+def shingles(chunk: DiffChunk) -> List[int]:
+    """64-bit hashes of the runs of SHINGLE_TOKENS consecutive tokens of the changed lines."""
+    tokens = list(_tokens(chunk))
+    return [
+        int.from_bytes(hashlib.blake2b("\0".join(tokens[i:i + SHINGLE_TOKENS]).encode("utf-8", "surrogateescape"),
+                                       digest_size=8).digest(), "little")
+        for i in range(len(tokens) - SHINGLE_TOKENS + 1)
+    ]
+
+
+def minhash(hashes: List[int]) -> Optional[array]:
+    """
+    MinHash signature by one-permutation hashing: each shingle hash is put
+    in one of NUM_HASHES bins by its low bits and each bin keeps its
+    minimum, so a chunk costs one hash per shingle instead of NUM_HASHES.
+    Empty bins borrow the next filled bin, offset by the distance, so that
+    equal positions still mean equal minima (densification).
+    """
+    if not hashes:
+        return None
+    bins = [_EMPTY] * NUM_HASHES
+    for h in hashes:
+        slot = h & (NUM_HASHES - 1)
+        value = h >> (64 - _VALUE_BITS)
+        if value < bins[slot]:
+            bins[slot] = value
+    signature = array('Q', bins)
+    for i in range(NUM_HASHES):
+        if bins[i] != _EMPTY:
+            continue
+        for distance in range(1, NUM_HASHES):
+            value = bins[(i + distance) % NUM_HASHES]
+            if value != _EMPTY:
+                signature[i] = value + (distance << _VALUE_BITS)
+                break
+    return signature
+
+
+def similarity(a: array, b: array) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
+
+
+def review_source(repo_url: str, pr_number: int) -> str:
+    """Names the PR an entry came from, so a PR never reuses reviews of its own chunks."""
+    return hashlib.blake2b(f"{repo_url.lower().rstrip('/')}#{pr_number}".encode(), digest_size=6).hexdigest()
+
+
+def _new_lines(chunk: DiffChunk) -> Iterator[Tuple[int, str]]:
+    """(new line number, whitespace-normalized text) of the lines the chunk shows in the new file."""
+    for hunk in chunk.hunks:
+        new_no = hunk.new_start
+        for line in hunk.lines:
+            tag = line[:1]
+            if tag in ('+', ' ', ''):
+                yield new_no, " ".join(line[1:].split())
+                new_no += 1
+
+
+class NearDuplicateIndex:
+    """
+    Locality-sensitive index of reviewed chunks in Redis, for chunks that are
+    not identical (the review cache handles those) but nearly so: the same
+    change backported, cherry-picked or rebased onto slightly different code.
+
+    Each chunk's MinHash signature is cut into BANDS bands; a band's values
+    name a Redis list of the entries that share them. A lookup reads the
+    chunk's BANDS lists and the entries found there, in two round trips
+    whatever the size of the index, and keeps the most similar entry at or
+    above the threshold. Its issues are moved onto the lines with the same
+    text in the new chunk; issues whose line has no counterpart are dropped.
+    Entries of the PR being reviewed are never reused, so the result of a
+    review does not depend on the order its chunks finished in. Entries
+    expire with the review cache.
+    """
+
+    def __init__(self, prompt_version: str, client: Optional[redis.Redis] = None,
+                 threshold: float = NEAR_DUPLICATE_THRESHOLD, ttl: int = CACHE_TTL_SECONDS):
+        self.prompt_version = prompt_version
+        self.client = client
+        self.threshold = threshold
+        self.ttl = ttl
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def _scope(self, model_name: str) -> str:
+        # Reviews are only reused for the same model and prompt, like the review cache
+        return hashlib.blake2b(f"{model_name}\0{self.prompt_version}".encode(), digest_size=6).hexdigest()
+
+    def _band_keys(self, scope: str, signature: array) -> List[str]:
+        keys = []
+        for band in range(BANDS):
+            values = signature[band * ROWS:(band + 1) * ROWS].tobytes()
+            keys.append(f"{NEAR_DUPLICATE_PREFIX}{scope}:b{band}:{hashlib.blake2b(values, digest_size=8).hexdigest()}")
+        return keys
+
+    def signature(self, chunk: DiffChunk) -> Optional[array]:
+        hashes = shingles(chunk)
+        if len(hashes) < NEAR_DUPLICATE_MIN_SHINGLES:
+            return None
+        return minhash(hashes)
+
+    def lookup(self, chunk: DiffChunk, model_name: str,
+               source: Optional[str] = None) -> Optional[Tuple[List[Issue], float]]:
+        """
+        The issues of the most similar reviewed chunk, on this chunk's lines,
+        and its similarity; None if no chunk is similar enough. Entries added
+        with the same `source` (see review_source) are left out.
+        """
+        signature = self.signature(chunk)
+        if signature is None:
+            return None
+        scope = self._scope(model_name)
+        try:
+            pipe = self._redis().pipeline(transaction=False)
+            for key in self._band_keys(scope, signature):
+                pipe.lrange(key, 0, -1)
+            ids = list(dict.fromkeys(i for bucket in pipe.execute() for i in bucket))[:MAX_CANDIDATES]
+            if not ids:
+                return None
+            raws = self._redis().mget([f"{NEAR_DUPLICATE_PREFIX}{scope}:e:{i.decode()}" for i in ids])
+        except redis.RedisError as e:
+            logger.warning("Near-duplicate index unavailable, treating as miss", extra={"error": str(e)})
+            return None
+
+        best, best_score = None, self.threshold
+        for raw in raws:
+            if raw is None:
+                continue
+            entry = json.loads(raw)
+            if source is not None and entry.get("src") == source:
+                continue
+            score = similarity(signature, array('Q', base64.b64decode(entry["sig"])))
+            if score >= best_score:
+                best, best_score = entry, score
+        if best is None:
+            return None
+        return self._remap(chunk, best["issues"]), best_score
+
+    def _remap(self, chunk: DiffChunk, items: List[dict]) -> List[Issue]:
+        """Puts each issue on the line of this chunk with its line's text, nearest to where it was."""
+        lines: Dict[str, List[int]] = {}
+        for number, text in _new_lines(chunk):
+            lines.setdefault(text, []).append(number)
+        base = chunk_base_line(chunk)
+        issues = []
+        for item in items:
+            item = dict(item)
+            anchor, offset = item.pop("anchor"), item.pop("offset")
+            candidates = lines.get(anchor)
+            if not candidates:
+                continue
+            item["line"] = min(candidates, key=lambda n: abs(n - base - offset))
+            issues.append(Issue(**item))
+        return issues
+
+    def add(self, chunk: DiffChunk, model_name: str, issues: List[Issue], source: Optional[str] = None) -> None:
+        """Indexes a chunk reviewed by the model, with its issues anchored to the text of their lines."""
+        signature = self.signature(chunk)
+        if signature is None:
+            return
+        text_at = dict(_new_lines(chunk))
+        base = chunk_base_line(chunk)
+        payload = []
+        for issue in issues:
+            item = issue.dict(exclude={"line", "on_added_line"})
+            item["anchor"] = text_at.get(issue.line)
+            item["offset"] = issue.line - base
+            if item["anchor"] is not None:
+                payload.append(item)
+
+        scope = self._scope(model_name)
+        entry_id = hashlib.blake2b(signature.tobytes(), digest_size=8).hexdigest()
+        try:
+            pipe = self._redis().pipeline(transaction=False)
+            pipe.set(f"{NEAR_DUPLICATE_PREFIX}{scope}:e:{entry_id}",
+                     json.dumps({"sig": base64.b64encode(signature.tobytes()).decode(), "src": source,
+                                 "issues": payload}),
+                     ex=self.ttl)
+            for key in self._band_keys(scope, signature):
+                pipe.lrem(key, 0, entry_id)
+                pipe.lpush(key, entry_id)
+                pipe.ltrim(key, 0, BUCKET_MAX_ENTRIES - 1)
+                pipe.expire(key, self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Could not index reviewed chunk", extra={"error": str(e)})
@@ -0,0 +1,71 @@
+# app/store/pending_pushes.py
+import json
+import os
+import time
+from typing import Optional, Tuple
+
+import redis
+
+from .redis_client import get_redis
+
+PENDING_TTL_SECONDS = int(os.getenv("PENDING_PUSH_TTL", str(3600)))
+PENDING_PREFIX = "pending-push:"
+
+
+class PendingPushes:
+    """
+    The latest not-yet-reviewed push of each PR, as announced by webhooks.
+
+    Every push bumps a per-PR generation. A debounced review only runs if
+    its generation is still the newest when it fires, so a burst of pushes
+    ends in one review of the last head.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None, ttl: int = PENDING_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def _key(self, repo_path: str, pr_number: int) -> str:
+        return f"{PENDING_PREFIX}{repo_path.lower()}:{pr_number}"
+
+    def record(self, repo_path: str, pr_number: int, push: dict) -> Tuple[int, float]:
+        """
+        Stores a push as the newest one of its PR. Returns its generation and
+        when the first push still waiting for review arrived.
+        """
+        key = self._key(repo_path, pr_number)
+        now = time.time()
+        pipe = self._redis().pipeline(transaction=True)
+        pipe.hincrby(key, "generation", 1)
+        pipe.hsetnx(key, "first_at", now)
+        pipe.hset(key, "push", json.dumps(push))
+        pipe.hget(key, "first_at")
+        pipe.expire(key, self.ttl)
+        generation, _, _, first_at, _ = pipe.execute()
+        return int(generation), float(first_at)
+
+    def take(self, repo_path: str, pr_number: int, generation: int) -> Optional[dict]:
+        """
+        Returns the pending push and clears it, if `generation` is still the
+        newest. Returns None if a later push superseded it (or it was taken).
+        """
+        key = self._key(repo_path, pr_number)
+        with self._redis().pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(key)
+                current, push = pipe.hmget(key, "generation", "push")
+                if current is None or int(current) != generation or push is None:
+                    return None
+                pipe.multi()
+                # The generation stays, so debounced tasks of older pushes still see they are stale
+                pipe.hdel(key, "push", "first_at")
+                pipe.execute()
+            except redis.WatchError:
+                # A newer push arrived meanwhile; its own debounced task will run
+                return None
+        return json.loads(push)
@@ -0,0 +1,47 @@
+# app/store/publish_locks.py
+import os
+from typing import Optional
+
+import redis
+
+from .redis_client import get_redis
+
+PUBLISH_LOCK_PREFIX = "publish-lock:"
+# Longest a publish may hold its PR; a crashed one frees it after this long
+PUBLISH_LOCK_TTL_SECONDS = int(os.getenv("PUBLISH_LOCK_TTL", "300"))
+
+
+class PublishLocks:
+    """
+    One publish at a time per PR: two runs listing the same existing
+    comments would otherwise both post the findings missing from them.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None, ttl: int = PUBLISH_LOCK_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def _key(self, repo_path: str, pr_number: int) -> str:
+        return f"{PUBLISH_LOCK_PREFIX}{repo_path.lower()}:{pr_number}"
+
+    def acquire(self, repo_path: str, pr_number: int, owner: str) -> bool:
+        return bool(self._redis().set(self._key(repo_path, pr_number), owner, nx=True, ex=self.ttl))
+
+    def release(self, repo_path: str, pr_number: int, owner: str) -> None:
+        """Frees the PR, unless the lock expired and another publish holds it now."""
+        key = self._key(repo_path, pr_number)
+        with self._redis().pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != owner.encode():
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                pipe.execute()
+            except redis.WatchError:
+                pass
@@ -0,0 +1,28 @@
+# app/store/redis_client.py
+import os
+import redis
+
+# Same Redis instance that Celery uses as broker and result backend
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+_client = None
+
+
+def get_redis() -> redis.Redis:
+    """Returns a process-wide Redis client (its connection pool is thread-safe)."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(REDIS_URL)
+    return _client
+
+
+_async_client = None
+
+
+def get_async_redis():
+    """Returns a process-wide asyncio Redis client, for use inside the API's event loop."""
+    global _async_client
+    if _async_client is None:
+        import redis.asyncio as aioredis
+        _async_client = aioredis.Redis.from_url(REDIS_URL)
+    return _async_client
@@ -0,0 +1,140 @@
+# app/store/result_store.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import msgpack
+import redis
+import zstandard
+
+from app.models import AnalysisResults
+from .redis_client import get_redis
+
+# Results (and the Celery task state pointing at them) expire after this long
+RESULT_TTL_SECONDS = int(os.getenv("REVIEW_RESULT_TTL", str(7 * 24 * 3600)))
+RESULT_PREFIX = "review-result:"
+RESULT_ZSTD_LEVEL = int(os.getenv("REVIEW_RESULT_ZSTD_LEVEL", "6"))
+# Completed results the API keeps in memory, already serialized
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+
+# Bump when the compact layout below changes; older blobs are then rejected
+FORMAT_VERSION = 1
+
+
+def encode_results(results: AnalysisResults, level: int = RESULT_ZSTD_LEVEL) -> bytes:
+    """
+    Packs results as zstd-compressed msgpack.
+
+    Issues become [type, line, description, suggestion, on_added_line]
+    rows whose strings are indexes into one table, so file names, issue
+    types and the descriptions the static rules repeat on every line are
+    stored once.
+    """
+    strings: List[str] = []
+    index: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        position = index.get(value)
+        if position is None:
+            position = index[value] = len(strings)
+            strings.append(value)
+        return position
+
+    files = [
+        [intern(f.name), [
+            [intern(i.type), i.line, intern(i.description), intern(i.suggestion), i.on_added_line]
+            for i in f.issues
+        ]]
+        for f in results.files
+    ]
+    payload = {
+        "v": FORMAT_VERSION,
+        "s": strings,
+        "f": files,
+        "m": results.summary.dict(),
+        "k": [f.dict() for f in results.skipped_files],
+        "t": results.stats.dict() if results.stats else None,
+    }
+    return zstandard.ZstdCompressor(level=level).compress(msgpack.packb(payload, use_bin_type=True))
+
+
+def decode_results(blob: bytes) -> dict:
+    """Inverse of encode_results; returns the plain dict form of AnalysisResults."""
+    payload = msgpack.unpackb(zstandard.ZstdDecompressor().decompress(blob), raw=False)
+    if payload.get("v") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported result format version {payload.get('v')!r}")
+    strings = payload["s"]
+    return {
+        "files": [
+            {
+                "name": strings[name],
+                "issues": [
+                    # Rows written before issues were placed on the diff have no fifth field
+                    {"type": strings[t], "line": line, "description": strings[d], "suggestion": strings[s],
+                     "on_added_line": rest[0] if rest else None}
+                    for t, line, d, s, *rest in issues
+                ],
+            }
+            for name, issues in payload["f"]
+        ],
+        "summary": payload["m"],
+        "skipped_files": payload.get("k", []),
+        "stats": payload["t"],
+    }
+
+
+class ResultStore:
+    """
+    Keeps the full results of finished tasks, compactly encoded and with an
+    expiry. The Celery backend only holds a small pointer to them.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None, ttl: int = RESULT_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def save(self, task_id: str, results: AnalysisResults) -> int:
+        """Stores the results of a task; returns the encoded size in bytes."""
+        blob = encode_results(results)
+        self._redis().set(f"{RESULT_PREFIX}{task_id}", blob, ex=self.ttl)
+        return len(blob)
+
+    def load(self, task_id: str) -> Optional[AnalysisResults]:
+        raw = self._redis().get(f"{RESULT_PREFIX}{task_id}")
+        if raw is None:
+            return None
+        return AnalysisResults.parse_obj(decode_results(raw))
+
+
+class ResultCache:
+    """
+    In-process LRU of serialized results of completed tasks. A finished
+    task's results never change, so entries need no invalidation.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, task_id: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(task_id)
+            if body is not None:
+                self._entries.move_to_end(task_id)
+            return body
+
+    def put(self, task_id: str, body: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[task_id] = body
+            self._entries.move_to_end(task_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
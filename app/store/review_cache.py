@@ -0,0 +1,111 @@
+# app/store/review_cache.py
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import List, Optional
+
+import redis
+
+from app.diff.chunker import DiffChunk
+from app.models import Issue
+from .redis_client import get_redis
+
+CACHE_TTL_SECONDS = int(os.getenv("REVIEW_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "100000"))
+CACHE_PREFIX = "review-cache:"
+# Sorted set of cache keys scored by last use, used to evict the oldest entries
+CACHE_INDEX_KEY = "review-cache:index"
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_chunk(chunk: DiffChunk) -> str:
+    """
+    Builds the text a cache key is derived from.
+
+    The '@@' line numbers and the 'index <sha>..<sha>' header change whenever
+    anything else in the file moves, so they are replaced with offsets relative
+    to the first hunk. The same hunk at a different position hits the cache.
+    """
+    base = chunk.hunks[0].new_start if chunk.hunks else 0
+    parts = [chunk.file_path]
+    for hunk in chunk.hunks:
+        parts.append(f"@@ +{hunk.new_start - base} @@")
+        parts.extend(line.rstrip() for line in hunk.lines)
+    return "\n".join(parts)
+
+
+def chunk_base_line(chunk: DiffChunk) -> int:
+    return chunk.hunks[0].new_start if chunk.hunks else 0
+
+
+class ReviewCache:
+    """Content-addressed cache of per-chunk review issues stored in Redis."""
+
+    def __init__(self, prompt_version: str, client: Optional[redis.Redis] = None,
+                 ttl: int = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.prompt_version = prompt_version
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def key_for(self, chunk: DiffChunk, model_name: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{model_name}\0{self.prompt_version}\0".encode())
+        digest.update(normalize_chunk(chunk).encode("utf-8", "surrogateescape"))
+        return CACHE_PREFIX + digest.hexdigest()
+
+    def get(self, chunk: DiffChunk, model_name: str) -> Optional[List[Issue]]:
+        """Returns the cached issues with line numbers rebased onto this chunk, or None."""
+        key = self.key_for(chunk, model_name)
+        try:
+            raw = self._redis().get(key)
+            if raw is not None:
+                self._redis().zadd(CACHE_INDEX_KEY, {key: time.time()})
+        except redis.RedisError as e:
+            logger.warning("Review cache unavailable, treating as miss", extra={"error": str(e)})
+            raw = None
+
+        if raw is None:
+            return None
+
+        base = chunk_base_line(chunk)
+        issues = []
+        for item in json.loads(raw):
+            item["line"] = item.pop("offset") + base
+            issues.append(Issue(**item))
+        return issues
+
+    def set(self, chunk: DiffChunk, model_name: str, issues: List[Issue]) -> None:
+        """Stores the issues of a reviewed chunk, relative to its first hunk."""
+        key = self.key_for(chunk, model_name)
+        base = chunk_base_line(chunk)
+        payload = []
+        for issue in issues:
+            item = issue.dict()
+            item["offset"] = item.pop("line") - base
+            payload.append(item)
+
+        try:
+            pipe = self._redis().pipeline()
+            pipe.set(key, json.dumps(payload), ex=self.ttl)
+            pipe.zadd(CACHE_INDEX_KEY, {key: time.time()})
+            pipe.zcard(CACHE_INDEX_KEY)
+            size = pipe.execute()[-1]
+            if size > self.max_entries:
+                self._evict(size - self.max_entries)
+        except redis.RedisError as e:
+            logger.warning("Could not write review cache entry", extra={"error": str(e)})
+
+    def _evict(self, count: int) -> None:
+        """Drops the least recently used entries to keep the cache bounded."""
+        oldest = self._redis().zpopmin(CACHE_INDEX_KEY, count)
+        if oldest:
+            self._redis().delete(*[key for key, _ in oldest])
@@ -0,0 +1,57 @@
+# app/store/review_history.py
+import json
+import logging
+import os
+from typing import Optional, Tuple
+
+import redis
+
+from app.models import AnalysisResults
+from .redis_client import get_redis
+from .result_store import decode_results, encode_results
+
+HISTORY_TTL_SECONDS = int(os.getenv("REVIEW_HISTORY_TTL", str(30 * 24 * 3600)))
+HISTORY_PREFIX = "review-history:"
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewHistory:
+    """Remembers the last reviewed head SHA (and its results) for every PR."""
+
+    def __init__(self, client: Optional[redis.Redis] = None, ttl: int = HISTORY_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def _key(self, repo_path: str, pr_number: int) -> str:
+        return f"{HISTORY_PREFIX}{repo_path.lower()}:{pr_number}"
+
+    def load(self, repo_path: str, pr_number: int) -> Optional[Tuple[str, AnalysisResults]]:
+        """Returns (head_sha, results) of the last completed review, if any."""
+        try:
+            raw = self._redis().get(self._key(repo_path, pr_number))
+        except redis.RedisError as e:
+            logger.warning("Review history unavailable", extra={"error": str(e)})
+            return None
+        if raw is None:
+            return None
+
+        if raw.startswith(b"{"):
+            # Written before results were stored compactly
+            data = json.loads(raw)
+            return data["head_sha"], AnalysisResults.parse_obj(data["results"])
+        head_sha, _, blob = raw.partition(b"\0")
+        return head_sha.decode(), AnalysisResults.parse_obj(decode_results(blob))
+
+    def save(self, repo_path: str, pr_number: int, head_sha: str, results: AnalysisResults) -> None:
+        # The head SHA, a NUL, then the results in the compact encoding of result_store
+        payload = head_sha.encode() + b"\0" + encode_results(results)
+        try:
+            self._redis().set(self._key(repo_path, pr_number), payload, ex=self.ttl)
+        except redis.RedisError as e:
+            logger.warning("Could not save review history", extra={"error": str(e)})
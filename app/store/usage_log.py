@@ -0,0 +1,37 @@
+# app/store/usage_log.py
+import json
+import logging
+import os
+from typing import Optional
+
+import redis
+
+from .redis_client import get_redis
+
+USAGE_LOG_KEY = "llm-usage"
+# Only the most recent calls are kept; enough to tune the routing table
+USAGE_LOG_MAX_ENTRIES = int(os.getenv("LLM_USAGE_LOG_MAX_ENTRIES", "50000"))
+
+logger = logging.getLogger(__name__)
+
+
+class UsageLog:
+    """Append-only log of model calls (route, tokens, latency) kept in Redis."""
+
+    def __init__(self, client: Optional[redis.Redis] = None, max_entries: int = USAGE_LOG_MAX_ENTRIES):
+        self.client = client
+        self.max_entries = max_entries
+
+    def _redis(self) -> redis.Redis:
+        if self.client is None:
+            self.client = get_redis()
+        return self.client
+
+    def record(self, entry: dict) -> None:
+        try:
+            pipe = self._redis().pipeline()
+            pipe.lpush(USAGE_LOG_KEY, json.dumps(entry))
+            pipe.ltrim(USAGE_LOG_KEY, 0, self.max_entries - 1)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Could not record LLM usage", extra={"error": str(e)})
@@ -0,0 +1,194 @@
+# app/telemetry.py
+import contextlib
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Optional, Tuple
+
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+    start_http_server,
+)
+
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "code-reviewer")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# 'json' (one object per line, for log shippers) or 'text' (for reading in a terminal)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Set for multi-process servers (Celery prefork, gunicorn) so every process reports
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+# The stages a review goes through, in order
+STAGES = (
+    "queue_wait", "fetch", "code_index", "diff_parse", "triage", "static_rules", "prompt_build",
+    "llm_call", "json_extraction", "validation", "result_store",
+    "publish",
+)
+
+# From a cache lookup to a model call on a 2,000 file PR
+_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    "review_stage_seconds", "Time spent in each stage of a review", ["stage"], buckets=_BUCKETS
+)
+TASK_SECONDS = Histogram(
+    "review_task_seconds", "Run time of analyze_pr_task, queue wait excluded", ["outcome"], buckets=_BUCKETS
+)
+LLM_TOKENS = Counter("review_llm_tokens_total", "Tokens sent to and received from the model", ["route", "kind"])
+LLM_THROTTLED = Counter("review_llm_throttled_total", "Model calls answered with 429 or 503", ["model"])
+
+_tracer = trace.get_tracer("app")
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record. Fields passed with `extra=` become keys, and
+    records logged inside a span carry its trace and span ids.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS})
+        context = trace.get_current_span().get_span_context()
+        if context.is_valid:
+            entry["trace_id"] = format(context.trace_id, "032x")
+            entry["span_id"] = format(context.span_id, "016x")
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    """Routes every logger (Celery's and uvicorn's included) to stderr in the chosen format."""
+    handler = logging.StreamHandler()
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+
+def configure_tracing(exporter=None) -> None:
+    """
+    Installs an SDK tracer provider. Spans go to `exporter` when one is given
+    (tests pass an InMemorySpanExporter) or to an OTLP collector when
+    OTEL_EXPORTER_OTLP_ENDPOINT is set. Otherwise spans stay no-ops and cost
+    next to nothing.
+    """
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+
+    if exporter is not None:
+        processor = SimpleSpanProcessor(exporter)
+    elif os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logging.getLogger(__name__).warning(
+                "OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-exporter-otlp-proto-http is not installed"
+            )
+            return
+        processor = BatchSpanProcessor(OTLPSpanExporter())
+    else:
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    provider.add_span_processor(processor)
+    trace.set_tracer_provider(provider)
+
+
+def _attributes(attributes: dict) -> dict:
+    # OpenTelemetry rejects None values
+    return {k: v for k, v in attributes.items() if v is not None}
+
+
+@contextlib.contextmanager
+def stage(name: str, **attributes):
+    """
+    Times one stage of a review, as a span and in review_stage_seconds.
+    Yields the span so callers can attach what they learn along the way.
+    """
+    started = time.perf_counter()
+    with _tracer.start_as_current_span(name, attributes=_attributes(attributes)) as current:
+        try:
+            yield current
+        finally:
+            STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+def span(name: str, **attributes):
+    """A span that is not a timed stage (a whole task, for instance)."""
+    return _tracer.start_as_current_span(name, attributes=_attributes(attributes))
+
+
+def current_context():
+    """The active trace context, to hand to work that runs on another thread or loop."""
+    return otel_context.get_current()
+
+
+@contextlib.contextmanager
+def attached(parent):
+    """Makes a context from current_context() the active one, so spans started here nest under it."""
+    token = otel_context.attach(parent) if parent is not None else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            otel_context.detach(token)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Records a stage that was measured elsewhere, such as the time a task spent queued."""
+    STAGE_SECONDS.labels(name).observe(max(0.0, seconds))
+
+
+def _registry() -> CollectorRegistry:
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """The Prometheus exposition of this process (or of all processes in multiprocess mode)."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def reset_multiprocess_dir() -> None:
+    """Clears metrics left behind by processes of a previous run; call before forking."""
+    if MULTIPROC_DIR:
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+        for name in os.listdir(MULTIPROC_DIR):
+            path = os.path.join(MULTIPROC_DIR, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+
+def start_metrics_server(port: int = WORKER_METRICS_PORT) -> Optional[int]:
+    """Serves /metrics of a worker on its own port; returns the port, or None if disabled or taken."""
+    if port <= 0:
+        return None
+    try:
+        start_http_server(port, registry=_registry())
+    except OSError as e:
+        logging.getLogger(__name__).warning("Metrics server not started", extra={"port": port, "error": str(e)})
+        return None
+    return port
@@ -0,0 +1,114 @@
+# app/webhooks.py
+import hashlib
+import hmac
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+from .models import WebhookAck
+from .store.pending_pushes import PendingPushes
+
+# Shared secret configured on the GitHub webhook; deliveries are refused without it
+WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET", "")
+# A PR is reviewed once its pushes have been quiet for this long...
+WEBHOOK_DEBOUNCE_SECONDS = float(os.getenv("WEBHOOK_DEBOUNCE_SECONDS", "30"))
+# ...or at the latest this long after the first push that is still waiting
+WEBHOOK_DEBOUNCE_MAX_SECONDS = float(os.getenv("WEBHOOK_DEBOUNCE_MAX_SECONDS", "300"))
+
+# pull_request actions that put a new head up for review
+REVIEW_ACTIONS = ("opened", "reopened", "synchronize")
+
+logger = logging.getLogger(__name__)
+
+
+class MalformedDelivery(ValueError):
+    """A signed delivery that lacks what a review needs; the API answers 400."""
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """Checks the X-Hub-Signature-256 header (HMAC-SHA256 of the raw body) in constant time."""
+    if not secret or not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256="):])
+
+
+def pr_info_from_payload(pull_request: dict) -> dict:
+    """
+    The parts of the PR object of a webhook that the scheduler uses, so a
+    delivery can be routed without asking GitHub again.
+    """
+    return {
+        "head": {"sha": pull_request["head"]["sha"]},
+        "additions": pull_request.get("additions", 0),
+        "deletions": pull_request.get("deletions", 0),
+        "changed_files": pull_request.get("changed_files", 0),
+    }
+
+
+def _schedule(repo_path: str, pr_number: int, generation: int, countdown: float) -> None:
+    from .scheduler import SMALL_QUEUE
+    from .worker import DEBOUNCED_REVIEW_TASK, celery_app
+
+    # The debounce check is tiny; run it on the queue that is never stuck behind a large review
+    celery_app.send_task(
+        DEBOUNCED_REVIEW_TASK,
+        args=(repo_path, pr_number, generation, os.getenv("GITHUB_TOKEN")),
+        countdown=countdown,
+        queue=SMALL_QUEUE,
+    )
+
+
+class GitHubWebhooks:
+    """
+    Turns verified webhook deliveries into debounced reviews.
+
+    Each pull_request push is recorded as the newest pending push of its PR
+    and a check is scheduled for when the debounce window ends. Only the
+    check of the last push of a burst finds its push still pending and
+    queues a review; the others do nothing.
+    """
+
+    def __init__(self, pending: Optional[PendingPushes] = None,
+                 schedule: Callable[[str, int, int, float], None] = _schedule,
+                 debounce_seconds: float = WEBHOOK_DEBOUNCE_SECONDS,
+                 max_wait_seconds: float = WEBHOOK_DEBOUNCE_MAX_SECONDS):
+        self.pending = pending or PendingPushes()
+        self.schedule = schedule
+        self.debounce_seconds = debounce_seconds
+        self.max_wait_seconds = max_wait_seconds
+
+    def handle(self, event: str, payload: dict) -> WebhookAck:
+        if event == "ping":
+            return WebhookAck(status="pong")
+        if event != "pull_request":
+            return WebhookAck(status="ignored", message=f"Event '{event}' is not handled.")
+        action = payload.get("action")
+        pull_request = payload.get("pull_request") or {}
+        if action not in REVIEW_ACTIONS or pull_request.get("state", "open") != "open":
+            return WebhookAck(status="ignored", message=f"Action '{action}' does not need a review.")
+
+        repository = payload.get("repository") or {}
+        try:
+            repo_path = repository["full_name"]
+            repo_url = repository["html_url"]
+            pr_number = int(pull_request["number"])
+            pr_info = pr_info_from_payload(pull_request)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning("Malformed pull_request delivery", extra={"action": action, "missing": str(e)})
+            raise MalformedDelivery(f"pull_request delivery is missing or has an invalid {e}.")
+        generation, first_at = self.pending.record(repo_path, pr_number, {
+            "repo_url": repo_url,
+            "pr_info": pr_info,
+        })
+        # Keep waiting while pushes come in, but never past the max wait
+        countdown = max(0.0, min(self.debounce_seconds, first_at + self.max_wait_seconds - time.time()))
+        self.schedule(repo_path, pr_number, generation, countdown)
+
+        logger.info("Push received, review scheduled", extra={
+            "repo": repo_path, "pr": pr_number, "action": action, "head_sha": pr_info["head"]["sha"],
+            "generation": generation, "countdown_s": round(countdown, 1),
+        })
+        return WebhookAck(status="scheduled", repo=repo_path, pr_number=pr_number,
+                          head_sha=pr_info["head"]["sha"], review_in_seconds=round(countdown, 1))
@@ -1,6 +1,28 @@
 # app/worker.py
 from celery import Celery
+from celery.signals import before_task_publish, setup_logging, worker_init
 import os
+import time
+
+from .telemetry import configure_logging, reset_multiprocess_dir, start_metrics_server
+from .store.result_store import RESULT_TTL_SECONDS
+
+# A review that runs longer stops between chunks and is retried from its
+# checkpoint, in every pool; the prefork pool also enforces both limits
+# itself, the hard one killing the review a minute later
+REVIEW_SOFT_TIME_LIMIT = int(os.getenv("REVIEW_SOFT_TIME_LIMIT", "3540"))
+REVIEW_TIME_LIMIT = int(os.getenv("REVIEW_TIME_LIMIT", "3600"))
+REVIEW_MAX_RETRIES = int(os.getenv("REVIEW_MAX_RETRIES", "3"))
+# A review whose worker died (OOM, kill) is delivered again at most this many
+# times in a row, then failed, so one PR cannot take down workers forever
+REVIEW_MAX_REDELIVERIES = int(os.getenv("REVIEW_MAX_REDELIVERIES", "2"))
+# A review acknowledged late is handed to another worker if it was not acked
+# within this long; it must outlast the longest review, or reviews would run twice
+VISIBILITY_TIMEOUT = int(os.getenv("BROKER_VISIBILITY_TIMEOUT", str(REVIEW_TIME_LIMIT + 600)))
+
+class ReviewDeadlineExceeded(Exception):
+    """Raised between chunks by a review that ran past its soft time limit (thread and solo pools too)."""
+
 
 # Load the REDIS_URL from an environment variable, defaulting to localhost
 # if not set (for local testing without Docker)
@@ -14,6 +36,11 @@ celery_app = Celery(
     include=['app.celery_tasks']  # List of modules to import when the worker starts
 )
 
+# Publishers queue tasks by name (celery_app.send_task), so the API never
+# imports the tasks module and the agent stack behind it
+ANALYZE_PR_TASK = "app.celery_tasks.analyze_pr_task"
+DEBOUNCED_REVIEW_TASK = "app.celery_tasks.debounced_review_task"
+
 # Optional configuration
 celery_app.conf.update(
     task_track_started=True,
@@ -22,4 +49,37 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
-)
\ No newline at end of file
+    # Task states expire with the results they point at (see app/store/result_store.py)
+    result_expires=RESULT_TTL_SECONDS,
+    # Small PRs and large PRs get their own queues (see app/scheduler.py) so a
+    # huge review never sits in front of a two-line fix
+    task_default_queue='celery',
+    broker_transport_options={
+        # Lower number = served first (Redis emulates priorities with sub-queues)
+        'priority_steps': list(range(10)),
+        'queue_order_strategy': 'priority',
+        'visibility_timeout': VISIBILITY_TIMEOUT,
+    },
+    # Don't let one process reserve several big reviews while others idle
+    worker_prefetch_multiplier=1,
+)
+
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    """Marks when a task was queued, so the worker can tell how long it waited."""
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
+
+
+@setup_logging.connect
+def init_logging(**kwargs):
+    """Replaces Celery's own log setup, so worker logs are structured like the API's."""
+    configure_logging()
+
+
+@worker_init.connect
+def init_worker_metrics(**kwargs):
+    """Serves the worker's /metrics (all pool processes together) before the pool forks."""
+    reset_multiprocess_dir()
+    start_metrics_server()
@@ -0,0 +1,125 @@
+# bench/__main__.py
+"""
+Offline benchmark of the review pipeline.
+
+    python -m bench run --sizes 1,10,100 --repeat 3 --redis fake
+    python -m bench run --compare            # against bench/baseline.json
+    python -m bench run --save-baseline
+    python -m bench record https://github.com/pallets/flask 5384
+    python -m bench startup --first-task consumer,worker
+"""
+import argparse
+import json
+import os
+import sys
+
+from .fixtures import DEFAULT_SIZES, load_fixtures, record
+from .harness import BASELINE_PATH, BenchConfig, Benchmark, compare, format_report
+from .startup import FIRST_TASK_COMMANDS, format_startup, measure_startup
+
+
+def _run(args) -> int:
+    sizes = [int(s) for s in args.sizes.split(",")] if args.sizes else DEFAULT_SIZES
+    config = BenchConfig(
+        repeat=args.repeat,
+        concurrency=args.concurrency,
+        mode=args.mode,
+        redis=args.redis,
+        llm_latency_ms=args.llm_latency_ms,
+        llm_ms_per_token=args.llm_ms_per_token,
+        issues_per_chunk=args.issues_per_chunk,
+        truncate_rate=args.truncate_rate,
+        review_cache=args.review_cache,
+        near_duplicates=args.near_duplicates,
+        verbose=args.verbose,
+    )
+    report = Benchmark(load_fixtures(sizes, recorded=not args.no_recorded), config).run().to_dict()
+    print(format_report(report))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+        else:
+            with open(args.baseline) as f:
+                lines = compare(report, json.load(f), args.tolerance)
+            print("\n".join(lines))
+            if any(line.startswith("REGRESSION") for line in lines):
+                status = 1
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    return status
+
+
+def _record(args) -> int:
+    print(f"Saved {record(args.repo_url, args.pr_number, token=os.getenv('GITHUB_TOKEN'))}")
+    return 0
+
+
+def _startup(args) -> int:
+    kinds = [k for k in args.first_task.split(",") if k] if args.first_task else []
+    unknown = [k for k in kinds if k not in FIRST_TASK_COMMANDS]
+    if unknown:
+        print(f"Unknown --first-task value(s): {', '.join(unknown)}")
+        return 2
+    report = measure_startup(args.repeat, kinds, verbose=args.verbose)
+    print(format_startup(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Offline benchmark of PR reviews.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="replay fixtures through analyze_pr_task")
+    run.add_argument("--sizes", help=f"comma-separated file counts of synthetic PRs (default {DEFAULT_SIZES})")
+    run.add_argument("--no-recorded", action="store_true", help="skip fixtures recorded in bench/fixtures")
+    run.add_argument("--repeat", type=int, default=3, help="reviews per fixture")
+    run.add_argument("--concurrency", type=int, default=1, help="reviews running at the same time")
+    run.add_argument("--mode", choices=("eager", "worker"), default="eager",
+                     help="eager: tasks run in this process; worker: a real Celery worker on REDIS_URL")
+    run.add_argument("--redis", choices=("url", "fake"), default="url",
+                     help="fake: in-memory fakeredis instead of REDIS_URL (eager mode only)")
+    run.add_argument("--llm-latency-ms", type=float, default=200, help="fixed latency of each model call")
+    run.add_argument("--llm-ms-per-token", type=float, default=0.0, help="extra latency per output token")
+    run.add_argument("--issues-per-chunk", type=int, default=1)
+    run.add_argument("--truncate-rate", type=float, default=0.0, help="share of model replies cut in half")
+    run.add_argument("--review-cache", action="store_true", help="leave the review cache on")
+    run.add_argument("--near-duplicates", action="store_true", help="leave the near-duplicate index on")
+    run.add_argument("--output", help="write the JSON report here")
+    run.add_argument("--baseline", default=BASELINE_PATH)
+    run.add_argument("--compare", action="store_true", help="compare with the baseline; exit 1 on regressions")
+    run.add_argument("--tolerance", type=float, default=0.2, help="allowed regression as a fraction")
+    run.add_argument("--save-baseline", action="store_true")
+    run.add_argument("--verbose", action="store_true", help="show agent and worker output")
+    run.set_defaults(func=_run)
+
+    rec = commands.add_parser("record", help="save a real PR from GitHub as a fixture")
+    rec.add_argument("repo_url")
+    rec.add_argument("pr_number", type=int)
+    rec.set_defaults(func=_record)
+
+    start = commands.add_parser("startup", help="time process imports and the first task of a cold process")
+    start.add_argument("--repeat", type=int, default=5, help="fresh interpreters per import measurement")
+    start.add_argument("--first-task", help=f"comma-separated of {','.join(FIRST_TASK_COMMANDS)}; needs REDIS_URL")
+    start.add_argument("--output", help="write the JSON report here")
+    start.add_argument("--verbose", action="store_true", help="show consumer and worker output")
+    start.set_defaults(func=_startup)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "mode", None) == "worker" and args.redis == "fake":
+        parser.error("--redis fake only works with --mode eager")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# bench/fixtures.py
+import hashlib
+import json
+import os
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# Number of changed files of the synthetic PRs, from a one-liner to a huge refactor
+DEFAULT_SIZES = [1, 10, 100, 2000]
+
+_SNIPPETS = [
+    "result = compute(value, retries={n})",
+    "if user is None:\n    raise ValueError('missing user {n}')",
+    "for item in items:\n    total += item.price * {n}",
+    "print('debug', {n})",
+    "data = json.loads(payload)  # {n}",
+    "query = 'SELECT * FROM t WHERE id = ' + str({n})",
+    "except:\n    pass",
+    "cache[key] = fetch(key, timeout={n})",
+]
+
+
+@dataclass
+class Fixture:
+    """A recorded (or synthetic) pull request: its diff and its API metadata."""
+    name: str
+    diff: str
+    pr_info: dict
+
+    @property
+    def files(self) -> int:
+        return self.pr_info.get("changed_files", 0)
+
+
+def _file_diff(path: str, rng: random.Random) -> str:
+    added = []
+    for _ in range(rng.randint(3, 30)):
+        added.extend(rng.choice(_SNIPPETS).format(n=rng.randint(1, 999)).splitlines())
+    start = rng.randint(1, 400)
+    lines = [
+        f"diff --git a/{path} b/{path}",
+        f"index {rng.getrandbits(28):07x}..{rng.getrandbits(28):07x} 100644",
+        f"--- a/{path}",
+        f"+++ b/{path}",
+        f"@@ -{start},6 +{start},{6 + len(added)} @@ def handler():",
+        "     context = load()",
+        "     value = context.value",
+        "     items = context.items",
+    ]
+    lines += [f"+    {line}" for line in added]
+    lines += ["     total = 0", "     return total", "     # end"]
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_fixture(files: int, seed: int = 0) -> Fixture:
+    """A deterministic PR touching `files` Python files."""
+    rng = random.Random(f"{seed}:{files}")
+    diff = "".join(_file_diff(f"pkg/module_{i // 50}/file_{i}.py", rng) for i in range(files))
+    additions = sum(1 for line in diff.splitlines() if line.startswith("+") and not line.startswith("+++"))
+    return Fixture(
+        name=f"synthetic-{files}",
+        diff=diff,
+        pr_info={
+            "head": {"sha": hashlib.sha1(diff.encode()).hexdigest()},
+            "changed_files": files,
+            "additions": additions,
+            "deletions": 0,
+        },
+    )
+
+
+def load_recorded(directory: str = FIXTURES_DIR) -> List[Fixture]:
+    """Fixtures saved by `python -m bench record`."""
+    if not os.path.isdir(directory):
+        return []
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                data = json.load(f)
+            fixtures.append(Fixture(name=data["name"], diff=data["diff"], pr_info=data["pr_info"]))
+    return fixtures
+
+
+def load_fixtures(sizes: Optional[List[int]] = None, recorded: bool = True) -> List[Fixture]:
+    fixtures = [synthetic_fixture(n) for n in (sizes or DEFAULT_SIZES)]
+    if recorded:
+        fixtures += load_recorded()
+    return fixtures
+
+
+def record(repo_url: str, pr_number: int, token: Optional[str] = None,
+           directory: str = FIXTURES_DIR) -> str:
+    """Fetches a real PR from GitHub and stores it as a fixture; returns its path."""
+    from app.api_tools.github_fetcher import GitHubFetcher
+
+    fetcher = GitHubFetcher(token=token)
+    info = fetcher.fetch_pr_info(repo_url, pr_number)
+    diff = fetcher.fetch_pr_diff(repo_url, pr_number)
+    name = f"{fetcher.repo_path(repo_url).replace('/', '-')}-{pr_number}"
+    pr_info: Dict = {
+        "head": {"sha": info["head"]["sha"]},
+        "changed_files": info.get("changed_files", 0),
+        "additions": info.get("additions", 0),
+        "deletions": info.get("deletions", 0),
+    }
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.json")
+    with open(path, "w") as f:
+        json.dump({"name": name, "diff": diff, "pr_info": pr_info}, f)
+    return path
@@ -0,0 +1,342 @@
+# bench/harness.py
+import contextlib
+import io
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from .fixtures import Fixture
+from .servers import FakeLLM, StubGitHub
+
+REPO_URL = "https://github.com/bench/fixture-repo"
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Metrics compared against the baseline, and whether higher is better
+COMPARED_METRICS = {
+    "p50_s": False,
+    "p95_s": False,
+    "tokens_per_review": False,
+    "tasks_per_sec": True,
+    "peak_rss_mb": False,
+}
+
+
+@dataclass
+class BenchConfig:
+    repeat: int = 3
+    concurrency: int = 1
+    mode: str = "eager"           # 'eager' (in process) or 'worker' (real Celery worker)
+    redis: str = "url"            # 'url' (REDIS_URL) or 'fake' (in-memory fakeredis, eager only)
+    llm_latency_ms: float = 200
+    llm_ms_per_token: float = 0.0
+    issues_per_chunk: int = 1
+    truncate_rate: float = 0.0
+    review_cache: bool = False
+    near_duplicates: bool = False
+    verbose: bool = False
+
+
+@dataclass
+class FixtureReport:
+    name: str
+    files: int
+    runs: int
+    errors: int
+    p50_s: float
+    p95_s: float
+    mean_s: float
+    tokens_per_review: float
+    llm_calls_per_review: float
+
+
+@dataclass
+class BenchReport:
+    config: dict
+    tasks: int
+    wall_s: float
+    tasks_per_sec: float
+    peak_rss_mb: float
+    reviewer_init_s: Optional[float]
+    llm_requests: int
+    github_requests: int
+    fixtures: List[FixtureReport] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def bench_routes() -> List[dict]:
+    """The default routing table, with every model pointed at the fake LLM."""
+    return [
+        {"name": "fast", "model": "openai/bench-fast", "max_tokens": 600, "max_risk": "low"},
+        {"name": "standard", "model": "openai/bench-standard", "max_tokens": 2500, "max_risk": "medium"},
+        {"name": "strong", "model": "openai/bench-strong", "max_tokens": None, "max_risk": "high"},
+    ]
+
+
+def bench_environment(github: StubGitHub, llm: FakeLLM, config: BenchConfig) -> Dict[str, str]:
+    return {
+        "GITHUB_API_URL": github.url,
+        "GITHUB_BACKOFF_BASE": "0.05",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{llm.url}/v1",
+        "OPENAI_API_BASE": f"{llm.url}/v1",
+        "HUGGINGFACE_API_TOKEN": os.getenv("HUGGINGFACE_API_TOKEN", "bench"),
+        "REVIEW_MODEL_ROUTES": json.dumps(bench_routes()),
+        "REVIEW_CACHE_ENABLED": "true" if config.review_cache else "false",
+        # Synthetic fixtures look alike; reusing reviews between them would skew call counts
+        "NEAR_DUPLICATE_ENABLED": "true" if config.near_duplicates else "false",
+        # The stub GitHub serves no tarballs; keeps prompts comparable with older baselines
+        "REVIEW_CONTEXT_ENABLED": "false",
+        # fakeredis has no Lua, so an in-memory run limits model calls per process
+        "LLM_LIMITS_BACKEND": "local" if config.redis == "fake" else "redis",
+    }
+
+
+def _load_results(value) -> Optional[dict]:
+    """Full results of a finished task, from the pointer the task returned."""
+    from app.store.result_store import ResultStore
+
+    if not value:
+        return None
+    results = ResultStore().load(value["result_ref"])
+    return results.dict() if results is not None else None
+
+
+def _peak_rss_mb_of(pid: int) -> float:
+    """VmHWM of a process and its direct children (Linux only)."""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total / 1024
+
+
+class Benchmark:
+    """
+    Replays fixtures through analyze_pr_task end to end: Celery, the GitHub
+    fetcher (against StubGitHub), the reviewer and the model calls (against
+    FakeLLM). Every run uses a fresh PR number so nothing is served from
+    the review history.
+    """
+
+    def __init__(self, fixtures: List[Fixture], config: BenchConfig):
+        self.fixtures = fixtures
+        self.config = config
+        self.github = StubGitHub()
+        self.llm = FakeLLM(
+            latency_ms=config.llm_latency_ms,
+            ms_per_token=config.llm_ms_per_token,
+            issues_per_chunk=config.issues_per_chunk,
+            truncate_rate=config.truncate_rate,
+        )
+        self._worker: Optional[subprocess.Popen] = None
+
+    def _jobs(self) -> List[tuple]:
+        run_id = int(time.time())
+        jobs = []
+        for index, fixture in enumerate(self.fixtures):
+            for attempt in range(self.config.repeat):
+                pr_number = run_id * 1000 + index * 100 + attempt
+                self.github.add(pr_number, fixture)
+                jobs.append((fixture, pr_number))
+        return jobs
+
+    def run(self) -> BenchReport:
+        self.github.start()
+        self.llm.start()
+        os.environ.update(bench_environment(self.github, self.llm, self.config))
+        try:
+            if self.config.mode == "worker":
+                return self._run_worker()
+            return self._run_eager()
+        finally:
+            self.github.stop()
+            self.llm.stop()
+
+    def _quiet(self):
+        return contextlib.nullcontext() if self.config.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    def _run_eager(self) -> BenchReport:
+        # Imported only now: the app reads its configuration at import time
+        if self.config.redis == "fake":
+            import fakeredis
+            from app.store import redis_client
+            redis_client._client = fakeredis.FakeRedis()
+        from app.worker import celery_app
+        from app.celery_tasks import analyze_pr_task
+        from app.agent.code_reviewer import get_reviewer
+
+        celery_app.conf.task_always_eager = True
+        if self.config.redis == "fake":
+            celery_app.conf.result_backend = "cache+memory://"
+
+        # A worker builds the reviewer before its first task (worker_process_init)
+        started = time.perf_counter()
+        with self._quiet():
+            get_reviewer()
+        init_s = time.perf_counter() - started
+
+        def run_one(job):
+            fixture, pr_number = job
+            begin = time.perf_counter()
+            result = analyze_pr_task.apply(args=(REPO_URL, pr_number, None))
+            elapsed = time.perf_counter() - begin
+            return fixture, elapsed, (_load_results(result.result) if result.successful() else None)
+
+        jobs = self._jobs()
+        started = time.perf_counter()
+        with self._quiet(), ThreadPoolExecutor(max_workers=self.config.concurrency) as pool:
+            outcomes = list(pool.map(run_one, jobs))
+        wall = time.perf_counter() - started
+
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return self._report(outcomes, wall, peak_rss_mb, init_s)
+
+    def _run_worker(self) -> BenchReport:
+        from app.worker import celery_app
+        from app.celery_tasks import analyze_pr_task
+
+        self._worker = subprocess.Popen(
+            [sys.executable, "-m", "celery", "-A", "app.worker.celery_app", "worker",
+             "-Q", "reviews.small,reviews.large,celery", "--concurrency", str(self.config.concurrency),
+             "-l", "warning"],
+            env=dict(os.environ),
+            stdout=None if self.config.verbose else subprocess.DEVNULL,
+            stderr=None if self.config.verbose else subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.monotonic() + 120
+            while not celery_app.control.ping(timeout=1.0):
+                if self._worker.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("Celery worker did not come up; is REDIS_URL reachable?")
+
+            jobs = self._jobs()
+            started = time.perf_counter()
+            submitted = [
+                (fixture, time.perf_counter(), analyze_pr_task.apply_async(args=(REPO_URL, pr_number, None)))
+                for fixture, pr_number in jobs
+            ]
+
+            def wait(item):
+                fixture, begin, async_result = item
+                try:
+                    value = async_result.get(timeout=3600, propagate=True)
+                except Exception:
+                    value = None
+                elapsed = time.perf_counter() - begin
+                return fixture, elapsed, _load_results(value)
+
+            with ThreadPoolExecutor(max_workers=min(64, len(submitted))) as pool:
+                outcomes = list(pool.map(wait, submitted))
+            wall = time.perf_counter() - started
+            peak_rss_mb = _peak_rss_mb_of(self._worker.pid)
+        finally:
+            self._worker.terminate()
+            self._worker.wait(timeout=30)
+        return self._report(outcomes, wall, peak_rss_mb, None)
+
+    def _report(self, outcomes, wall: float, peak_rss_mb: float, init_s: Optional[float]) -> BenchReport:
+        by_fixture: Dict[str, list] = {}
+        for fixture, elapsed, value in outcomes:
+            by_fixture.setdefault(fixture.name, []).append((fixture, elapsed, value))
+
+        fixtures = []
+        for name, runs in by_fixture.items():
+            ok = [(elapsed, value) for _, elapsed, value in runs if value is not None]
+            latencies = [elapsed for elapsed, _ in ok]
+            stats = [(value.get("stats") or {}) for _, value in ok]
+            fixtures.append(FixtureReport(
+                name=name,
+                files=runs[0][0].files,
+                runs=len(runs),
+                errors=len(runs) - len(ok),
+                p50_s=round(percentile(latencies, 50), 4),
+                p95_s=round(percentile(latencies, 95), 4),
+                mean_s=round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+                tokens_per_review=round(sum(s.get("prompt_tokens", 0) + s.get("completion_tokens", 0)
+                                            for s in stats) / len(stats), 1) if stats else 0.0,
+                llm_calls_per_review=round(sum(len(s.get("llm_calls", [])) for s in stats) / len(stats), 1)
+                if stats else 0.0,
+            ))
+
+        return BenchReport(
+            config=asdict(self.config),
+            tasks=len(outcomes),
+            wall_s=round(wall, 3),
+            tasks_per_sec=round(len(outcomes) / wall, 3) if wall else 0.0,
+            peak_rss_mb=round(peak_rss_mb, 1),
+            reviewer_init_s=round(init_s, 3) if init_s is not None else None,
+            llm_requests=self.llm.requests,
+            github_requests=self.github.requests,
+            fixtures=fixtures,
+        )
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Lines describing each metric against the baseline. Regressions beyond
+    `tolerance` (a fraction, e.g. 0.2) are prefixed with 'REGRESSION'.
+    """
+    lines = []
+
+    def check(label: str, metric: str, current: float, previous: float):
+        if not previous:
+            return
+        change = (current - previous) / previous
+        worse = -change if COMPARED_METRICS[metric] else change
+        prefix = "REGRESSION" if worse > tolerance else "ok"
+        lines.append(f"{prefix:<10} {label:<28} {metric:<18} {previous:>10} -> {current:<10} ({change:+.1%})")
+
+    for metric in ("tasks_per_sec", "peak_rss_mb"):
+        check("overall", metric, report[metric], baseline.get(metric, 0))
+    previous = {f["name"]: f for f in baseline.get("fixtures", [])}
+    for fixture in report["fixtures"]:
+        old = previous.get(fixture["name"])
+        if old is None:
+            continue
+        for metric in ("p50_s", "p95_s", "tokens_per_review"):
+            check(fixture["name"], metric, fixture[metric], old.get(metric, 0))
+    return lines
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"{report['tasks']} task(s) in {report['wall_s']}s: {report['tasks_per_sec']} tasks/s, "
+        f"peak RSS {report['peak_rss_mb']} MB, {report['llm_requests']} model call(s), "
+        f"{report['github_requests']} GitHub request(s)",
+        f"{'fixture':<28} {'files':>6} {'runs':>5} {'err':>4} {'p50 s':>9} {'p95 s':>9} {'tokens':>10} {'calls':>7}",
+    ]
+    for f in report["fixtures"]:
+        lines.append(
+            f"{f['name']:<28} {f['files']:>6} {f['runs']:>5} {f['errors']:>4} {f['p50_s']:>9} "
+            f"{f['p95_s']:>9} {f['tokens_per_review']:>10} {f['llm_calls_per_review']:>7}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,243 @@
+# bench/servers.py
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Set, Tuple
+
+from .fixtures import Fixture
+
+DIFF_MEDIA_TYPE = "application/vnd.github.v3.diff"
+
+PR_PATH_RE = re.compile(r'^/repos/[^/]+/[^/]+/pulls/(\d+)$')
+COMPARE_PATH_RE = re.compile(r'^/repos/[^/]+/[^/]+/compare/')
+PR_LIST_PATH_RE = re.compile(r'^/repos/[^/]+/[^/]+/pulls/(\d+)/(comments|reviews)$')
+COMMENT_PATH_RE = re.compile(r'^/repos/[^/]+/[^/]+/pulls/comments/(\d+)$')
+DIFF_FILE_RE = re.compile(r'^\+\+\+ b/(.+)$', re.MULTILINE)
+FILE_RE = re.compile(r'Review this diff of "([^"]+)"')
+HUNK_RE = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@', re.MULTILINE)
+
+
+class _Server:
+    """A ThreadingHTTPServer on a free localhost port, served from a daemon thread."""
+
+    handler = BaseHTTPRequestHandler
+
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self.httpd.daemon_threads = True
+        self.httpd.owner = self
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def count(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Dict[str, str] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def diff_lines_shown(diff: str) -> Set[Tuple[str, int]]:
+    """(path, new line) of every line a diff shows, which is where GitHub accepts review comments."""
+    shown = set()
+    for section in re.split(r'^diff --git ', diff, flags=re.MULTILINE):
+        path = DIFF_FILE_RE.search(section)
+        if not path:
+            continue
+        for match in HUNK_RE.finditer(section):
+            start, count = int(match.group(1)), int(match.group(2) or 1)
+            shown.update((path.group(1), line) for line in range(start, start + count))
+    return shown
+
+
+class _GitHubHandler(_Handler):
+    def _json(self, status: int, payload) -> None:
+        self._send(status, json.dumps(payload).encode(), "application/json")
+
+    def _read_json(self) -> dict:
+        return json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+    def do_POST(self):
+        server: StubGitHub = self.server.owner
+        server.count()
+        match = PR_LIST_PATH_RE.match(self.path.split('?')[0])
+        pr_number = int(match.group(1)) if match and match.group(2) == "reviews" else None
+        fixture = server.pulls.get(pr_number)
+        if fixture is None:
+            return self._json(404, {"message": "Not Found"})
+        request = self._read_json()
+        shown = diff_lines_shown(fixture.diff)
+        if any((c["path"], c["line"]) not in shown for c in request.get("comments", [])):
+            return self._json(422, {"message": "Unprocessable Entity",
+                                    "errors": ["Line could not be resolved"]})
+        with server._lock:
+            review = {"id": server.next_id(), "body": request.get("body", ""), "commit_id": request.get("commit_id")}
+            server.reviews.setdefault(pr_number, []).append(review)
+            for comment in request.get("comments", []):
+                server.comments.setdefault(pr_number, []).append({
+                    "id": server.next_id(), "pull_request_review_id": review["id"], "path": comment["path"],
+                    "line": comment["line"], "side": comment.get("side", "RIGHT"), "body": comment["body"],
+                })
+        self._json(200, review)
+
+    def do_PATCH(self):
+        server: StubGitHub = self.server.owner
+        server.count()
+        match = COMMENT_PATH_RE.match(self.path.split('?')[0])
+        comment_id = int(match.group(1)) if match else None
+        with server._lock:
+            for comment in (c for comments in server.comments.values() for c in comments):
+                if comment["id"] == comment_id:
+                    comment["body"] = self._read_json().get("body", comment["body"])
+                    return self._json(200, comment)
+        self._json(404, {"message": "Not Found"})
+
+    def _list(self, items: List[dict]) -> None:
+        query = dict(p.split('=', 1) for p in self.path.partition('?')[2].split('&') if '=' in p)
+        per_page, page = int(query.get("per_page", 30)), int(query.get("page", 1))
+        self._json(200, items[(page - 1) * per_page:page * per_page])
+
+    def do_GET(self):
+        server: StubGitHub = self.server.owner
+        server.count()
+        path = self.path.split('?')[0]
+        listing = PR_LIST_PATH_RE.match(path)
+        if listing:
+            store = server.comments if listing.group(2) == "comments" else server.reviews
+            with server._lock:
+                items = list(store.get(int(listing.group(1)), []))
+            return self._list(items)
+        if COMPARE_PATH_RE.match(path):
+            # Every benchmark run is a first review
+            return self._send(404, b'{"message": "Not Found"}', "application/json")
+        match = PR_PATH_RE.match(path)
+        fixture = server.pulls.get(int(match.group(1))) if match else None
+        if fixture is None:
+            return self._send(404, b'{"message": "Not Found"}', "application/json")
+
+        if DIFF_MEDIA_TYPE in self.headers.get("Accept", ""):
+            body, content_type = fixture.diff.encode(), "text/plain; charset=utf-8"
+        else:
+            body, content_type = json.dumps(fixture.pr_info).encode(), "application/json"
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        headers = {"ETag": etag, "X-RateLimit-Remaining": "5000", "X-RateLimit-Reset": str(int(time.time()) + 3600)}
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", content_type, headers)
+        self._send(200, body, content_type, headers)
+
+
+class StubGitHub(_Server):
+    """
+    Serves PR metadata and diffs of fixtures, keyed by PR number, like
+    api.github.com. Reviews posted to it are kept, with their inline
+    comments, and can be listed and edited like on GitHub.
+    """
+
+    handler = _GitHubHandler
+
+    def __init__(self):
+        super().__init__()
+        self.pulls: Dict[int, Fixture] = {}
+        self.reviews: Dict[int, List[dict]] = {}
+        self.comments: Dict[int, List[dict]] = {}
+        self._ids = 0
+
+    def next_id(self) -> int:
+        self._ids += 1
+        return self._ids
+
+    def add(self, pr_number: int, fixture: Fixture) -> None:
+        self.pulls[pr_number] = fixture
+
+
+class _LLMHandler(_Handler):
+    def do_POST(self):
+        server: FakeLLM = self.server.owner
+        server.count()
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+        content = server.reply(prompt)
+
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        time.sleep((server.latency_ms + server.ms_per_token * completion_tokens) / 1000)
+        body = json.dumps({
+            "id": f"chatcmpl-{server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }).encode()
+        self._send(200, body, "application/json")
+
+
+class FakeLLM(_Server):
+    """
+    OpenAI-compatible chat completions endpoint standing in for the model.
+
+    It answers review prompts with `issues_per_chunk` issues on the first
+    added lines, after `latency_ms` plus `ms_per_token` per output token.
+    A `truncate_rate` share of replies is cut in half to exercise recovery.
+    """
+
+    handler = _LLMHandler
+
+    def __init__(self, latency_ms: float = 200, ms_per_token: float = 0.0,
+                 issues_per_chunk: int = 1, truncate_rate: float = 0.0, seed: int = 0):
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.ms_per_token = ms_per_token
+        self.issues_per_chunk = issues_per_chunk
+        self.truncate_rate = truncate_rate
+        self._rng = random.Random(seed)
+
+    def reply(self, prompt: str) -> str:
+        match = FILE_RE.search(prompt)
+        if not match:
+            # Repair prompts and anything else
+            return '{"files": []}'
+        lines = [int(m.group(1)) for m in HUNK_RE.finditer(prompt)] or [1]
+        issues = [
+            {"type": "best_practice", "line": lines[i % len(lines)] + i,
+             "description": "Synthetic finding from the benchmark model.",
+             "suggestion": "Nothing to do; this is a benchmark."}
+            for i in range(self.issues_per_chunk)
+        ]
+        content = json.dumps({"files": [{"name": match.group(1), "issues": issues}]})
+        with self._lock:
+            truncate = self._rng.random() < self.truncate_rate
+        return content[:len(content) // 2] if truncate else content
@@ -0,0 +1,95 @@
+# bench/startup.py
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from .fixtures import synthetic_fixture
+from .harness import REPO_URL, BenchConfig, bench_environment
+from .servers import FakeLLM, StubGitHub
+
+# What each process type imports at start
+STARTUP_MODULES = ("app.main", "app.consumer", "app.celery_tasks")
+# Modules that should only be loaded once a review actually runs
+HEAVY_MODULES = ("litellm", "app.agent.code_reviewer")
+
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+# Ways of running one queued task, from process start to result
+FIRST_TASK_COMMANDS = {
+    "consumer": [sys.executable, "-m", "app.consumer", "--max-jobs", "1"],
+    "worker": [sys.executable, "-m", "celery", "-A", "app.worker.celery_app", "worker",
+               "-Q", "reviews.small,reviews.large,celery", "--concurrency", "1", "-l", "warning"],
+}
+
+
+def import_seconds(module: str, repeat: int = 5) -> dict:
+    """Median time to import `module` in a fresh interpreter, and which heavy modules it pulled in."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True, env=dict(os.environ),
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "seconds": round(statistics.median(r["seconds"] for r in runs), 4),
+        "loaded": runs[-1]["loaded"],
+    }
+
+
+def first_task_seconds(kind: str, timeout: float = 300, verbose: bool = False) -> float:
+    """
+    Queues a one-file review on REDIS_URL, then starts a consumer or worker
+    process and times it from spawn to the stored result.
+    """
+    from app.worker import ANALYZE_PR_TASK, celery_app
+
+    github, llm = StubGitHub(), FakeLLM(latency_ms=50)
+    pr_number = int(time.time() * 1000)
+    github.add(pr_number, synthetic_fixture(1))
+    github.start()
+    llm.start()
+    env = dict(os.environ, **bench_environment(github, llm, BenchConfig()))
+    try:
+        async_result = celery_app.send_task(ANALYZE_PR_TASK, args=(REPO_URL, pr_number, None))
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            FIRST_TASK_COMMANDS[kind], env=env,
+            stdout=None if verbose else subprocess.DEVNULL,
+            stderr=None if verbose else subprocess.DEVNULL,
+        )
+        try:
+            async_result.get(timeout=timeout)
+            return round(time.perf_counter() - started, 3)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    finally:
+        github.stop()
+        llm.stop()
+
+
+def measure_startup(repeat: int = 5, first_task: Optional[List[str]] = None, verbose: bool = False) -> Dict:
+    report = {"imports": {module: import_seconds(module, repeat) for module in STARTUP_MODULES}}
+    if first_task:
+        report["first_task_s"] = {kind: first_task_seconds(kind, verbose=verbose) for kind in first_task}
+    return report
+
+
+def format_startup(report: dict) -> str:
+    lines = [f"{'module':<22} {'import s':>9}  heavy modules loaded"]
+    for module, entry in report["imports"].items():
+        lines.append(f"{module:<22} {entry['seconds']:>9}  {', '.join(entry['loaded']) or '-'}")
+    for kind, seconds in report.get("first_task_s", {}).items():
+        lines.append(f"first task via {kind:<8} {seconds:>9}")
+    return "\n".join(lines)
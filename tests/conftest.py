@@ -0,0 +1,50 @@
+# tests/conftest.py
+import os
+
+import pytest
+
+from bench.fixtures import Fixture
+from bench.servers import StubGitHub
+
+# Tests stay offline: litellm would otherwise fetch its model price list when first imported
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+REPO_URL = "https://github.com/acme/widgets"
+
+DIFF = """diff --git a/app/service.py b/app/service.py
+index 1111111..2222222 100644
+--- a/app/service.py
++++ b/app/service.py
+@@ -10,4 +10,6 @@ def handler(request):
+     user = load_user(request)
+     items = user.items
++    total = sum(item.price for item in items)
++    print('debug', total)
+     return render(items)
+     # end
+"""
+
+
+def make_fixture(diff: str = DIFF, head_sha: str = "a" * 40) -> Fixture:
+    return Fixture(name="widgets", diff=diff,
+                   pr_info={"head": {"sha": head_sha}, "changed_files": 1, "additions": 2, "deletions": 0})
+
+
+@pytest.fixture
+def github():
+    """A stub GitHub serving the PR `DIFF` as #7."""
+    server = StubGitHub().start()
+    server.add(7, make_fixture())
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """An in-memory Redis behind get_redis()."""
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.store import redis_client as module
+
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(module, "_client", client)
+    return client
@@ -0,0 +1,69 @@
+# tests/test_admission.py
+import pytest
+
+from app import admission
+from app.admission import AdmissionController, Overloaded
+from app.store.admission import AdmissionCounters
+
+
+@pytest.fixture
+def queued():
+    """Reviews waiting in the broker, as the controller will see them."""
+    return {"depth": 0}
+
+
+@pytest.fixture
+def controller(redis_client, monkeypatch, queued):
+    monkeypatch.setattr(admission, "ADMISSION_CLIENT_LIMIT", 30)
+    monkeypatch.setattr(admission, "ADMISSION_GLOBAL_LIMIT", 600)
+    monkeypatch.setattr(admission, "ADMISSION_MAX_QUEUE_DEPTH", 1000)
+    monkeypatch.setattr(admission, "DEPTH_CACHE_SECONDS", 0.0)
+    return AdmissionController(counters=AdmissionCounters(client=redis_client), depth=lambda: queued["depth"])
+
+
+def test_client_over_its_limit_is_refused_with_retry_after(controller):
+    controller.admit("10.0.0.1", cost=30)
+
+    with pytest.raises(Overloaded) as refused:
+        controller.admit("10.0.0.1")
+
+    assert refused.value.status_code == 429
+    assert refused.value.retry_after >= 1
+    # Other clients have their own budget
+    controller.admit("10.0.0.2", cost=30)
+
+
+def test_refused_request_does_not_use_up_the_window(controller):
+    controller.admit("10.0.0.1", cost=25)
+    with pytest.raises(Overloaded):
+        controller.admit("10.0.0.1", cost=10)
+
+    controller.admit("10.0.0.1", cost=5)
+
+
+def test_request_refused_for_capacity_is_not_counted(controller, queued):
+    queued["depth"] = 1000
+    with pytest.raises(Overloaded) as refused:
+        controller.admit("10.0.0.1", cost=20)
+    assert refused.value.status_code == 503
+
+    queued["depth"] = 0
+    controller.admit("10.0.0.1", cost=30)
+
+
+def test_batch_over_the_client_limit_is_refused_up_front(monkeypatch, redis_client):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    monkeypatch.setattr(main, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "ADMISSION_CLIENT_LIMIT", 30)
+    batch = {"requests": [{"repo_url": "https://github.com/acme/widgets", "pr_number": n} for n in range(31)]}
+
+    response = TestClient(main.app).post("/analyze-batch", json=batch)
+
+    assert response.status_code == 413
+    assert "Retry-After" not in response.headers
+    assert "at most 30 PRs" in response.json()["detail"]
+    # Nothing was counted for the refused batch
+    assert not redis_client.keys("admission:rate:*")
@@ -0,0 +1,27 @@
+# tests/test_analytics.py
+from app import main
+
+
+class _Loader:
+    started = 0
+
+    def __init__(self, db):
+        pass
+
+    def start(self):
+        _Loader.started += 1
+
+
+def test_loader_runs_only_where_enabled(monkeypatch):
+    monkeypatch.setattr(main, "AnalyticsLoader", _Loader)
+    monkeypatch.setattr(main, "get_analytics_db", lambda: None)
+    monkeypatch.setattr(main, "analytics_loader", None)
+    monkeypatch.setattr(main, "ANALYTICS_ENABLED", True)
+
+    monkeypatch.setattr(main, "ANALYTICS_LOADER", False)
+    main.start_analytics_loader()
+    assert (_Loader.started, main.analytics_loader) == (0, None)
+
+    monkeypatch.setattr(main, "ANALYTICS_LOADER", True)
+    main.start_analytics_loader()
+    assert _Loader.started == 1
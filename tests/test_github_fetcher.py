@@ -0,0 +1,64 @@
+# tests/test_github_fetcher.py
+import pytest
+
+from app.api_tools.github_fetcher import GitHubFetcher
+
+from .conftest import DIFF, REPO_URL
+
+
+@pytest.fixture
+def exchanges(monkeypatch):
+    """(status, If-None-Match sent) of every response the shared session receives."""
+    from app.api_tools import github_fetcher
+
+    seen = []
+    session = github_fetcher.get_session()
+    record = lambda response, *args, **kwargs: seen.append(
+        (response.status_code, response.request.headers.get("If-None-Match")))
+    monkeypatch.setattr(session, "hooks", {"response": [record]})
+    return seen
+
+
+def test_repeated_fetch_is_revalidated_with_its_etag(github, exchanges):
+    fetcher = GitHubFetcher(api_url=github.url)
+
+    first = fetcher.fetch_pr_diff(REPO_URL, 7)
+    second = fetcher.fetch_pr_diff(REPO_URL, 7)
+
+    assert first == second == DIFF
+    (status, sent), (revalidated, etag) = exchanges
+    assert (status, sent) == (200, None)
+    assert revalidated == 304 and etag
+
+
+def test_changed_resource_is_fetched_again(github, exchanges):
+    fetcher = GitHubFetcher(api_url=github.url)
+    assert fetcher.fetch_pr_info(REPO_URL, 7)["head"]["sha"] == "a" * 40
+
+    github.pulls[7].pr_info = {**github.pulls[7].pr_info, "head": {"sha": "b" * 40}}
+
+    assert fetcher.fetch_pr_info(REPO_URL, 7)["head"]["sha"] == "b" * 40
+    assert [status for status, _ in exchanges] == [200, 200]
+
+
+def test_cached_responses_are_not_shared_between_tokens(github, exchanges):
+    GitHubFetcher(token="first", api_url=github.url).fetch_pr_info(REPO_URL, 7)
+    GitHubFetcher(token="second", api_url=github.url).fetch_pr_info(REPO_URL, 7)
+
+    assert exchanges == [(200, None), (200, None)]
+
+
+def test_review_comments_are_listed_across_pages(github, monkeypatch):
+    from app.api_tools import github_fetcher
+
+    monkeypatch.setattr(github_fetcher, "LIST_PAGE_SIZE", 2)
+    github.comments[7] = [{"id": n, "path": "app/service.py", "line": 12, "body": str(n)} for n in range(5)]
+
+    comments = GitHubFetcher(api_url=github.url).fetch_review_comments(REPO_URL, 7)
+
+    assert [c["id"] for c in comments] == list(range(5))
+
+
+def test_missing_pr_raises_file_not_found(github):
+    with pytest.raises(FileNotFoundError):
+        GitHubFetcher(api_url=github.url).fetch_pr_info(REPO_URL, 404)
@@ -0,0 +1,95 @@
+# tests/test_publish.py
+from app.api_tools.github_fetcher import GitHubFetcher
+from app.models import AnalysisResults, AnalysisSummary, FileAnalysis, Issue
+from app.publish import MAX_LISTED_FINDINGS, MARKER_RE, ReviewPublisher
+
+from .conftest import REPO_URL
+
+HEAD = "a" * 40
+
+
+def results_with(issues):
+    return AnalysisResults(
+        files=[FileAnalysis(name="app/service.py", issues=issues)],
+        summary=AnalysisSummary(total_files=1, total_issues=len(issues), critical_issues=0),
+    )
+
+
+def issue(line: int, description: str, suggestion: str = "Remove it.") -> Issue:
+    return Issue(type="style", line=line, description=description, suggestion=suggestion)
+
+
+def run_publish(github, results):
+    return ReviewPublisher(GitHubFetcher(api_url=github.url)).publish(REPO_URL, 7, HEAD, results)
+
+
+def test_first_publish_is_one_review_with_inline_comments(github):
+    results = results_with([issue(13, "Debug print left in."), issue(12, "Use math.fsum for prices.")])
+
+    report = run_publish(github, results)
+
+    assert (report.reviews, report.comments, report.listed) == (1, 2, 0)
+    assert len(github.reviews[7]) == 1
+    assert sorted(c["line"] for c in github.comments[7]) == [12, 13]
+
+
+def test_same_description_on_two_lines_is_two_comments(github):
+    results = results_with([issue(12, "Trailing whitespace."), issue(13, "Trailing whitespace.")])
+
+    report = run_publish(github, results)
+
+    assert report.comments == 2
+    assert sorted(c["line"] for c in github.comments[7]) == [12, 13]
+    assert run_publish(github, results).unchanged == 2
+
+
+def test_publishing_again_posts_nothing(github):
+    results = results_with([issue(13, "Debug print left in."), issue(400, "Unused helper below.")])
+    run_publish(github, results)
+    posted = (len(github.reviews[7]), len(github.comments[7]))
+
+    report = run_publish(github, results)
+
+    assert (report.reviews, report.comments, report.updated, report.unchanged) == (0, 0, 0, 2)
+    assert (len(github.reviews[7]), len(github.comments[7])) == posted
+
+
+def test_changed_suggestion_edits_the_posted_comment(github):
+    run_publish(github, results_with([issue(13, "Debug print left in.")]))
+
+    report = run_publish(github, results_with([issue(13, "Debug print left in.", "Use logger.debug.")]))
+
+    assert (report.reviews, report.updated) == (0, 1)
+    assert len(github.comments[7]) == 1
+    assert "logger.debug" in github.comments[7][0]["body"]
+
+
+def test_head_moved_publishes_nothing(github):
+    report = ReviewPublisher(GitHubFetcher(api_url=github.url)).publish(
+        REPO_URL, 7, "b" * 40, results_with([issue(13, "Debug print left in.")]))
+
+    assert report.skipped == "head moved"
+    assert 7 not in github.reviews
+
+
+def test_listed_findings_beyond_the_cap_go_to_further_reviews(github):
+    count = MAX_LISTED_FINDINGS * 2 + 5
+    results = results_with([issue(1000 + n, f"Finding number {n}.") for n in range(count)])
+
+    report = run_publish(github, results)
+
+    assert (report.reviews, report.listed) == (3, count)
+    listed = [mark for review in github.reviews[7] for mark in MARKER_RE.findall(review["body"])]
+    assert len(set(listed)) == count
+    assert run_publish(github, results).unchanged == count
+
+
+def test_refused_inline_comments_are_listed_instead(github, monkeypatch):
+    # As if GitHub's view of the diff no longer showed the lines the index placed them on
+    monkeypatch.setattr("app.publish.place_findings", lambda findings, index: (findings, []))
+    results = results_with([issue(900 + n, f"Finding number {n}.") for n in range(MAX_LISTED_FINDINGS + 3)])
+
+    report = run_publish(github, results)
+
+    assert (report.comments, report.listed, report.reviews) == (0, MAX_LISTED_FINDINGS + 3, 2)
+    assert 7 not in github.comments
@@ -0,0 +1,36 @@
+# tests/test_status.py
+import redis
+from fastapi.testclient import TestClient
+
+from app import main
+from app.store.checkpoints import ReviewCheckpoints
+
+
+class _Result:
+    status = "PROCESSING"
+
+    def __init__(self, task_id, app=None):
+        self.task_id = task_id
+
+
+def test_status_reports_progress(monkeypatch, redis_client):
+    monkeypatch.setattr(main, "AsyncResult", _Result)
+    redis_client.hset(ReviewCheckpoints("task-1")._progress_key, mapping={"done": 3, "total": 8})
+
+    body = TestClient(main.app).get("/status/task-1").json()
+
+    assert (body["status"], body["chunks_done"], body["chunks_total"]) == ("PROCESSING", 3, 8)
+    assert "3/8 chunks" in body["message"]
+
+
+def test_status_without_redis_leaves_progress_out(monkeypatch):
+    def unavailable(self):
+        raise redis.ConnectionError("Connection refused")
+
+    monkeypatch.setattr(main, "AsyncResult", _Result)
+    monkeypatch.setattr(ReviewCheckpoints, "_redis", unavailable)
+
+    response = TestClient(main.app).get("/status/task-1")
+
+    assert response.status_code == 200
+    assert response.json()["chunks_done"] is None
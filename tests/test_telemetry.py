@@ -0,0 +1,99 @@
+# tests/test_telemetry.py
+import pytest
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from prometheus_client import REGISTRY
+
+from app.telemetry import configure_tracing, span, stage
+from bench.servers import FakeLLM
+
+from .conftest import DIFF, REPO_URL
+
+
+@pytest.fixture(scope="module")
+def exporter():
+    # The tracer provider can only be installed once per process
+    exporter = InMemorySpanExporter()
+    configure_tracing(exporter)
+    return exporter
+
+
+@pytest.fixture
+def spans(exporter):
+    exporter.clear()
+    yield exporter
+    exporter.clear()
+
+
+@pytest.fixture
+def reviewer(monkeypatch, redis_client):
+    """A reviewer whose model calls go to FakeLLM, limited per process only."""
+    from app.agent.code_reviewer import CodeReviewerCrew
+    from app.agent.llm_engine import LLMEngine
+    from app.agent.model_router import ModelRoute, ModelRouter
+
+    llm = FakeLLM(latency_ms=0).start()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_API_BASE", f"{llm.url}/v1")
+    monkeypatch.setenv("HUGGINGFACE_API_TOKEN", "test")
+    reviewer = CodeReviewerCrew()
+    reviewer.router = ModelRouter([ModelRoute(name="standard", model="openai/test-model")])
+    reviewer.engine = LLMEngine(shared=False)
+    reviewer.cache = reviewer.near_duplicates = None
+    yield reviewer
+    llm.stop()
+
+
+def stage_count(name: str) -> float:
+    return REGISTRY.get_sample_value("review_stage_seconds_count", {"stage": name}) or 0.0
+
+
+def test_stage_is_a_span_and_a_histogram_sample(spans):
+    before = stage_count("fetch")
+
+    with stage("fetch", what="pr_diff", base_sha=None) as current:
+        current.set_attribute("bytes", 42)
+
+    (finished,) = spans.get_finished_spans()
+    assert finished.name == "fetch"
+    assert dict(finished.attributes) == {"what": "pr_diff", "bytes": 42}
+    assert stage_count("fetch") == before + 1
+
+
+def test_failed_stage_is_still_timed(spans):
+    before = stage_count("result_store")
+
+    with pytest.raises(RuntimeError), stage("result_store"):
+        raise RuntimeError("redis went away")
+
+    (finished,) = spans.get_finished_spans()
+    assert not finished.status.is_ok
+    assert stage_count("result_store") == before + 1
+
+
+def test_review_stages_nest_under_the_task_span(spans, reviewer):
+    with span("analyze_pr_task"):
+        results = reviewer.review_code(REPO_URL, 7, DIFF)
+
+    assert results.stats.chunks == 1
+    finished = spans.get_finished_spans()
+    task = next(s for s in finished if s.name == "analyze_pr_task")
+    by_name = {s.name: s for s in finished}
+    for name in ("prompt_build", "llm_call", "json_extraction", "validation"):
+        assert name in by_name, name
+        assert by_name[name].context.trace_id == task.context.trace_id
+    # The model call ran on the engine's loop thread and still has the task as its ancestor
+    call = by_name["llm_call"]
+    assert call.attributes["model"] == "openai/test-model"
+    assert call.attributes["route"] == "standard"
+    assert task.context.span_id in ancestors(call, finished)
+
+
+def ancestors(child, finished):
+    by_id = {s.context.span_id: s for s in finished}
+    ids = []
+    while child.parent is not None:
+        ids.append(child.parent.span_id)
+        child = by_id.get(child.parent.span_id)
+        if child is None:
+            break
+    return ids
@@ -0,0 +1,164 @@
+# tests/test_webhooks.py
+import hashlib
+import hmac
+import json
+import os
+
+import pytest
+
+from app.store.pending_pushes import PendingPushes
+from app.webhooks import GitHubWebhooks, MalformedDelivery, verify_signature
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), "payloads")
+SECRET = "webhook-secret"
+
+
+def delivery(head_sha: str = "b" * 40, action: str = "synchronize") -> dict:
+    with open(os.path.join(PAYLOADS, "pull_request_synchronize.json")) as f:
+        payload = json.load(f)
+    payload["action"] = action
+    payload["pull_request"]["head"]["sha"] = head_sha
+    return payload
+
+
+def sign(body: bytes, secret: str = SECRET) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+@pytest.fixture
+def scheduled():
+    return []
+
+
+@pytest.fixture
+def webhooks(redis_client, scheduled):
+    return GitHubWebhooks(pending=PendingPushes(client=redis_client),
+                          schedule=lambda *args: scheduled.append(args), debounce_seconds=30)
+
+
+@pytest.fixture
+def celery(monkeypatch):
+    """Records the tasks the scheduler sends and revokes instead of talking to a broker."""
+    from app import scheduler
+    from app.worker import celery_app
+
+    calls = {"sent": [], "revoked": []}
+    monkeypatch.setattr(celery_app, "send_task", lambda name, **kwargs: calls["sent"].append(kwargs["task_id"]))
+    monkeypatch.setattr(celery_app.control, "revoke", lambda task_id: calls["revoked"].append(task_id))
+    monkeypatch.setattr(celery_app.backend, "mark_as_revoked", lambda task_id, reason=None: None)
+    # Every review sent is still waiting in the queue
+    monkeypatch.setattr(scheduler, "AsyncResult", lambda task_id, app=None: type("Result", (), {"status": "PENDING"}))
+    return calls
+
+
+def test_signature_is_checked_against_the_raw_body():
+    body = json.dumps(delivery()).encode()
+
+    assert verify_signature(SECRET, body, sign(body))
+    assert not verify_signature(SECRET, body + b" ", sign(body))
+    assert not verify_signature(SECRET, body, sign(body, "other"))
+    assert not verify_signature(SECRET, body, None)
+    assert not verify_signature("", body, sign(body, ""))
+
+
+def test_burst_of_pushes_ends_in_one_review_of_the_last_head(webhooks, scheduled, redis_client):
+    for head in ("1" * 40, "2" * 40, "3" * 40):
+        ack = webhooks.handle("pull_request", delivery(head))
+        assert (ack.status, ack.review_in_seconds) == ("scheduled", 30)
+
+    assert [generation for _, _, generation, _ in scheduled] == [1, 2, 3]
+    pending = PendingPushes(client=redis_client)
+    assert pending.take("acme/widgets", 7, 1) is None
+    assert pending.take("acme/widgets", 7, 2) is None
+    push = pending.take("acme/widgets", 7, 3)
+    assert push["repo_url"] == "https://github.com/acme/widgets"
+    assert push["pr_info"] == {"head": {"sha": "3" * 40}, "additions": 2, "deletions": 0, "changed_files": 1}
+    # Taken once only
+    assert pending.take("acme/widgets", 7, 3) is None
+
+
+def test_long_burst_is_reviewed_after_the_max_wait(redis_client, scheduled):
+    webhooks = GitHubWebhooks(pending=PendingPushes(client=redis_client),
+                              schedule=lambda *args: scheduled.append(args),
+                              debounce_seconds=30, max_wait_seconds=5)
+
+    webhooks.handle("pull_request", delivery("1" * 40))
+
+    (_, _, _, countdown), = scheduled
+    assert 0 < countdown <= 5
+
+
+@pytest.mark.parametrize("event, payload, status", [
+    ("ping", {}, "pong"),
+    ("push", {}, "ignored"),
+    ("pull_request", delivery(action="closed"), "ignored"),
+    ("pull_request", delivery(action="labeled"), "ignored"),
+])
+def test_other_deliveries_schedule_nothing(webhooks, scheduled, event, payload, status):
+    assert webhooks.handle(event, payload).status == status
+    assert scheduled == []
+
+
+@pytest.mark.parametrize("strip", [
+    lambda payload: payload["repository"].pop("full_name"),
+    lambda payload: payload["pull_request"].pop("number"),
+    lambda payload: payload["pull_request"].pop("head"),
+    lambda payload: payload.pop("repository"),
+])
+def test_malformed_delivery_is_refused_without_scheduling(webhooks, scheduled, strip):
+    payload = delivery()
+    strip(payload)
+
+    with pytest.raises(MalformedDelivery):
+        webhooks.handle("pull_request", payload)
+    assert scheduled == []
+
+
+def test_newer_head_revokes_the_queued_review_of_the_older_one(webhooks, scheduled, celery):
+    from app.celery_tasks import debounced_review_task
+
+    webhooks.handle("pull_request", delivery("1" * 40))
+    first = debounced_review_task(*scheduled[-1][:3])
+    webhooks.handle("pull_request", delivery("2" * 40))
+    second = debounced_review_task(*scheduled[-1][:3])
+
+    assert celery["sent"] == [first, second]
+    assert celery["revoked"] == [first]
+
+
+def test_stale_debounce_check_queues_nothing(webhooks, scheduled, celery):
+    from app.celery_tasks import debounced_review_task
+
+    webhooks.handle("pull_request", delivery("1" * 40))
+    webhooks.handle("pull_request", delivery("2" * 40))
+
+    assert debounced_review_task(*scheduled[0][:3]) is None
+    assert debounced_review_task(*scheduled[1][:3]) is not None
+    assert len(celery["sent"]) == 1
+
+
+def test_endpoint_refuses_unsigned_deliveries_and_schedules_signed_ones(monkeypatch, redis_client, scheduled):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    monkeypatch.setattr(main, "WEBHOOK_SECRET", SECRET)
+    monkeypatch.setattr(main, "GitHubWebhooks", lambda: GitHubWebhooks(schedule=lambda *args: scheduled.append(args)))
+    client = TestClient(main.app)
+    body = json.dumps(delivery()).encode()
+    headers = {"X-GitHub-Event": "pull_request", "Content-Type": "application/json"}
+
+    refused = client.post("/webhook/github", content=body, headers={**headers, "X-Hub-Signature-256": sign(b"")})
+    accepted = client.post("/webhook/github", content=body, headers={**headers, "X-Hub-Signature-256": sign(body)})
+
+    malformed = delivery()
+    del malformed["pull_request"]["number"]
+    malformed_body = json.dumps(malformed).encode()
+    invalid = client.post("/webhook/github", content=malformed_body,
+                          headers={**headers, "X-Hub-Signature-256": sign(malformed_body)})
+
+    assert refused.status_code == 401
+    assert invalid.status_code == 400
+    assert accepted.status_code == 200
+    assert accepted.json()["status"] == "scheduled"
+    assert [(repo, pr) for repo, pr, _, _ in scheduled] == [("acme/widgets", 7)]